@@ -0,0 +1,328 @@
+# answer_cache.py (Semantic cache of the agent's answers to general, non-member-specific questions)
+
+import hashlib
+import math
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Literal, Optional, Sequence, Tuple, Union
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+from langchain_core.runnables import RunnableConfig
+
+from fast_path import ID_CARD_PATTERN, MEMBER_ID_PATTERN
+from instrumentation import logger
+from state_access import state_field, state_messages
+from streaming import emit
+
+Vector = Dict[int, float] # sparse, L2-normalised
+
+# Words that carry no meaning of their own for matching (including filler such as "can you explain")
+STOP_WORDS = frozenset("""
+a an the and or of in on to for with by at from about as is are was were be been am do does did can could would
+should will shall may might must i me my we our you your it its this that these those there what whats which who
+how when where why please hi hello hey thanks thank tell know like want need get got just also so any some
+explain describe wondering wonder question quick
+""".split())
+
+# Words that change the answer even when the rest of the question is the same, and that a similarity score
+# can rate as a near-miss ("Part A" vs "Part B", "HMO" vs "PPO", "in-network" vs "out-of-network"). Two
+# questions can only match if they contain the same ones; Medicare "part <letter>" is added as one term.
+REQUIRED_TERMS = frozenset("""
+hmo ppo epo pos hdhp hsa fsa hra medicare medicaid medigap advantage cobra not no never without non out
+""".split())
+PART_LETTER_PATTERN = re.compile(r"\bpart ([a-d])\b")
+
+# The question leans on earlier turns ("what about that one?"), so the same words can mean something else
+CONTEXT_DEPENDENT_PATTERN = re.compile(r"\b(it|its|that|this|those|these|they|them|above|same|again|else|other|one)\b", re.IGNORECASE)
+# Anything that looks like an ID or account number makes the question member-specific
+NUMBER_PATTERN = re.compile(r"\d{4,}")
+# Negated contractions, expanded so the "not" is kept as a required term ("isn't" -> "is not")
+IRREGULAR_NEGATIONS = {"can't": "can not", "cannot": "can not", "won't": "will not", "shan't": "shall not"}
+IRREGULAR_NEGATION_PATTERN = re.compile(r"\b(" + "|".join(IRREGULAR_NEGATIONS) + r")\b")
+NEGATION_SUFFIX_PATTERN = re.compile(r"n't\b")
+
+
+def normalize(text: str) -> str:
+    """Lower case, "n't" expanded to " not", other apostrophes dropped, punctuation and whitespace collapsed to single spaces."""
+    text = str(text).lower().replace("’", "'")
+    text = IRREGULAR_NEGATION_PATTERN.sub(lambda match: IRREGULAR_NEGATIONS[match.group(1)], text)
+    text = NEGATION_SUFFIX_PATTERN.sub(" not", text)
+    return " ".join(re.findall(r"[a-z0-9]+", text.replace("'", "")))
+
+
+def stem(word: str) -> str:
+    """Crude suffix stripping, so "covered"/"cover", "included"/"include" and "works"/"work" agree."""
+    for suffix in ("ing", "ed", "es", "s"):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            word = word[:-len(suffix)]
+            break
+    return word[:-1] if len(word) > 4 and word.endswith("e") else word
+
+
+def required_terms(normalized: str, vocabulary: frozenset = REQUIRED_TERMS) -> frozenset:
+    """The question's words from `vocabulary`, plus "part <letter>" for Medicare parts."""
+    terms = {word for word in normalized.split() if word in vocabulary}
+    terms.update("part " + letter for letter in PART_LETTER_PATTERN.findall(normalized))
+    return frozenset(terms)
+
+
+def hashed_ngram_vector(normalized: str, dim: int = 1 << 18) -> Vector:
+    """
+    Default embedding: hashed stemmed words, bigrams of the non-stop words and character trigrams (stop
+    words weigh less), so rephrasings such as "what does X cover" / "what is covered by X" score high.
+    """
+    words = [word if word in STOP_WORDS else stem(word) for word in normalized.split()]
+    content = [word for word in words if word not in STOP_WORDS]
+    vector: Vector = {}
+
+    def add(feature: str, weight: float) -> None:
+        index = int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), "big") % dim
+        vector[index] = vector.get(index, 0.0) + weight
+
+    for word in words:
+        weight = 0.3 if word in STOP_WORDS else 1.0
+        add("w:" + word, weight)
+        padded = f"#{word}#"
+        for start in range(len(padded) - 2):
+            add("c:" + padded[start:start + 3], 0.5 * weight)
+    for first, second in zip(content, content[1:]):
+        add(f"b:{first} {second}", 0.5)
+    return vector
+
+
+def _unit(vector: Union[Vector, Sequence[float]]) -> Vector:
+    # embed_fn may return a dense sequence (e.g. a sentence embedding) or a sparse dict
+    sparse = dict(vector) if isinstance(vector, dict) else {index: float(value) for index, value in enumerate(vector) if value}
+    norm = math.sqrt(sum(value * value for value in sparse.values()))
+    return {index: value / norm for index, value in sparse.items()} if norm else {}
+
+
+def _cosine(a: Vector, b: Vector) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(value * b.get(index, 0.0) for index, value in a.items())
+
+
+class _Entry:
+    __slots__ = ("question", "terms", "vector", "answer", "cost_ms", "expires_at", "hits")
+
+    def __init__(self, question: str, terms: frozenset, vector: Vector, answer: str, cost_ms: float, expires_at: float):
+        self.question = question # normalised
+        self.terms = terms # required terms
+        self.vector = vector
+        self.answer = answer
+        self.cost_ms = cost_ms # how long the agent took to produce the answer
+        self.expires_at = expires_at
+        self.hits = 0
+
+
+class AnswerCache:
+    """
+    Graph node in front of `agent`. The agent's final answer to a general question (one it answered
+    without calling a tool, in a conversation that has no member data) is stored under the normalised
+    question; a later question that is the same after normalisation, or similar enough (cosine of
+    `embed_fn` vectors >= `threshold`), gets the stored answer as its final AIMessage with no LLM round trip.
+    The score decides, except that both questions must name the same `required_terms` (plan types, Medicare
+    parts, negations; see REQUIRED_TERMS), which a similarity score can mistake for a near-miss.
+    Never cached or served (the agent answers as usual):
+    - anything in a conversation with a pinned member, a member profile, or member-specific tool results
+      in its history (only tools listed in `general_tools` may appear; their results become part of the key);
+    - questions with a member ID, card ID or other long number, and questions that lean on earlier turns
+      ("what about that one?") or answer a question the agent just asked.
+    Entries expire after `ttl` seconds; at most `max_entries` are kept, least recently used evicted first.
+    The model name is part of the key. stats() reports the hit rate and the LLM time saved.
+    """
+
+    def __init__(self, enabled: bool = True, threshold: float = 0.85, ttl: float = 3600.0, max_entries: int = 512,
+                 embed_fn: Optional[Callable[[str], Union[Vector, Sequence[float]]]] = None,
+                 required_terms: Iterable[str] = REQUIRED_TERMS,
+                 general_tools: Iterable[str] = (), max_words: int = 40, clock: Callable[[], float] = time.monotonic):
+        self.enabled = enabled
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.embed_fn = embed_fn or hashed_ngram_vector
+        self.required_terms = frozenset(required_terms)
+        self.general_tools = frozenset(general_tools)
+        self.max_words = max_words
+        self._clock = clock
+        self._lock = threading.Lock()
+        # (context key, normalised question) -> entry, in LRU order
+        self._entries: "OrderedDict[Tuple[str, str], _Entry]" = OrderedDict()
+        # Metrics
+        self.lookups = 0
+        self.exact_hits = 0
+        self.similar_hits = 0
+        self.bypassed: Dict[str, int] = {}
+        self.stores = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.saved_ms = 0.0
+        self.lookup_ms = 0.0
+
+    # --- Graph node ---
+    def lookup(self, state: Any, config: Optional[RunnableConfig] = None) -> Dict[str, List[BaseMessage]]:
+        started_at = time.perf_counter()
+        key = self._cacheable(state, config, counting=True)
+        if key is None:
+            return {"messages": []}
+        context, question = key
+        entry, similarity = self._find(context, question)
+        lookup_ms = (time.perf_counter() - started_at) * 1000
+        with self._lock:
+            self.lookups += 1
+            self.lookup_ms += lookup_ms
+            if entry is None:
+                return {"messages": []}
+            entry.hits += 1
+            if similarity >= 1.0:
+                self.exact_hits += 1
+            else:
+                self.similar_hits += 1
+            self.saved_ms += max(0.0, entry.cost_ms - lookup_ms)
+        logger.debug("Answer cache: hit (similarity %.3f) for '%s'", similarity, question)
+        emit(config, "token", content=entry.answer) # streaming consumers get the whole answer as one chunk
+        return {"messages": [AIMessage(content=entry.answer)]}
+
+    async def alookup(self, state: Any, config: Optional[RunnableConfig] = None) -> Dict[str, List[BaseMessage]]:
+        return self.lookup(state, config) # in-memory; avoids a thread-pool hop on the async path
+
+    def route(self, state: Any) -> Literal["respond", "lookup", "call_agent"]:
+        """After member_context: END if the fast path answered, the cache for a new user message, otherwise the agent."""
+        last_message = state_messages(state)[-1]
+        if isinstance(last_message, AIMessage) and not last_message.tool_calls:
+            return "respond"
+        if self.enabled and isinstance(last_message, HumanMessage):
+            return "lookup"
+        return "call_agent"
+
+    def route_after_lookup(self, state: Any) -> Literal["cached", "call_agent"]:
+        """After the lookup: END if it served a cached answer, otherwise the agent."""
+        last_message = state_messages(state)[-1]
+        if isinstance(last_message, AIMessage) and not last_message.tool_calls:
+            return "cached"
+        return "call_agent"
+
+    # --- Filling ---
+    def remember(self, state: Any, config: Optional[RunnableConfig], answer: BaseMessage, seconds: float) -> bool:
+        """Called by call_agent with its final answer; stores it if the turn is cacheable. True if stored."""
+        if answer.tool_calls or not str(answer.content).strip():
+            return False
+        messages = state_messages(state)
+        if not messages or not isinstance(messages[-1], HumanMessage):
+            return False # the agent called tools this turn: the answer depends on their results
+        key = self._cacheable(state, config, counting=False)
+        if key is None:
+            return False
+        context, question = key
+        entry = _Entry(question, required_terms(question, self.required_terms), _unit(self.embed_fn(question)), str(answer.content),
+                       seconds * 1000, self._clock() + self.ttl)
+        with self._lock:
+            self._entries[(context, question)] = entry
+            self._entries.move_to_end((context, question))
+            self.stores += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return True
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hits = self.exact_hits + self.similar_hits
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "lookups": self.lookups,
+                "hits": hits,
+                "exact_hits": self.exact_hits,
+                "similar_hits": self.similar_hits,
+                "hit_rate": hits / self.lookups if self.lookups else 0.0,
+                "bypassed": dict(self.bypassed),
+                "stores": self.stores,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "saved_ms": round(self.saved_ms, 1),
+                "avg_saved_ms": self.saved_ms / hits if hits else 0.0,
+                "avg_lookup_ms": self.lookup_ms / self.lookups if self.lookups else 0.0,
+            }
+
+    # --- Internals ---
+    def _cacheable(self, state: Any, config: Optional[RunnableConfig], counting: bool) -> Optional[Tuple[str, str]]:
+        """(context key, normalised question) when this turn may use the cache, otherwise None."""
+        if not self.enabled or not (config or {}).get("configurable", {}).get("answer_cache", True):
+            return None
+        messages = state_messages(state)
+        if not messages or not isinstance(messages[-1], HumanMessage):
+            return None
+        text = " ".join(str(messages[-1].content).split())
+        question = normalize(text)
+        reason = None
+        if state_field(state, "current_member_id") or state_field(state, "member_profile"):
+            reason = "member_specific"
+        elif MEMBER_ID_PATTERN.search(text) or ID_CARD_PATTERN.search(text) or NUMBER_PATTERN.search(text):
+            reason = "member_specific"
+        elif any(isinstance(message, ToolMessage) and message.name not in self.general_tools for message in messages):
+            reason = "member_specific"
+        elif not question or len(question.split()) > self.max_words:
+            reason = "length"
+        elif CONTEXT_DEPENDENT_PATTERN.search(text) or _answers_a_question(messages):
+            reason = "context_dependent"
+        if reason is not None:
+            if counting:
+                with self._lock:
+                    self.bypassed[reason] = self.bypassed.get(reason, 0) + 1
+            return None
+        return self._context_key(messages, config), question
+
+    def _context_key(self, messages: List[BaseMessage], config: Optional[RunnableConfig]) -> str:
+        # The model that wrote the answer, plus the results of any general tools the conversation called
+        llm = (config or {}).get("configurable", {}).get("llm") or (config or {}).get("llm")
+        parts = [str(getattr(llm, "model_name", None) or type(llm).__name__)]
+        parts += [f"{message.name}:{message.content}" for message in messages if isinstance(message, ToolMessage)]
+        return hashlib.blake2b("\n".join(parts).encode(), digest_size=12).hexdigest()
+
+    def _find(self, context: str, question: str) -> Tuple[Optional[_Entry], float]:
+        now = self._clock()
+        with self._lock:
+            entry = self._entries.get((context, question))
+            if entry is not None and entry.expires_at > now:
+                self._entries.move_to_end((context, question))
+                return entry, 1.0
+            candidates = list(self._entries.items())
+        # Similarity scan outside the lock: entries are immutable once stored
+        vector = _unit(self.embed_fn(question))
+        terms = required_terms(question, self.required_terms)
+        best: Optional[Tuple[Tuple[str, str], _Entry]] = None
+        best_similarity = self.threshold
+        expired = []
+        for key, candidate in candidates:
+            if candidate.expires_at <= now:
+                expired.append(key)
+                continue
+            if key[0] != context or candidate.terms != terms:
+                continue
+            similarity = _cosine(vector, candidate.vector)
+            if similarity >= best_similarity:
+                best, best_similarity = (key, candidate), similarity
+        with self._lock:
+            for key in expired:
+                if key in self._entries and self._entries[key].expires_at <= now:
+                    del self._entries[key]
+                    self.expirations += 1
+            if best is None:
+                return None, 0.0
+            if best[0] in self._entries:
+                self._entries.move_to_end(best[0])
+        return best[1], min(best_similarity, 0.9999)
+
+
+def _answers_a_question(messages: List[BaseMessage]) -> bool:
+    """The user is replying to a question from the agent (e.g. "could you give me your member ID?")."""
+    previous = messages[-2] if len(messages) > 1 else None
+    return isinstance(previous, AIMessage) and str(previous.content).rstrip().endswith("?")
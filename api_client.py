@@ -0,0 +1,302 @@
+# api_client.py (Shared HTTP client for the Medicare backend APIs)
+#
+# Same get/post/aget/apost (and get_batch/aget_batch) interface as MockApiClient in app.py, built for load:
+#   - one pool of keep-alive connections per base URL, shared by all threads, capped at pool_size open at once
+#   - separate connect and read timeouts
+#   - idempotent GETs retry with jittered exponential backoff; POSTs are never retried or resent
+#   - a circuit breaker per endpoint, so a degraded backend fails fast instead of piling up threads
+# Failures are returned as {"error": ..., "message": ...} dicts, the same shape MockApiClient uses,
+# so tools and the response cache treat real and mock backends identically.
+
+import asyncio
+import concurrent.futures
+import http.client
+import json
+import queue
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlencode, urlsplit
+
+# Status codes worth retrying for idempotent requests (throttling and transient gateway/server errors)
+RETRYABLE_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class CircuitBreaker:
+    """
+    Classic three-state breaker.
+    - closed: requests flow; `failure_threshold` consecutive failures open the circuit.
+    - open: requests are rejected immediately until `reset_timeout` seconds have passed.
+    - half_open: up to `half_open_max_calls` trial requests are let through; one success closes the circuit,
+      one failure opens it again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0, half_open_max_calls: int = 1,
+                 clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._half_open_calls = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._maybe_half_open()
+            return self._state
+
+    def allow_request(self) -> bool:
+        with self._lock:
+            self._maybe_half_open()
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.HALF_OPEN and self._half_open_calls < self.half_open_max_calls:
+                self._half_open_calls += 1
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._half_open_calls = 0
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._state = self.OPEN
+                self._opened_at = self._clock()
+                self._half_open_calls = 0
+
+    def _maybe_half_open(self) -> None:
+        if self._state == self.OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+            self._half_open_calls = 0
+
+
+class PoolTimeoutError(OSError):
+    """Every connection of the pool stayed checked out for `pool_timeout` seconds."""
+
+
+class ConnectionPool:
+    """
+    A bounded LIFO pool of keep-alive HTTP(S) connections to one host. At most `maxsize` connections are
+    checked out at once; a caller beyond that waits up to `pool_timeout` seconds for one to come back.
+    """
+
+    def __init__(self, scheme: str, host: str, port: Optional[int], maxsize: int = 10,
+                 connect_timeout: float = 3.05, read_timeout: float = 10.0, pool_timeout: Optional[float] = None):
+        self.scheme = scheme
+        self.host = host
+        self.port = port
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.pool_timeout = read_timeout if pool_timeout is None else pool_timeout
+        self._idle: "queue.LifoQueue[http.client.HTTPConnection]" = queue.LifoQueue(maxsize=maxsize)
+        self._slots = threading.BoundedSemaphore(maxsize) # one per checked-out connection
+        self.connections_opened = 0
+
+    def acquire(self) -> Tuple[http.client.HTTPConnection, bool]:
+        """Returns (connection, reused). Idle connections are preferred; a new one is opened otherwise."""
+        if not self._slots.acquire(timeout=self.pool_timeout):
+            raise PoolTimeoutError(f"No free connection to {self.host} within {self.pool_timeout:g} s")
+        try:
+            return self._idle.get_nowait(), True
+        except queue.Empty:
+            pass
+        try:
+            connection_class = http.client.HTTPSConnection if self.scheme == "https" else http.client.HTTPConnection
+            connection = connection_class(self.host, self.port, timeout=self.connect_timeout)
+            connection.connect()
+            connection.sock.settimeout(self.read_timeout) # connect_timeout only applies to the TCP/TLS handshake
+        except BaseException:
+            self._slots.release()
+            raise
+        self.connections_opened += 1
+        return connection, False
+
+    def release(self, connection: http.client.HTTPConnection, reusable: bool) -> None:
+        try:
+            if not reusable:
+                connection.close()
+                return
+            try:
+                self._idle.put_nowait(connection)
+            except queue.Full:
+                connection.close()
+        finally:
+            self._slots.release()
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class ApiClient:
+    def __init__(
+        self,
+        base_url: str,
+        *,
+        auth_token: Optional[str] = None,
+        connect_timeout: float = 3.05,
+        read_timeout: float = 10.0,
+        max_retries: int = 3,
+        backoff_base: float = 0.1,
+        backoff_max: float = 2.0,
+        pool_size: int = 10,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        default_headers: Optional[Dict[str, str]] = None,
+    ):
+        parts = urlsplit(base_url)
+        self.base_path = parts.path.rstrip("/")
+        self.pool = ConnectionPool(parts.scheme or "http", parts.hostname, parts.port, maxsize=pool_size,
+                                   connect_timeout=connect_timeout, read_timeout=read_timeout)
+        self.pool_size = pool_size
+        self._executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.headers = {"Accept": "application/json", "Connection": "keep-alive", **(default_headers or {})}
+        if auth_token:
+            self.headers["Authorization"] = f"Bearer {auth_token}"
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._breakers_lock = threading.Lock()
+
+    # --- Public interface (matches MockApiClient) ---
+    def get(self, endpoint: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        return self._request("GET", endpoint, query=params, retries=self.max_retries)
+
+    def post(self, endpoint: str, json_data: Dict[str, Any]) -> Dict[str, Any]:
+        return self._request("POST", endpoint, body=json_data, retries=0)
+
+    def get_batch(self, endpoint: str, ids: List[str]) -> Dict[str, Any]:
+        """Bulk per-card lookup: GET <endpoint>/batch?ids=A,B -> {"results": {"A": {...}, "B": {...}}}."""
+        return self.get(f"{endpoint}/batch", {"ids": ",".join(ids)})
+
+    # http.client is blocking, so the async variants run the request on the client's own executor, one
+    # thread per pooled connection: async calls cannot take over the loop's default executor, and more
+    # threads would only wait for a connection. The pool, retries and breakers are shared with the sync path.
+    async def aget(self, endpoint: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        return await asyncio.get_running_loop().run_in_executor(self._async_executor(), self.get, endpoint, params)
+
+    async def apost(self, endpoint: str, json_data: Dict[str, Any]) -> Dict[str, Any]:
+        return await asyncio.get_running_loop().run_in_executor(self._async_executor(), self.post, endpoint, json_data)
+
+    async def aget_batch(self, endpoint: str, ids: List[str]) -> Dict[str, Any]:
+        return await asyncio.get_running_loop().run_in_executor(self._async_executor(), self.get_batch, endpoint, ids)
+
+    def breaker_for(self, endpoint: str) -> CircuitBreaker:
+        with self._breakers_lock:
+            if endpoint not in self._breakers:
+                self._breakers[endpoint] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+            return self._breakers[endpoint]
+
+    def close(self) -> None:
+        self.pool.close()
+        with self._executor_lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    # --- Internals ---
+    def _async_executor(self) -> concurrent.futures.ThreadPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix="api-client")
+            return self._executor
+
+    def _request(self, method: str, endpoint: str, *, query: Optional[Dict[str, Any]] = None,
+                 body: Optional[Dict[str, Any]] = None, retries: int = 0) -> Dict[str, Any]:
+        idempotent = method == "GET"
+        breaker = self.breaker_for(endpoint)
+        path = self.base_path + endpoint + (f"?{urlencode(query)}" if query else "")
+        payload = json.dumps(body).encode("utf-8") if body is not None else None
+        headers = dict(self.headers)
+        if payload is not None:
+            headers["Content-Type"] = "application/json"
+
+        attempt = 0
+        while True:
+            if not breaker.allow_request():
+                return {"error": "Circuit Open", "message": f"{endpoint} is failing; not calling the backend for now."}
+            try:
+                status, data = self._send(method, path, payload, headers, idempotent=idempotent)
+            except (OSError, http.client.HTTPException) as e: # includes socket.timeout and refused connections
+                breaker.record_failure()
+                failure = {"error": "Connection Error", "message": f"{method} {endpoint} failed: {type(e).__name__}: {e}"}
+                retryable = True
+            else:
+                if status >= 500:
+                    breaker.record_failure()
+                else:
+                    breaker.record_success() # 4xx means the backend is healthy and answered
+                if status < 400:
+                    return data
+                failure = {"error": data.get("error", http.client.responses.get(status, "HTTP Error")),
+                           "status": status, "message": data.get("message", f"{method} {endpoint} returned {status}")}
+                retryable = status in RETRYABLE_STATUSES
+
+            if not retryable or attempt >= retries:
+                return failure
+            time.sleep(self._backoff(attempt))
+            attempt += 1
+
+    def _send(self, method: str, path: str, payload: Optional[bytes], headers: Dict[str, str],
+              idempotent: bool = False) -> Tuple[int, Dict[str, Any]]:
+        connection, reused = self.pool.acquire()
+        try:
+            try:
+                connection.request(method, path, body=payload, headers=headers)
+                response = connection.getresponse()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                if not reused:
+                    raise
+                # The server closed an idle keep-alive connection. The other idle ones are likely stale too,
+                # so drop them and, for idempotent requests, retry once on a fresh connection. A POST may
+                # already have reached the backend, so it fails like any other connection error instead.
+                stale, connection = connection, None
+                self.pool.release(stale, reusable=False)
+                self.pool.close()
+                if not idempotent:
+                    raise
+                connection, reused = self.pool.acquire()
+                connection.request(method, path, body=payload, headers=headers)
+                response = connection.getresponse()
+            raw = response.read() # must drain the body before the connection can be reused
+        except BaseException:
+            if connection is not None:
+                self.pool.release(connection, reusable=False)
+            raise
+        self.pool.release(connection, reusable=not response.will_close)
+        return response.status, _decode_json(raw)
+
+    def _backoff(self, attempt: int) -> float:
+        # "Full jitter": uniform over [0, min(cap, base * 2^attempt)] spreads out synchronized retries
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+
+def _decode_json(raw: bytes) -> Dict[str, Any]:
+    if not raw:
+        return {}
+    try:
+        data = json.loads(raw)
+    except ValueError:
+        return {"message": raw.decode("utf-8", errors="replace")[:500]}
+    return data if isinstance(data, dict) else {"data": data}
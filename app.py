@@ -1,32 +1,52 @@
 # app.py (Core LangGraph Workflow Definition)
 
 import os
-from typing import List, Dict, Any, Optional, Literal
+import asyncio
+import logging
+import threading
+import time
+from typing import Annotated, List, Dict, Any, Optional, Literal, Union
 from pydantic import BaseModel, Field
 from dotenv import load_dotenv
 
 # LangChain/LangGraph specific imports
 from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, ToolMessage, SystemMessage
-from langchain_core.runnables import RunnableConfig
+from langchain_core.messages.utils import message_chunk_to_message
+from langchain_core.runnables import RunnableConfig, RunnableLambda
 from langchain_core.tools import tool # Import the tool decorator for API wrappers
-from langchain_openai import ChatOpenAI
 from langgraph.graph import StateGraph, END
-from langgraph.prebuilt import ToolNode
-from langgraph.checkpoint.sqlite import SQLiteSaver
-
-# --- Load environment variables (for OpenAI API Key) ---
-load_dotenv()
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-if not OPENAI_API_KEY:
-    raise ValueError("OPENAI_API_KEY environment variable not set.")
+from langgraph.graph.message import add_messages
+
+from mock_data import mock_get_batch_response, mock_get_response, mock_post_response
+from api_client import ApiClient
+from tool_results import render_tool_result
+from fast_path import FastPathRouter
+from member_context import MemberContext
+from answer_cache import AnswerCache
+from streaming import get_stream_handler
+from tool_cache import CachingApiClient, TTLCache, DEFAULT_ENDPOINT_TTLS
+from coalescing import CoalescingApiClient
+from prefetch import PrefetchingApiClient
+from parallel_tool_node import ParallelToolNode
+from tool_registry import registry_for
+from history_compaction import HistoryCompactor
+from append_only_saver import AppendOnlySaver
+from sharded_saver import ShardedSaver
+from llm_scheduler import LlmScheduler, PRIORITY_CONTINUATION, PRIORITY_NEW
+from instrumentation import configure_logging, logger, thread_id_from, traced_node, tracer
+from token_counting import count_messages_tokens, count_tokens
+
+# Importing this module only defines things: environment variables (.env), the OpenAI client, the
+# checkpoint database and the compiled graphs are all set up lazily by create_app() (section 8).
 
 # --- 1. Define your AgentState (GraphState) ---
 # This defines the structure of the state that flows through your graph
 class AgentState(BaseModel):
-    messages: List[BaseMessage] = Field(default_factory=list, description="List of all messages in the conversation, including user input, AI responses, and tool outputs.")
-    # Optional: You can add other useful state variables here if needed globally across turns
-    # For example, to store the current member ID after it's identified:
+    # add_messages appends each node's output to the history instead of replacing it
+    messages: Annotated[List[BaseMessage], add_messages] = Field(default_factory=list, description="List of all messages in the conversation, including user input, AI responses, and tool outputs.")
+    # Pinned and kept up to date by the member_context node (section 5c)
     current_member_id: Optional[str] = Field(None, description="The member ID currently being discussed.")
+    member_profile: Optional[Dict[str, Any]] = Field(None, description="Compact facts about that member from earlier tool results (card IDs, primary ID, enrollment status), with fetch times.")
     # You could add a flag for tracking if a critical piece of info is missing
     # waiting_for_member_id: bool = False
 
@@ -34,28 +54,69 @@ class AgentState(BaseModel):
 # In a real project, these would be in agent/tools/*.py and imported.
 # For this example, we define them here to make the graph self-contained.
 
-# Placeholder for shared API client logic (actual implementation in agent/tools/api_client.py)
+# Placeholder for shared API client logic (the pooled HTTP implementation is ApiClient in api_client.py)
 class MockApiClient:
+    def __init__(self, latency: float = 0.0):
+        # Simulated backend round-trip time in seconds (0 = answer immediately)
+        self.latency = latency
+
     def get(self, endpoint: str, params: Dict[str, Any]) -> Dict[str, Any]:
-        print(f"MOCK API CALL: GET {endpoint} with {params}")
-        if endpoint == "/id-list" and params.get("member_id") == "12345":
-            return {"ids": ["MED-ID-12345-A", "MED-ID-12345-B"], "primary_id": "MED-ID-12345-A"}
-        if endpoint == "/id-status" and params.get("id") == "MED-ID-12345-A":
-            return {"status": "Shipped", "tracking_number": "TRK789", "estimated_delivery": "2025-07-08"}
-        if endpoint == "/comets-data" and params.get("id") == "MED-ID-12345-A":
-             return {"comets_status": "Active", "last_update": "2025-06-30", "details": "No issues detected."}
-        # Add more mock responses for other endpoints/tools
-        return {"error": "Not Found", "message": f"No mock data for {endpoint} with {params}"}
+        logger.debug("MOCK API CALL: GET %s with %s", endpoint, params)
+        if self.latency:
+            time.sleep(self.latency)
+        return mock_get_response(endpoint, params)
 
     def post(self, endpoint: str, json_data: Dict[str, Any]) -> Dict[str, Any]:
-        print(f"MOCK API CALL: POST {endpoint} with {json_data}")
-        if endpoint == "/new-id-card-request":
-            return {"request_id": "REQ9876", "status": "Pending", "message": "New ID card request submitted."}
-        # Add more mock responses for other endpoints/tools
-        return {"error": "Not Implemented", "message": f"No mock data for POST {endpoint} with {json_data}"}
+        logger.debug("MOCK API CALL: POST %s with %s", endpoint, json_data)
+        if self.latency:
+            time.sleep(self.latency)
+        return mock_post_response(endpoint, json_data)
+
+    def get_batch(self, endpoint: str, ids: List[str]) -> Dict[str, Any]:
+        # One round trip for all the IDs, like the backend's <endpoint>/batch
+        logger.debug("MOCK API CALL: GET %s/batch with %s", endpoint, ids)
+        if self.latency:
+            time.sleep(self.latency)
+        return mock_get_batch_response(endpoint, ids)
+
+    # Async variants: same responses, but the simulated round trip yields to the event loop
+    # instead of blocking a worker thread.
+    async def aget(self, endpoint: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        logger.debug("MOCK API CALL: async GET %s with %s", endpoint, params)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return mock_get_response(endpoint, params)
+
+    async def apost(self, endpoint: str, json_data: Dict[str, Any]) -> Dict[str, Any]:
+        logger.debug("MOCK API CALL: async POST %s with %s", endpoint, json_data)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return mock_post_response(endpoint, json_data)
+
+    async def aget_batch(self, endpoint: str, ids: List[str]) -> Dict[str, Any]:
+        logger.debug("MOCK API CALL: async GET %s/batch with %s", endpoint, ids)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return mock_get_batch_response(endpoint, ids)
 
 _mock_api_client = MockApiClient() # Instantiate the mock client
 
+# Cache misses go through the coalescing layer (see coalescing.py): identical concurrent lookups share one
+# backend request, and with COALESCE_BATCH_WINDOW_MS > 0 /id-status and /comets-data lookups arriving within
+# the window are merged into one bulk request of at most COALESCE_MAX_BATCH IDs.
+_coalescing_client = CoalescingApiClient(_mock_api_client) # COALESCE_* settings, applied by create_app()
+
+# Read-only lookups go through a TTL + LRU cache (see tool_cache.py); request_new_id_card invalidates
+# the member's cached /id-list and /id-status entries. Tune TTLs per endpoint via endpoint_ttls.
+# The backend is the mock until create_app() finds API_BASE_URL, then it is the pooled HTTP ApiClient
+# pointed at a real (or stub_server.py) backend.
+_api_client = CachingApiClient(_coalescing_client, cache=TTLCache(max_entries=1024), endpoint_ttls=DEFAULT_ENDPOINT_TTLS)
+
+# The tools call the backend through the prefetcher (see prefetch.py). When enabled (PREFETCH_ENABLED=1), a
+# successful /id-list starts /id-status and /comets-data for the primary ID (every ID with PREFETCH_ALL_IDS=1)
+# in the background, so the model's follow-up calls find the answer ready. Off by default it passes calls through.
+_backend = PrefetchingApiClient(_api_client) # PREFETCH_ENABLED / PREFETCH_ALL_IDS, applied by create_app()
+
 @tool
 def get_id_list(member_id: str) -> str:
     """
@@ -64,8 +125,8 @@ def get_id_list(member_id: str) -> str:
     Args:
         member_id (str): The unique identifier for the member.
     """
-    response = _mock_api_client.get("/id-list", {"member_id": member_id})
-    return str(response) # Tools typically return strings
+    response = _backend.get("/id-list", {"member_id": member_id})
+    return render_tool_result("/id-list", response) # Compact JSON of the allow-listed fields, or a typed error
 
 @tool
 def get_id_card_status(id: str) -> str:
@@ -75,8 +136,8 @@ def get_id_card_status(id: str) -> str:
     Args:
         id (str): The specific ID card number (e.g., MED-ID-12345-A).
     """
-    response = _mock_api_client.get("/id-status", {"id": id})
-    return str(response)
+    response = _backend.get("/id-status", {"id": id})
+    return render_tool_result("/id-status", response)
 
 @tool
 def get_comets_data(id: str) -> str:
@@ -87,8 +148,8 @@ def get_comets_data(id: str) -> str:
     Args:
         id (str): The specific ID card number (e.g., MED-ID-12345-A).
     """
-    response = _mock_api_client.get("/comets-data", {"id": id})
-    return str(response)
+    response = _backend.get("/comets-data", {"id": id})
+    return render_tool_result("/comets-data", response)
 
 @tool
 def request_new_id_card(member_id: str, reason: str) -> str:
@@ -99,8 +160,8 @@ def request_new_id_card(member_id: str, reason: str) -> str:
         member_id (str): The unique identifier for the member.
         reason (str): The reason for the new card request (e.g., 'lost', 'stolen', 'damaged').
     """
-    response = _mock_api_client.post("/new-id-card-request", {"member_id": member_id, "reason": reason})
-    return str(response)
+    response = _backend.post("/new-id-card-request", {"member_id": member_id, "reason": reason})
+    return render_tool_result("/new-id-card-request", response)
 
 @tool
 def get_member_benefits(member_id: str, plan_type: str) -> str:
@@ -112,11 +173,8 @@ def get_member_benefits(member_id: str, plan_type: str) -> str:
         member_id (str): The unique identifier for the member.
         plan_type (str): The type of plan (e.g., 'HMO', 'PPO', 'Medicare Advantage').
     """
-    # This is a placeholder; would call _mock_api_client.get() or similar
-    print(f"MOCK TOOL CALL: get_member_benefits for {member_id}, plan {plan_type}")
-    if member_id == "67890" and plan_type.lower() == "hmo":
-        return "Member 67890 under HMO plan has dental, vision, and prescription benefits."
-    return "Benefits not found for provided details."
+    response = _backend.get("/member-benefits", {"member_id": member_id, "plan_type": plan_type})
+    return render_tool_result("/member-benefits", response)
 
 @tool
 def get_dental_coverage_status(member_id: str) -> str:
@@ -126,10 +184,8 @@ def get_dental_coverage_status(member_id: str) -> str:
     Args:
         member_id (str): The unique identifier for the member.
     """
-    print(f"MOCK TOOL CALL: get_dental_coverage_status for {member_id}")
-    if member_id == "12345":
-        return "Member 12345 has active dental coverage with 80% co-insurance for preventative care."
-    return "Dental coverage status not found for provided member ID."
+    response = _backend.get("/dental-coverage", {"member_id": member_id})
+    return render_tool_result("/dental-coverage", response)
 
 @tool
 def get_member_status(member_id: str) -> str:
@@ -139,10 +195,48 @@ def get_member_status(member_id: str) -> str:
     Args:
         member_id (str): The unique identifier for the member.
     """
-    print(f"MOCK TOOL CALL: get_member_status for {member_id}")
-    if member_id == "12345":
-        return "Member 12345 is currently in active enrollment status."
-    return "Member status not found for provided ID."
+    response = _backend.get("/member-status", {"member_id": member_id})
+    return render_tool_result("/member-status", response)
+
+
+# --- Async tool implementations ---
+# Each @tool above also gets a coroutine, so `tool.ainvoke` (used by ToolNode when the graph runs
+# via ainvoke/astream) awaits the backend call instead of blocking a thread-pool worker.
+async def _aget_id_list(member_id: str) -> str:
+    response = await _backend.aget("/id-list", {"member_id": member_id})
+    return render_tool_result("/id-list", response)
+
+async def _aget_id_card_status(id: str) -> str:
+    response = await _backend.aget("/id-status", {"id": id})
+    return render_tool_result("/id-status", response)
+
+async def _aget_comets_data(id: str) -> str:
+    response = await _backend.aget("/comets-data", {"id": id})
+    return render_tool_result("/comets-data", response)
+
+async def _arequest_new_id_card(member_id: str, reason: str) -> str:
+    response = await _backend.apost("/new-id-card-request", {"member_id": member_id, "reason": reason})
+    return render_tool_result("/new-id-card-request", response)
+
+async def _aget_member_benefits(member_id: str, plan_type: str) -> str:
+    response = await _backend.aget("/member-benefits", {"member_id": member_id, "plan_type": plan_type})
+    return render_tool_result("/member-benefits", response)
+
+async def _aget_dental_coverage_status(member_id: str) -> str:
+    response = await _backend.aget("/dental-coverage", {"member_id": member_id})
+    return render_tool_result("/dental-coverage", response)
+
+async def _aget_member_status(member_id: str) -> str:
+    response = await _backend.aget("/member-status", {"member_id": member_id})
+    return render_tool_result("/member-status", response)
+
+get_id_list.coroutine = _aget_id_list
+get_id_card_status.coroutine = _aget_id_card_status
+get_comets_data.coroutine = _aget_comets_data
+request_new_id_card.coroutine = _arequest_new_id_card
+get_member_benefits.coroutine = _aget_member_benefits
+get_dental_coverage_status.coroutine = _aget_dental_coverage_status
+get_member_status.coroutine = _aget_member_status
 
 
 # Collect all your tools here (in actual project, this would be imported from agent/__init__.py)
@@ -172,6 +266,7 @@ Here's how you should operate:
 
 3.  **Process Tool Outputs:**
     * After a tool executes, you will receive its output as a ToolMessage. Analyze this output carefully.
+    * Tool outputs are compact JSON. A failed call returns {"error": <code>, "message": ..., "retryable": ...}; explain the problem to the user and only retry if "retryable" is true.
     * Use the tool's output to formulate a helpful and accurate response to the user.
     * **If one API call's result indicates the need for another API call to fully answer the query (e.g., getting an ID list before checking an ID's status), make the subsequent tool call.** You are expected to chain tools together as needed.
 
@@ -203,38 +298,184 @@ Here's how you should operate:
 
 # --- 4. Define the Agent Node (`call_agent`) ---
 # This is where the LLM makes decisions
-def call_agent(state: AgentState, config: Optional[RunnableConfig] = None) -> Dict[str, List[BaseMessage]]:
+history_compactor = HistoryCompactor(max_prompt_tokens=4000) # HISTORY_TOKEN_BUDGET, applied by create_app()
+
+# Every model call takes a slot from the scheduler first (see llm_scheduler.py): token buckets for the
+# provider's requests/min (LLM_RPM) and tokens/min (LLM_TPM), holding LLM_BURST_SECONDS of budget; at most
+# LLM_MAX_IN_FLIGHT calls at once; and a bounded queue (LLM_MAX_QUEUE, LLM_MAX_WAIT_SECONDS) served
+# round-robin across tenants and threads, with turns already in a tool chain ahead of new ones. A provider
+# 429 pauses every call instead of all retrying at once. Without limits (the default) calls start
+# immediately. llm_scheduler.stats() has the queue metrics.
+llm_scheduler = LlmScheduler() # LLM_* settings, applied by create_app()
+
+def _from_config(config: Optional[RunnableConfig], key: str) -> Any:
+    # Runtime objects (llm, tools) can be passed at the top level of the config, as in the examples
+    # below, or under "configurable"; newer LangGraph releases only forward "configurable" to nodes.
+    config = config or {}
+    if key in config.get("configurable", {}):
+        return config["configurable"][key]
+    return config[key]
+
+def _build_llm_request(state: AgentState, config: Optional[RunnableConfig]):
     # Retrieve LLM and tools from the config provided during graph invocation
-    llm = config["llm"]
-    tools_to_bind = config["tools"]
+    llm = _from_config(config, "llm")
+    tools_to_bind = _from_config(config, "tools")
 
     # Bind the tools to the LLM. This is how the LLM knows what tools are available.
-    llm_with_tools = llm.bind_tools(tools_to_bind)
+    # The registry builds the tool schemas once per tool set, caches the bound model, and only offers
+    # the tools relevant to this turn (e.g. just the ID-card tools for a card status question).
+    llm_with_tools, _ = registry_for(tools_to_bind).bind(llm, state.messages)
 
     # Construct the full message list for the LLM
     # The SystemMessage ensures the LLM always remembers its core instructions
-    messages_for_llm = [SystemMessage(content=SYSTEM_PROMPT)] + state.messages
-
-    print(f"\n--- Agent Node: LLM Reasoning (Messages for LLM) ---")
-    for msg in messages_for_llm:
-        print(f"  {type(msg).__name__}: {msg.content if not msg.tool_calls else 'Tool Calls: ' + str(msg.tool_calls)}")
-
-    # Invoke the LLM with the current state's messages
-    result = llm_with_tools.invoke(messages_for_llm)
-
-    print(f"--- Agent Node: LLM Output ---")
-    print(f"  Type: {type(result).__name__}")
+    # The history is compacted to HISTORY_TOKEN_BUDGET first: old tool exchanges become short facts and the
+    # oldest turns a summary. Only this prompt is compacted; the checkpointed state.messages stays complete.
+    # A short member context note (pinned member ID, still-fresh facts from earlier tool results) follows the
+    # system prompt, so follow-up turns need not repeat lookups that are already in the history.
+    context_note = member_context.summary(state)
+    messages_for_llm = ([SystemMessage(content=SYSTEM_PROMPT)] + ([SystemMessage(content=context_note)] if context_note else [])
+                        + history_compactor.compact(state.messages))
+
+    # Only the newest message is logged: dumping the whole prompt on every step costs O(n^2) over a thread
+    if logger.isEnabledFor(logging.DEBUG):
+        last = messages_for_llm[-1]
+        logger.debug("Agent step: %d messages for LLM, last %s: %s", len(messages_for_llm), type(last).__name__,
+                     last.tool_calls if getattr(last, "tool_calls", None) else last.content)
+
+    return llm_with_tools, messages_for_llm
+
+def _log_llm_result(result: BaseMessage) -> None:
     if result.tool_calls:
-        print(f"  Tool Calls: {result.tool_calls}")
+        logger.debug("LLM output: tool calls %s", result.tool_calls)
+    else:
+        logger.debug("LLM output: %s", result.content)
+
+def _record_llm_usage(span: Any, messages_for_llm: List[BaseMessage], result: BaseMessage) -> None:
+    # Provider-reported usage when available, otherwise the local estimate from token_counting.py
+    if not span.recording:
+        return
+    usage = getattr(result, "usage_metadata", None)
+    if usage:
+        span.set(prompt_tokens=usage["input_tokens"], completion_tokens=usage["output_tokens"])
     else:
-        print(f"  Content: {result.content}")
+        completion = count_tokens(str(result.content)) + (count_tokens(str(result.tool_calls)) if result.tool_calls else 0)
+        span.set(prompt_tokens=count_messages_tokens(messages_for_llm), completion_tokens=completion, estimated=True)
+    span.set(tool_calls=len(result.tool_calls))
+
+def _llm_slot(state: AgentState, config: Optional[RunnableConfig], messages_for_llm: List[BaseMessage]) -> Dict[str, Any]:
+    # Who is asking and how big the call is, for llm_scheduler; the tenant comes from config["configurable"]["tenant_id"]
+    return {
+        "thread_id": thread_id_from(config),
+        "tenant": (config or {}).get("configurable", {}).get("tenant_id"),
+        "priority": PRIORITY_CONTINUATION if isinstance(state.messages[-1], ToolMessage) else PRIORITY_NEW,
+        "tokens": count_messages_tokens(messages_for_llm) if not llm_scheduler.tokens.unlimited else 0,
+    }
+
+def _settle_llm_usage(permit: Any, messages_for_llm: List[BaseMessage], result: BaseMessage) -> None:
+    # Corrects the scheduler's tokens/min reservation with the usage the provider reported
+    usage = getattr(result, "usage_metadata", None)
+    if usage:
+        permit.settle(usage["input_tokens"] + usage["output_tokens"])
+    elif permit.tokens:
+        permit.settle(count_messages_tokens(messages_for_llm) + count_tokens(str(result.content)))
+
+def call_agent(state: AgentState, config: Optional[RunnableConfig] = None) -> Dict[str, List[BaseMessage]]:
+    started_at = time.perf_counter()
+    llm_with_tools, messages_for_llm = _build_llm_request(state, config)
+    stream_handler = get_stream_handler(config)
+
+    # Invoke the LLM with the current state's messages, once the scheduler has a slot for the call
+    with llm_scheduler.slot(**_llm_slot(state, config, messages_for_llm)) as permit:
+        with tracer.span("llm", kind="llm", streaming=stream_handler is not None) as span:
+            try:
+                if stream_handler is None:
+                    result = llm_with_tools.invoke(messages_for_llm)
+                else:
+                    # A consumer is listening (e.g. the /chat endpoint): stream the reply and forward text as it arrives.
+                    # Chunks are summed so partial tool_call_chunks merge into complete tool_calls before checkpointing.
+                    chunks = None
+                    for chunk in llm_with_tools.stream(messages_for_llm):
+                        if chunk.content:
+                            stream_handler({"type": "token", "content": chunk.content})
+                        chunks = chunk if chunks is None else chunks + chunk
+                    result = message_chunk_to_message(chunks)
+            except Exception as e:
+                llm_scheduler.note_error(e)
+                raise
+            _record_llm_usage(span, messages_for_llm, result)
+            _settle_llm_usage(permit, messages_for_llm, result)
+    _log_llm_result(result)
+    # A general question answered without tools is kept for the next user who asks it (see section 5d)
+    answer_cache.remember(state, config, result, time.perf_counter() - started_at)
 
     # Return the LLM's response to update the graph state
     return {"messages": [result]}
 
+async def acall_agent(state: AgentState, config: Optional[RunnableConfig] = None) -> Dict[str, List[BaseMessage]]:
+    # Same as call_agent, but awaits the model so the event loop can serve other threads meanwhile
+    started_at = time.perf_counter()
+    llm_with_tools, messages_for_llm = _build_llm_request(state, config)
+    stream_handler = get_stream_handler(config)
+    async with llm_scheduler.aslot(**_llm_slot(state, config, messages_for_llm)) as permit:
+        with tracer.span("llm", kind="llm", streaming=stream_handler is not None) as span:
+            try:
+                if stream_handler is None:
+                    result = await llm_with_tools.ainvoke(messages_for_llm)
+                else:
+                    chunks = None
+                    async for chunk in llm_with_tools.astream(messages_for_llm):
+                        if chunk.content:
+                            stream_handler({"type": "token", "content": chunk.content})
+                        chunks = chunk if chunks is None else chunks + chunk
+                    result = message_chunk_to_message(chunks)
+            except Exception as e:
+                llm_scheduler.note_error(e)
+                raise
+            _record_llm_usage(span, messages_for_llm, result)
+            _settle_llm_usage(permit, messages_for_llm, result)
+    _log_llm_result(result)
+    # A general question answered without tools is kept for the next user who asks it (see section 5d)
+    answer_cache.remember(state, config, result, time.perf_counter() - started_at)
+    return {"messages": [result]}
+
 # --- 5. Define the Tool Executor Node (`tool_executor`) ---
 # This node automatically executes any tool calls made by the LLM
-tool_executor = ToolNode(all_tools) # Initialize with all your defined tools
+# When the LLM emits several tool calls at once (e.g. status checks for both IDs from /id-list), they run
+# concurrently on a bounded pool, so a step takes as long as its slowest call. A call that fails or exceeds
+# its timeout (counted from when it starts) becomes a ToolError ToolMessage (see tool_results.py); ToolMessages keep
+# the order of the tool calls. A call that finds no free worker within queue_timeout is reported as "queue_timeout".
+tool_executor = ParallelToolNode(
+    all_tools,
+    max_workers=8,
+    default_timeout=10.0,
+    tool_timeouts={"request_new_id_card": 20.0}, # writes get a longer budget than lookups
+)
+
+# --- 5b. Define the Fast Path Node (`fast_path`) ---
+# Canned queries with a member ID (card status, ID list, membership status, dental coverage) are answered
+# by running the known tool chain directly and rendering a template, with no LLM round trip. The node
+# writes the same AIMessage/ToolMessage sequence the agent would, so later turns see a normal history.
+# Anything ambiguous goes to the agent. Disable with FAST_PATH_ENABLED=0, or per call with
+# config["configurable"]["fast_path"] = False. fast_path.stats() reports hit rate and latency.
+fast_path = FastPathRouter(tool_executor) # FAST_PATH_ENABLED, applied by create_app()
+
+# --- 5c. Define the Member Context Node (`member_context`) ---
+# Runs after the fast path and after every tool step. It pins current_member_id from the user's message
+# (or the agent's first member_id tool argument) and records the card IDs, primary ID, enrollment status
+# and card statuses from this turn's tool results in member_profile, with fetch times. Facts older than
+# their TTL (DEFAULT_FIELD_TTLS) are dropped so the model fetches them again; fresh ones reach the model as
+# a short note (see _build_llm_request). Disable with MEMBER_CONTEXT_ENABLED=0. member_context.stats() has counters.
+member_context = MemberContext() # MEMBER_CONTEXT_ENABLED, applied by create_app()
+
+# --- 5d. Define the Answer Cache Node (`answer_cache`) ---
+# Runs before the agent on each new user message. General questions the agent answered without tools
+# ("what does an HMO plan include?") are stored by call_agent; the same question, or one similar enough
+# (ANSWER_CACHE_THRESHOLD cosine over hashed n-gram vectors, same plan type / Medicare part), gets the stored answer without
+# an LLM round trip. Turns with a pinned member, member-specific tool results, IDs or numbers are never
+# cached or served. Entries live ANSWER_CACHE_TTL_SECONDS, at most ANSWER_CACHE_MAX_ENTRIES of them. Disable
+# with ANSWER_CACHE_ENABLED=0, or per call with config["configurable"]["answer_cache"] = False.
+# answer_cache.stats() reports the hit rate and the LLM time saved.
+answer_cache = AnswerCache() # ANSWER_CACHE_* settings, applied by create_app()
 
 # --- 6. Define the Router Function (`should_continue`) ---
 # This function determines the next step in the graph based on the LLM's output
@@ -242,11 +483,11 @@ def should_continue(state: AgentState) -> Literal["call_tool", "respond"]:
     last_message = state.messages[-1]
     # If the last message contains tool calls, it means the LLM wants to use a tool
     if last_message.tool_calls:
-        print(f"\n--- Router: LLM wants to call a tool. Routing to 'tool_executor'. ---")
+        logger.debug("Router: LLM wants to call a tool. Routing to 'tool_executor'.")
         return "call_tool"
     else:
         # Otherwise, the LLM has generated a final response (or clarification)
-        print(f"\n--- Router: LLM wants to respond. Routing to 'END'. ---")
+        logger.debug("Router: LLM wants to respond. Routing to 'END'.")
         return "respond"
 
 # --- 7. Build the LangGraph Workflow ---
@@ -254,11 +495,37 @@ def should_continue(state: AgentState) -> Literal["call_tool", "respond"]:
 workflow = StateGraph(AgentState)
 
 # Add the nodes to the workflow
-workflow.add_node("agent", call_agent)
-workflow.add_node("tool_executor", tool_executor) # ToolNode is already defined above
+# The agent node carries both implementations: invoke/stream use call_agent, ainvoke/astream use acall_agent
+# Each node is wrapped in a "node" span (see instrumentation.py) that carries the thread_id to the LLM,
+# tool and backend spans recorded inside it.
+workflow.add_node("agent", traced_node("agent", RunnableLambda(call_agent, afunc=acall_agent)))
+workflow.add_node("tool_executor", traced_node("tool_executor", tool_executor)) # ToolNode is already defined above
+workflow.add_node("fast_path", traced_node("fast_path", RunnableLambda(fast_path.route, afunc=fast_path.aroute)))
+workflow.add_node("member_context", traced_node("member_context", RunnableLambda(member_context.update, afunc=member_context.aupdate)))
+workflow.add_node("answer_cache", traced_node("answer_cache", RunnableLambda(answer_cache.lookup, afunc=answer_cache.alookup)))
 
 # Set the entry point for the graph
-workflow.set_entry_point("agent")
+# Every turn first tries the fast path, then updates the member context; the turn then ends if the fast
+# path answered it, or tries the answer cache (a new user message) and then the agent
+workflow.set_entry_point("fast_path")
+workflow.add_edge("fast_path", "member_context")
+workflow.add_conditional_edges(
+    "member_context",
+    answer_cache.route,
+    {
+        "respond": END,
+        "lookup": "answer_cache",
+        "call_agent": "agent",
+    },
+)
+workflow.add_conditional_edges(
+    "answer_cache",
+    answer_cache.route_after_lookup, # END on a cached answer, otherwise the agent
+    {
+        "cached": END,
+        "call_agent": "agent",
+    },
+)
 
 # Define the conditional edges from the 'agent' node
 # This dictates where the flow goes after the LLM makes a decision
@@ -272,23 +539,245 @@ workflow.add_conditional_edges(
 )
 
 # Define the edge from the 'tool_executor' node
-# After a tool is executed, the flow always returns to the 'agent' for further reasoning
-workflow.add_edge("tool_executor", "agent")
-
-# --- 8. Configure State Persistence with SQLiteSaver ---
-# 'sqlite:///conversations.db' tells SQLiteSaver to use a file named conversations.db
-# This file will be created/updated in your project's root directory.
-memory = SQLiteSaver.from_conn_string("sqlite:///conversations.db")
+# After a tool is executed, its results are recorded in the member context and the flow returns to the
+# 'agent' for further reasoning (answer_cache.route always picks the agent after a ToolMessage)
+workflow.add_edge("tool_executor", "member_context")
+
+# --- 8. Application factory (`create_app`) ---
+# Everything with a cost or a side effect is built here, lazily and once per process: the checkpointer
+# (which opens conversations.db), the compiled graphs and the OpenAI client (whose import alone takes
+# about half a second). Importing app.py stays cheap, and a pre-forking server can import it in the
+# parent without sharing an SQLite handle: every handle is tied to the pid that opened it and rebuilt
+# in a forked child. Call warm_up() before serving to move the remaining one-off costs out of the first turn.
+class AppConfig:
+    """Settings for create_app(). from_env() loads .env and reads the environment variables."""
+
+    def __init__(self, db_path: str = "conversations.db", checkpoint_keep_last: int = 20,
+                 checkpoint_max_idle_seconds: float = 30 * 24 * 3600, model: str = "gpt-4o", temperature: float = 0.0,
+                 openai_api_key: Optional[str] = None, api_base_url: Optional[str] = None, api_auth_token: Optional[str] = None,
+                 history_token_budget: int = 4000, fast_path_enabled: bool = True, checkpoint_shards: int = 1,
+                 member_context_enabled: bool = True, prefetch_enabled: bool = False, prefetch_all_ids: bool = False,
+                 coalesce_enabled: bool = True, coalesce_batch_window: float = 0.0, coalesce_max_batch: int = 16,
+                 llm_requests_per_minute: float = 0, llm_tokens_per_minute: float = 0, llm_burst_seconds: float = 60.0,
+                 llm_max_in_flight: int = 0, llm_max_queue: int = 256, llm_max_wait: float = 30.0,
+                 answer_cache_enabled: bool = True, answer_cache_threshold: float = 0.85, answer_cache_ttl: float = 3600.0,
+                 answer_cache_max_entries: int = 512):
+        self.db_path = db_path
+        self.checkpoint_shards = checkpoint_shards
+        self.checkpoint_keep_last = checkpoint_keep_last
+        self.checkpoint_max_idle_seconds = checkpoint_max_idle_seconds
+        self.model = model
+        self.temperature = temperature
+        self.openai_api_key = openai_api_key
+        self.api_base_url = api_base_url
+        self.api_auth_token = api_auth_token
+        self.history_token_budget = history_token_budget
+        self.fast_path_enabled = fast_path_enabled
+        self.member_context_enabled = member_context_enabled
+        self.prefetch_enabled = prefetch_enabled
+        self.prefetch_all_ids = prefetch_all_ids
+        self.coalesce_enabled = coalesce_enabled
+        self.coalesce_batch_window = coalesce_batch_window # seconds
+        self.coalesce_max_batch = coalesce_max_batch
+        self.llm_requests_per_minute = llm_requests_per_minute # 0 = no limit, as for tokens/min and in-flight
+        self.llm_tokens_per_minute = llm_tokens_per_minute
+        self.llm_burst_seconds = llm_burst_seconds
+        self.llm_max_in_flight = llm_max_in_flight
+        self.llm_max_queue = llm_max_queue
+        self.llm_max_wait = llm_max_wait # seconds
+        self.answer_cache_enabled = answer_cache_enabled
+        self.answer_cache_threshold = answer_cache_threshold
+        self.answer_cache_ttl = answer_cache_ttl # seconds
+        self.answer_cache_max_entries = answer_cache_max_entries
+
+    @classmethod
+    def from_env(cls) -> "AppConfig":
+        load_dotenv()
+        return cls(
+            db_path=os.getenv("CHECKPOINT_DB", "conversations.db"),
+            checkpoint_keep_last=int(os.getenv("CHECKPOINT_KEEP_LAST", "20")),
+            checkpoint_max_idle_seconds=float(os.getenv("CHECKPOINT_MAX_IDLE_SECONDS", str(30 * 24 * 3600))),
+            model=os.getenv("OPENAI_MODEL", "gpt-4o"),
+            openai_api_key=os.getenv("OPENAI_API_KEY"),
+            api_base_url=os.getenv("API_BASE_URL"),
+            api_auth_token=os.getenv("API_AUTH_TOKEN"),
+            history_token_budget=int(os.getenv("HISTORY_TOKEN_BUDGET", "4000")),
+            fast_path_enabled=os.getenv("FAST_PATH_ENABLED", "1") == "1",
+            checkpoint_shards=int(os.getenv("CHECKPOINT_SHARDS", "1")),
+            member_context_enabled=os.getenv("MEMBER_CONTEXT_ENABLED", "1") == "1",
+            prefetch_enabled=os.getenv("PREFETCH_ENABLED", "0") == "1",
+            prefetch_all_ids=os.getenv("PREFETCH_ALL_IDS", "0") == "1",
+            coalesce_enabled=os.getenv("COALESCE_ENABLED", "1") == "1",
+            coalesce_batch_window=float(os.getenv("COALESCE_BATCH_WINDOW_MS", "0")) / 1000,
+            coalesce_max_batch=int(os.getenv("COALESCE_MAX_BATCH", "16")),
+            llm_requests_per_minute=float(os.getenv("LLM_RPM", "0")),
+            llm_tokens_per_minute=float(os.getenv("LLM_TPM", "0")),
+            llm_burst_seconds=float(os.getenv("LLM_BURST_SECONDS", "60")),
+            llm_max_in_flight=int(os.getenv("LLM_MAX_IN_FLIGHT", "0")),
+            llm_max_queue=int(os.getenv("LLM_MAX_QUEUE", "256")),
+            llm_max_wait=float(os.getenv("LLM_MAX_WAIT_SECONDS", "30")),
+            answer_cache_enabled=os.getenv("ANSWER_CACHE_ENABLED", "1") == "1",
+            answer_cache_threshold=float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.85")),
+            answer_cache_ttl=float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600")),
+            answer_cache_max_entries=int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "512")),
+        )
+
+
+class Application:
+    """
+    The tool set, checkpointer, model client and compiled graphs for one process.
+    - memory: AppendOnlySaver on `config.db_path`. Each thread's messages are stored once in an append-only
+      log and every checkpoint only writes the new messages (see append_only_saver.py). The last
+      `checkpoint_keep_last` checkpoints per thread are kept and idle threads are expired. With
+      `checkpoint_shards` > 1 (CHECKPOINT_SHARDS) threads are spread over that many files next to
+      `db_path` by a hash of the thread_id, so concurrent writers stop queueing on one SQLite write lock
+      (see sharded_saver.py, which also migrates an existing single-file DB).
+    - app_graph / async_app_graph: the workflow compiled with `memory`. Use the async one for
+      `await ainvoke(...)` / `astream(...)`: one event loop then serves many thread_ids without a thread
+      per in-flight turn. AppendOnlySaver implements the async API itself, so both share one checkpointer.
+    - llm: ChatOpenAI, created on first use; raises if OPENAI_API_KEY is not set.
+    """
 
-# --- 9. Compile the graph ---
-# Compiling the workflow prepares it for execution and attaches the checkpointer
-app_graph = workflow.compile(checkpointer=memory)
+    def __init__(self, config: AppConfig):
+        self.config = config
+        self.tools = all_tools
+        self._lock = threading.RLock()
+        self._pid: Optional[int] = None
+        self._memory: Optional[Union[AppendOnlySaver, ShardedSaver]] = None
+        self._app_graph = None
+        self._async_app_graph = None
+        self._llm = None
+        history_compactor.max_prompt_tokens = config.history_token_budget
+        fast_path.enabled = config.fast_path_enabled
+        member_context.enabled = config.member_context_enabled
+        _backend.enabled = config.prefetch_enabled
+        _backend.all_ids = config.prefetch_all_ids
+        _coalescing_client.enabled = config.coalesce_enabled
+        _coalescing_client.batch_window = config.coalesce_batch_window
+        _coalescing_client.max_batch_size = config.coalesce_max_batch
+        if config.api_base_url:
+            _coalescing_client.client = self._backend_client()
+        llm_scheduler.configure(config.llm_requests_per_minute, config.llm_tokens_per_minute, config.llm_burst_seconds)
+        llm_scheduler.max_in_flight = config.llm_max_in_flight
+        llm_scheduler.max_queue = config.llm_max_queue
+        llm_scheduler.max_wait = config.llm_max_wait
+        answer_cache.enabled = config.answer_cache_enabled
+        answer_cache.threshold = config.answer_cache_threshold
+        answer_cache.ttl = config.answer_cache_ttl
+        answer_cache.max_entries = config.answer_cache_max_entries
+
+    @property
+    def memory(self) -> Union[AppendOnlySaver, ShardedSaver]:
+        with self._lock:
+            self._check_pid()
+            if self._memory is None:
+                retention = {"keep_last": self.config.checkpoint_keep_last,
+                             "max_idle_seconds": self.config.checkpoint_max_idle_seconds}
+                if self.config.checkpoint_shards > 1:
+                    self._memory = ShardedSaver.from_conn_string(f"sqlite:///{self.config.db_path}",
+                                                                 shards=self.config.checkpoint_shards, **retention)
+                else:
+                    self._memory = AppendOnlySaver.from_conn_string(f"sqlite:///{self.config.db_path}", **retention)
+            return self._memory
+
+    @property
+    def app_graph(self):
+        with self._lock:
+            self._check_pid()
+            if self._app_graph is None:
+                self._app_graph = workflow.compile(checkpointer=self.memory)
+            return self._app_graph
+
+    @property
+    def async_app_graph(self):
+        with self._lock:
+            self._check_pid()
+            if self._async_app_graph is None:
+                self._async_app_graph = workflow.compile(checkpointer=self.memory)
+            return self._async_app_graph
+
+    @property
+    def llm(self):
+        with self._lock:
+            if self._llm is None:
+                if not self.config.openai_api_key:
+                    raise ValueError("OPENAI_API_KEY environment variable not set.")
+                from langchain_openai import ChatOpenAI # deferred: the heaviest import in the app
+                self._llm = ChatOpenAI(model=self.config.model, temperature=self.config.temperature,
+                                       openai_api_key=self.config.openai_api_key)
+            return self._llm
+
+    def run_config(self, thread_id: str, **configurable: Any) -> RunnableConfig:
+        """The config for one turn: thread_id plus the llm and tools that call_agent reads."""
+        return {"configurable": {"thread_id": thread_id, "llm": self.llm, "tools": self.tools, **configurable}}
+
+    def warm_up(self, include_llm: bool = True) -> Dict[str, float]:
+        """Pays the one-off costs before the first request; returns how long each step took, in ms."""
+        timings: Dict[str, float] = {}
+
+        def step(name: str, func) -> None:
+            started_at = time.perf_counter()
+            func()
+            timings[name] = round((time.perf_counter() - started_at) * 1000, 1)
+
+        step("checkpointer", lambda: self.memory)
+        step("graphs", lambda: (self.app_graph, self.async_app_graph))
+        step("tool_schemas", lambda: registry_for(self.tools))
+        step("tokenizer", lambda: count_tokens("warm up"))
+        if include_llm and self.config.openai_api_key:
+            step("llm_client", lambda: self.llm)
+        logger.info("Warm-up done: %s", timings)
+        return timings
+
+    def _check_pid(self) -> None:
+        # In a forked child the parent's SQLite connection, HTTP sockets, tool, prefetch and scheduler threads are not usable
+        pid = os.getpid()
+        if self._pid is not None and self._pid != pid:
+            self._memory = self._app_graph = self._async_app_graph = None
+            tool_executor.reset_pool()
+            _backend.reset_pool()
+            llm_scheduler.reset()
+            if self.config.api_base_url:
+                _coalescing_client.client = self._backend_client()
+        self._pid = pid
+
+    def _backend_client(self) -> ApiClient:
+        return ApiClient(self.config.api_base_url, auth_token=self.config.api_auth_token)
+
+
+_application: Optional[Application] = None
+_application_lock = threading.Lock()
+
+def create_app(config: Optional[AppConfig] = None) -> Application:
+    """
+    Returns the process-wide Application. Without a config the first call builds it from the environment
+    and later calls return the same one; passing a config builds a new one and makes it the default.
+    Nothing expensive happens until its properties are used (or warm_up() is called).
+    """
+    global _application
+    with _application_lock:
+        if config is not None or _application is None:
+            _application = Application(config or AppConfig.from_env())
+        return _application
+
+def __getattr__(name: str) -> Any:
+    # app_graph, async_app_graph and memory used to be built at import; they now come from create_app()
+    if name in ("app_graph", "async_app_graph", "memory"):
+        return getattr(create_app(), name)
+    if name == "OPENAI_API_KEY":
+        return create_app().config.openai_api_key
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # --- Runnable Example: How to Interact with the Graph ---
 if __name__ == "__main__":
+    # The demo shows each agent step and routing decision; set LOG_LEVEL=WARNING to hide them
+    configure_logging(os.getenv("LOG_LEVEL", "DEBUG"))
+
     # Initialize your LLM
     # Ensure OPENAI_API_KEY is set in your .env file or environment
-    llm_model = ChatOpenAI(model="gpt-4o", temperature=0, openai_api_key=OPENAI_API_KEY)
+    application = create_app()
+    llm_model = application.llm
+    app_graph = application.app_graph
 
     # --- Conversation 1: Multi-step ID Card Status Inquiry ---
     conversation_id_1 = "user_session_medicare_001"
@@ -0,0 +1,428 @@
+# append_only_saver.py (Checkpointer that stores each thread's messages once, as an append-only log)
+#
+# SQLiteSaver writes the whole serialized state after every node, so every agent<->tool hop rewrites the
+# full message history and conversations.db grows roughly quadratically with thread length. This saver:
+#   - keeps one append-only message log per thread; a checkpoint only references a slice of it
+#     (msg_start, msg_count) and the usual step writes only the new messages (the delta)
+#   - stores the rest of the checkpoint (channel versions etc.) separately, without the messages
+#   - zlib-compresses any blob above `compress_threshold` bytes (large ToolMessage payloads, metadata)
+#   - stores pending writes (put_writes) for the langgraph versions that record them
+#   - runs SQLite in WAL mode with synchronous=NORMAL
+#   - retention: keeps the last `keep_last` checkpoints per thread on every write, and prune() (run every
+#     `prune_interval` writes, or on demand) expires threads idle for longer than `max_idle_seconds` and
+#     garbage-collects unreferenced log entries
+
+import asyncio
+import hashlib
+import sqlite3
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import BaseCheckpointSaver, Checkpoint, CheckpointMetadata, CheckpointTuple
+from langgraph.serde.base import SerializerProtocol
+
+# Blob encodings
+RAW = 0
+ZLIB = 1
+
+SCHEMA = """
+PRAGMA journal_mode=WAL;
+CREATE TABLE IF NOT EXISTS log_threads (
+    thread_id TEXT PRIMARY KEY,
+    log_length INTEGER NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS log_messages (
+    thread_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    message_key TEXT NOT NULL,
+    encoding INTEGER NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (thread_id, seq)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS log_checkpoints (
+    thread_id TEXT NOT NULL,
+    thread_ts TEXT NOT NULL,
+    parent_ts TEXT,
+    msg_start INTEGER NOT NULL,
+    msg_count INTEGER NOT NULL,
+    encoding INTEGER NOT NULL,
+    checkpoint BLOB NOT NULL,
+    metadata BLOB,
+    last_key TEXT,
+    metadata_encoding INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (thread_id, thread_ts)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS log_writes (
+    thread_id TEXT NOT NULL,
+    thread_ts TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    channel TEXT NOT NULL,
+    encoding INTEGER NOT NULL,
+    value BLOB NOT NULL,
+    PRIMARY KEY (thread_id, thread_ts, task_id, idx)
+) WITHOUT ROWID;
+"""
+
+# Columns added to log_checkpoints after its first release; setup() adds them to older files
+ADDED_COLUMNS = (
+    ("last_key", "TEXT"),
+    ("metadata_encoding", "INTEGER NOT NULL DEFAULT 0"),
+)
+
+CHECKPOINT_COLUMNS = "thread_ts, parent_ts, msg_start, msg_count, encoding, checkpoint, metadata, metadata_encoding"
+
+
+class AppendOnlySaver(BaseCheckpointSaver):
+    def __init__(
+        self,
+        conn: sqlite3.Connection,
+        *,
+        keep_last: Optional[int] = 20,
+        max_idle_seconds: Optional[float] = None,
+        compress_threshold: int = 1024,
+        prune_interval: int = 1000,
+        log_channel: str = "messages",
+        serde: Optional[SerializerProtocol] = None,
+    ) -> None:
+        super().__init__(serde=serde)
+        self.conn = conn
+        self.keep_last = keep_last
+        self.max_idle_seconds = max_idle_seconds
+        self.compress_threshold = compress_threshold
+        self.prune_interval = prune_interval
+        self.log_channel = log_channel
+        self.lock = threading.Lock()
+        self.is_setup = False
+        # Metrics
+        self.puts = 0
+        self.bytes_written = 0
+        self.messages_appended = 0
+        self.rebases = 0
+
+    @classmethod
+    def from_conn_string(cls, conn_string: str, **kwargs: Any) -> "AppendOnlySaver":
+        path = conn_string[len("sqlite:///"):] if conn_string.startswith("sqlite:///") else conn_string
+        # check_same_thread=False: the connection is shared by graph worker threads, serialized by self.lock
+        return cls(sqlite3.connect(path, check_same_thread=False, timeout=30.0), **kwargs)
+
+    def setup(self) -> None:
+        if self.is_setup:
+            return
+        self.conn.executescript(SCHEMA)
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(log_checkpoints)")}
+        for column, definition in ADDED_COLUMNS:
+            if column not in columns:
+                self.conn.execute(f"ALTER TABLE log_checkpoints ADD COLUMN {column} {definition}")
+        self.conn.commit()
+        self.conn.execute("PRAGMA synchronous=NORMAL") # safe with WAL: a crash can lose the last commits, never corrupt
+        self.is_setup = True
+
+    @contextmanager
+    def cursor(self, transaction: bool = True) -> Iterator[sqlite3.Cursor]:
+        self.setup()
+        cur = self.conn.cursor()
+        try:
+            yield cur
+            if transaction:
+                self.conn.commit()
+        except BaseException:
+            if transaction:
+                self.conn.rollback()
+            raise
+        finally:
+            cur.close()
+
+    # --- Reads ---
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = str(config["configurable"]["thread_id"])
+        thread_ts = config["configurable"].get("thread_ts")
+        with self.lock, self.cursor(transaction=False) as cur:
+            if thread_ts:
+                cur.execute(
+                    f"SELECT {CHECKPOINT_COLUMNS} FROM log_checkpoints WHERE thread_id = ? AND thread_ts = ?",
+                    (thread_id, str(thread_ts)),
+                )
+            else:
+                cur.execute(
+                    f"SELECT {CHECKPOINT_COLUMNS} FROM log_checkpoints WHERE thread_id = ? ORDER BY thread_ts DESC LIMIT 1",
+                    (thread_id,),
+                )
+            row = cur.fetchone()
+            if row is None:
+                return None
+            return self._load_tuple(cur, thread_id, row)
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        wheres, params = [], []
+        if config is not None:
+            wheres.append("thread_id = ?")
+            params.append(str(config["configurable"]["thread_id"]))
+        if before is not None:
+            wheres.append("thread_ts < ?")
+            params.append(before["configurable"]["thread_ts"])
+        query = (f"SELECT thread_id, {CHECKPOINT_COLUMNS} FROM log_checkpoints"
+                 + (" WHERE " + " AND ".join(wheres) if wheres else "") + " ORDER BY thread_ts DESC")
+        with self.lock, self.cursor(transaction=False) as cur:
+            rows = cur.execute(query, params).fetchall()
+            results = []
+            for thread_id, *row in rows:
+                checkpoint_tuple = self._load_tuple(cur, thread_id, row)
+                if filter and any(checkpoint_tuple.metadata.get(key) != value for key, value in filter.items()):
+                    continue
+                results.append(checkpoint_tuple)
+                if limit and len(results) >= limit:
+                    break
+        yield from results
+
+    # --- Writes ---
+    def put(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata) -> RunnableConfig:
+        thread_id = str(config["configurable"]["thread_id"])
+        parent_ts = config["configurable"].get("thread_ts")
+        messages = list(checkpoint["channel_values"].get(self.log_channel) or [])
+        rest = {**checkpoint, "channel_values": {k: v for k, v in checkpoint["channel_values"].items() if k != self.log_channel}}
+
+        with self.lock, self.cursor() as cur:
+            log_length = self._log_length(cur, thread_id)
+            keys = [self._message_key(message) for message in messages]
+            prefix = self._reusable_prefix(cur, thread_id, parent_ts, keys)
+            if prefix is not None and prefix[0] + prefix[1] == log_length:
+                msg_start, reused = prefix # the usual case: only the new messages are written
+            else:
+                # No parent, the parent's slice is not at the end of the log (e.g. resuming from an older
+                # checkpoint), or some of its messages were replaced: start a fresh slice at the end of the log.
+                if parent_ts:
+                    self.rebases += 1
+                msg_start, reused = log_length, 0
+
+            written = 0
+            for offset, message in enumerate(messages[reused:], start=msg_start + reused):
+                encoding, data = self._encode(self.serde.dumps(message))
+                cur.execute(
+                    "INSERT OR REPLACE INTO log_messages (thread_id, seq, message_key, encoding, data) VALUES (?, ?, ?, ?, ?)",
+                    (thread_id, offset, keys[offset - msg_start], encoding, data),
+                )
+                written += len(data)
+            self.messages_appended += len(messages) - reused
+
+            encoding, data = self._encode(self.serde.dumps(rest))
+            metadata_encoding, metadata_blob = self._encode(self.serde.dumps(metadata))
+            cur.execute(
+                "INSERT OR REPLACE INTO log_checkpoints (thread_id, thread_ts, parent_ts, msg_start, msg_count, encoding, "
+                "checkpoint, metadata, last_key, metadata_encoding) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (thread_id, checkpoint["id"], parent_ts, msg_start, len(messages), encoding, data, metadata_blob,
+                 keys[-1] if keys else None, metadata_encoding),
+            )
+            cur.execute(
+                "INSERT OR REPLACE INTO log_threads (thread_id, log_length, updated_at) VALUES (?, ?, ?)",
+                (thread_id, max(log_length, msg_start + len(messages)), time.time()),
+            )
+            if self.keep_last:
+                self._trim_thread(cur, thread_id, self.keep_last)
+            self.puts += 1
+            self.bytes_written += written + len(data) + len(metadata_blob)
+            run_prune = self.max_idle_seconds is not None and self.puts % self.prune_interval == 0
+
+        if run_prune: # expire idle threads every `prune_interval` writes
+            self.prune()
+
+        return {"configurable": {"thread_id": thread_id, "thread_ts": checkpoint["id"]}}
+
+    def put_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]], task_id: str) -> None:
+        """Stores a task's writes against the checkpoint in `config` (langgraph versions that call it)."""
+        thread_id = str(config["configurable"]["thread_id"])
+        thread_ts = str(config["configurable"]["thread_ts"])
+        with self.lock, self.cursor() as cur:
+            for idx, (channel, value) in enumerate(writes):
+                encoding, data = self._encode(self.serde.dumps(value))
+                cur.execute(
+                    "INSERT OR REPLACE INTO log_writes (thread_id, thread_ts, task_id, idx, channel, encoding, value) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (thread_id, thread_ts, task_id, idx, channel, encoding, data),
+                )
+                self.bytes_written += len(data)
+
+    def thread_writes(self, thread_id: str) -> Dict[str, List[Tuple[str, str, Any]]]:
+        """thread_ts -> that checkpoint's pending writes as (task_id, channel, value), e.g. for migrations."""
+        writes: Dict[str, List[Tuple[str, str, Any]]] = {}
+        with self.lock, self.cursor(transaction=False) as cur:
+            cur.execute(
+                "SELECT thread_ts, task_id, channel, encoding, value FROM log_writes WHERE thread_id = ? ORDER BY thread_ts, task_id, idx",
+                (str(thread_id),),
+            )
+            for thread_ts, task_id, channel, encoding, value in cur.fetchall():
+                writes.setdefault(thread_ts, []).append((task_id, channel, self.serde.loads(self._decode(encoding, value))))
+        return writes
+
+    # --- Retention ---
+    def prune(self, keep_last: Optional[int] = None, max_idle_seconds: Optional[float] = None) -> Dict[str, int]:
+        """
+        Deletes threads idle for longer than `max_idle_seconds`, keeps only the newest `keep_last`
+        checkpoints of the remaining threads, and drops log entries no remaining checkpoint references.
+        Defaults to the saver's own settings. Returns counts of what was removed.
+        """
+        keep_last = self.keep_last if keep_last is None else keep_last
+        max_idle_seconds = self.max_idle_seconds if max_idle_seconds is None else max_idle_seconds
+        removed = {"threads": 0, "checkpoints": 0, "messages": 0}
+        with self.lock, self.cursor() as cur:
+            if max_idle_seconds is not None:
+                cutoff = time.time() - max_idle_seconds
+                idle = [row[0] for row in cur.execute("SELECT thread_id FROM log_threads WHERE updated_at < ?", (cutoff,))]
+                for thread_id in idle:
+                    removed["checkpoints"] += cur.execute("DELETE FROM log_checkpoints WHERE thread_id = ?", (thread_id,)).rowcount
+                    cur.execute("DELETE FROM log_writes WHERE thread_id = ?", (thread_id,))
+                    removed["messages"] += cur.execute("DELETE FROM log_messages WHERE thread_id = ?", (thread_id,)).rowcount
+                    cur.execute("DELETE FROM log_threads WHERE thread_id = ?", (thread_id,))
+                removed["threads"] = len(idle)
+            if keep_last:
+                for (thread_id,) in cur.execute("SELECT thread_id FROM log_threads").fetchall():
+                    removed["checkpoints"] += self._trim_thread(cur, thread_id, keep_last, collect_log=False)
+            removed["messages"] += self._collect_log(cur)
+        return removed
+
+    def vacuum(self) -> None:
+        """Returns freed pages to the filesystem; run occasionally after large prunes."""
+        with self.lock:
+            self.setup()
+            self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            self.conn.execute("VACUUM")
+
+    def stats(self) -> Dict[str, Any]:
+        return {"puts": self.puts, "bytes_written": self.bytes_written, "messages_appended": self.messages_appended, "rebases": self.rebases}
+
+    # --- Async variants ---
+    # sqlite3 calls are short and serialized by self.lock; running them on the default executor keeps the
+    # event loop free while one is in flight.
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await asyncio.get_running_loop().run_in_executor(None, self.get_tuple, config)
+
+    async def aput(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata) -> RunnableConfig:
+        return await asyncio.get_running_loop().run_in_executor(None, self.put, config, checkpoint, metadata)
+
+    async def aput_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]], task_id: str) -> None:
+        await asyncio.get_running_loop().run_in_executor(None, self.put_writes, config, writes, task_id)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        results = await asyncio.get_running_loop().run_in_executor(
+            None, lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for checkpoint_tuple in results:
+            yield checkpoint_tuple
+
+    # --- Internals ---
+    def _load_tuple(self, cur: sqlite3.Cursor, thread_id: str, row: Sequence[Any]) -> CheckpointTuple:
+        thread_ts, parent_ts, msg_start, msg_count, encoding, data, metadata, metadata_encoding = row
+        checkpoint = self.serde.loads(self._decode(encoding, data))
+        cur.execute(
+            "SELECT encoding, data FROM log_messages WHERE thread_id = ? AND seq >= ? AND seq < ? ORDER BY seq",
+            (thread_id, msg_start, msg_start + msg_count),
+        )
+        messages = [self.serde.loads(self._decode(enc, blob)) for enc, blob in cur.fetchall()]
+        if msg_count or self.log_channel in checkpoint.get("channel_versions", {}):
+            checkpoint["channel_values"][self.log_channel] = messages
+        fields = [
+            {"configurable": {"thread_id": thread_id, "thread_ts": thread_ts}},
+            checkpoint,
+            self.serde.loads(self._decode(metadata_encoding, metadata)) if metadata is not None else {},
+            {"configurable": {"thread_id": thread_id, "thread_ts": parent_ts}} if parent_ts else None,
+        ]
+        if "pending_writes" in CheckpointTuple._fields: # langgraph versions with put_writes
+            fields.append(self._load_writes(cur, thread_id, thread_ts))
+        return CheckpointTuple(*fields)
+
+    def _load_writes(self, cur: sqlite3.Cursor, thread_id: str, thread_ts: str) -> List[Tuple[str, str, Any]]:
+        cur.execute(
+            "SELECT task_id, channel, encoding, value FROM log_writes WHERE thread_id = ? AND thread_ts = ? ORDER BY task_id, idx",
+            (thread_id, thread_ts),
+        )
+        return [(task_id, channel, self.serde.loads(self._decode(enc, value))) for task_id, channel, enc, value in cur.fetchall()]
+
+    def _log_length(self, cur: sqlite3.Cursor, thread_id: str) -> int:
+        row = cur.execute("SELECT log_length FROM log_threads WHERE thread_id = ?", (thread_id,)).fetchone()
+        return row[0] if row else 0
+
+    def _reusable_prefix(self, cur: sqlite3.Cursor, thread_id: str, parent_ts: Optional[str],
+                         keys: List[str]) -> Optional[Tuple[int, int]]:
+        """
+        (start, length) of the parent's log slice if the new checkpoint's messages begin with it, else None.
+        Compares the parent's message count and last message key, so the check does not grow with the history.
+        """
+        if not parent_ts:
+            return None
+        row = cur.execute(
+            "SELECT msg_start, msg_count, last_key FROM log_checkpoints WHERE thread_id = ? AND thread_ts = ?", (thread_id, parent_ts)
+        ).fetchone()
+        if row is None or row[1] > len(keys):
+            return None
+        msg_start, msg_count, last_key = row
+        if msg_count == 0:
+            return msg_start, 0
+        if last_key is not None:
+            return (msg_start, msg_count) if keys[msg_count - 1] == last_key else None
+        # Written before last_key was recorded: compare the whole slice
+        stored = [key for (key,) in cur.execute(
+            "SELECT message_key FROM log_messages WHERE thread_id = ? AND seq >= ? AND seq < ? ORDER BY seq",
+            (thread_id, msg_start, msg_start + msg_count),
+        )]
+        return (msg_start, msg_count) if stored == keys[:msg_count] else None
+
+    def _message_key(self, message: Any) -> str:
+        # add_messages gives every message an id; fall back to a content digest for anything without one
+        message_id = getattr(message, "id", None)
+        if message_id:
+            return str(message_id)
+        return "sha1:" + hashlib.sha1(self.serde.dumps(message)).hexdigest()
+
+    def _trim_thread(self, cur: sqlite3.Cursor, thread_id: str, keep_last: int, collect_log: bool = True) -> int:
+        removed = cur.execute(
+            "DELETE FROM log_checkpoints WHERE thread_id = ? AND thread_ts NOT IN "
+            "(SELECT thread_ts FROM log_checkpoints WHERE thread_id = ? ORDER BY thread_ts DESC LIMIT ?)",
+            (thread_id, thread_id, keep_last),
+        ).rowcount
+        if removed:
+            cur.execute(
+                "DELETE FROM log_writes WHERE thread_id = ? AND thread_ts NOT IN (SELECT thread_ts FROM log_checkpoints WHERE thread_id = ?)",
+                (thread_id, thread_id),
+            )
+        if removed and collect_log:
+            self._collect_log(cur, thread_id)
+        return removed
+
+    def _collect_log(self, cur: sqlite3.Cursor, thread_id: Optional[str] = None) -> int:
+        # Log entries outside every remaining checkpoint's slice are unreachable
+        query = ("DELETE FROM log_messages WHERE NOT EXISTS (SELECT 1 FROM log_checkpoints c "
+                 "WHERE c.thread_id = log_messages.thread_id AND log_messages.seq >= c.msg_start "
+                 "AND log_messages.seq < c.msg_start + c.msg_count)")
+        if thread_id is not None:
+            return cur.execute(query + " AND thread_id = ?", (thread_id,)).rowcount
+        return cur.execute(query).rowcount
+
+    def _encode(self, data: bytes) -> Tuple[int, bytes]:
+        if len(data) > self.compress_threshold:
+            compressed = zlib.compress(data, 6)
+            if len(compressed) < len(data):
+                return ZLIB, compressed
+        return RAW, data
+
+    @staticmethod
+    def _decode(encoding: int, data: bytes) -> bytes:
+        return zlib.decompress(data) if encoding == ZLIB else data
@@ -0,0 +1,202 @@
+# batch_replay.py (Run many recorded conversations through the graph offline)
+#
+# Input: JSONL, one conversation per line: {"thread_id": "...", "turns": ["first user message", ...]}
+# Output: JSONL, one line per finished conversation, with per-turn response, tool trace and timing:
+#   {"thread_id": ..., "turns": [{"turn": 0, "user": ..., "response": ..., "ms": ...,
+#                                 "tools": [{"name": ..., "args": {...}, "ok": true, "output": ...}]}], "ms": ...}
+#
+# Conversations are spread across a process pool; each worker process compiles its own graph on a
+# throwaway checkpoint store (a temp SQLite file, or one per worker under --checkpoint-dir). A conversation
+# always runs on one worker, turn by turn, so each thread's turns stay in order. Inside a worker,
+# --concurrency conversations run together on one event loop, so their model and backend calls overlap.
+# Results are appended as conversations finish (workers send each record back on a queue the moment its
+# conversation ends, not when their whole batch does); re-running with the same --output skips every
+# thread_id already in it, so an interrupted replay resumes where it stopped.
+# The answer cache is off by default: a replay should record what the agent says to each turn, not an answer
+# stored from an earlier conversation (and hit rates would depend on which worker got which conversation).
+# Pass --answer-cache to measure it.
+#
+# Usage: python batch_replay.py conversations.jsonl --output results.jsonl --workers 4 --concurrency 16 [--fake-llm]
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import queue
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterator, List, Set
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+
+# Per-process state, set up once by _init_worker
+_worker: Dict[str, Any] = {}
+
+
+def read_conversations(path: str) -> Iterator[Dict[str, Any]]:
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            conversation = json.loads(line)
+            if "thread_id" not in conversation or not isinstance(conversation.get("turns"), list):
+                raise ValueError(f"{path}:{line_number}: expected {{\"thread_id\": ..., \"turns\": [...]}}")
+            yield conversation
+
+
+def finished_thread_ids(path: str) -> Set[str]:
+    """thread_ids already replayed successfully; a truncated last line (interrupted write) is ignored."""
+    done: Set[str] = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if "error" not in record:
+                done.add(record["thread_id"])
+    return done
+
+
+# --- Worker process ---
+def _init_worker(checkpoint_dir: str, fake_llm: bool, llm_latency: float, fast_path: bool, answer_cache: bool,
+                 results: Any) -> None:
+    import app
+    from append_only_saver import AppendOnlySaver
+    from fake_llm import ScriptedChatModel
+
+    saver = AppendOnlySaver.from_conn_string(os.path.join(checkpoint_dir, f"replay-{os.getpid()}.db"))
+    _worker["graph"] = app.workflow.compile(checkpointer=saver)
+    _worker["llm"] = ScriptedChatModel(latency=llm_latency) if fake_llm else app.create_app().llm
+    _worker["tools"] = app.all_tools
+    _worker["fast_path"] = fast_path
+    _worker["answer_cache"] = answer_cache
+    _worker["results"] = results
+
+
+def _replay_chunk(conversations: List[Dict[str, Any]]) -> int:
+    """Replays the conversations together and sends each record to the driver as soon as it is ready."""
+    async def replay_and_send(conversation: Dict[str, Any]) -> None:
+        _worker["results"].put(await _replay_conversation(conversation))
+
+    async def run_all() -> None:
+        await asyncio.gather(*(replay_and_send(conversation) for conversation in conversations))
+
+    asyncio.run(run_all())
+    return len(conversations)
+
+
+async def _replay_conversation(conversation: Dict[str, Any]) -> Dict[str, Any]:
+    thread_id = str(conversation["thread_id"])
+    config = {"configurable": {"thread_id": thread_id, "llm": _worker["llm"], "tools": _worker["tools"],
+                               "fast_path": _worker["fast_path"], "answer_cache": _worker["answer_cache"]}}
+    started_at = time.perf_counter()
+    turns: List[Dict[str, Any]] = []
+    try:
+        for index, user_message in enumerate(conversation["turns"]):
+            turn_started_at = time.perf_counter()
+            result = await _worker["graph"].ainvoke({"messages": [HumanMessage(content=user_message)]}, config=config)
+            turn = _turn_record(index, user_message, result["messages"])
+            turn["ms"] = round((time.perf_counter() - turn_started_at) * 1000, 1)
+            turns.append(turn)
+    except (Exception, asyncio.CancelledError) as e:
+        # A cancelled turn (CancelledError is not an Exception) fails this conversation, not its whole batch
+        return {"thread_id": thread_id, "turns": turns, "error": f"{type(e).__name__}: {e}"}
+    return {"thread_id": thread_id, "turns": turns, "ms": round((time.perf_counter() - started_at) * 1000, 1)}
+
+
+def _turn_record(index: int, user_message: str, messages: List[BaseMessage]) -> Dict[str, Any]:
+    # This turn's messages: everything after the last HumanMessage
+    start = max(i for i, message in enumerate(messages) if isinstance(message, HumanMessage)) + 1
+    turn_messages = messages[start:]
+    outputs = {m.tool_call_id: m.content for m in turn_messages if isinstance(m, ToolMessage)}
+    tools = [
+        {"name": call["name"], "args": call["args"], "ok": not str(outputs.get(call["id"], "")).startswith('{"error":'),
+         "output": outputs.get(call["id"])}
+        for m in turn_messages if isinstance(m, AIMessage) for call in m.tool_calls
+    ]
+    return {"turn": index, "user": user_message, "response": turn_messages[-1].content if turn_messages else "", "tools": tools}
+
+
+# --- Driver ---
+def _chunks(items: List[Dict[str, Any]], size: int) -> Iterator[List[Dict[str, Any]]]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Replay recorded conversations through the graph")
+    parser.add_argument("input", help="JSONL of {\"thread_id\", \"turns\"}")
+    parser.add_argument("--output", required=True, help="Results JSONL (appended to; finished threads are skipped)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes")
+    parser.add_argument("--concurrency", type=int, default=16, help="Conversations in flight per worker")
+    parser.add_argument("--checkpoint-dir", help="Keep per-worker checkpoint DBs here instead of throwaway temp files")
+    parser.add_argument("--fake-llm", action="store_true", help="Use the scripted model from fake_llm.py (no OpenAI calls)")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Seconds per fake model call")
+    parser.add_argument("--no-fast-path", action="store_true", help="Send every turn through the agent")
+    parser.add_argument("--answer-cache", action="store_true", help="Serve cached answers to general questions (off by default)")
+    args = parser.parse_args()
+
+    done = finished_thread_ids(args.output)
+    pending = [c for c in read_conversations(args.input) if str(c["thread_id"]) not in done]
+    print(f"{len(pending)} conversations to replay ({len(done)} already in {args.output})", file=sys.stderr)
+    if args.checkpoint_dir:
+        os.makedirs(args.checkpoint_dir, exist_ok=True)
+
+    started_at = time.perf_counter()
+    finished = failed = turns = 0
+    context = multiprocessing.get_context()
+    results = context.Queue()
+    with tempfile.TemporaryDirectory(prefix="replay-") as tmp_dir, open(args.output, "a", encoding="utf-8") as out:
+        written: Set[str] = set()
+
+        def write(record: Dict[str, Any]) -> None:
+            nonlocal finished, failed, turns
+            out.write(json.dumps(record, default=str) + "\n")
+            out.flush()
+            finished += 1
+            failed += "error" in record
+            turns += len(record["turns"])
+            written.add(str(record["thread_id"]))
+            if finished % args.concurrency == 0 or finished == len(pending):
+                print(f"  {finished}/{len(pending)} conversations", file=sys.stderr)
+
+        initargs = (args.checkpoint_dir or tmp_dir, args.fake_llm, args.llm_latency, not args.no_fast_path, args.answer_cache,
+                    results)
+        pool = ProcessPoolExecutor(max_workers=args.workers, mp_context=context, initializer=_init_worker, initargs=initargs)
+        with pool: # shut down before the temp dir holding the workers' checkpoint DBs is removed
+            chunks = {pool.submit(_replay_chunk, chunk): chunk for chunk in _chunks(pending, args.concurrency)}
+            while finished < len(pending):
+                try:
+                    record = results.get(timeout=0.5)
+                except queue.Empty:
+                    record = None
+                if record is not None:
+                    write(record)
+                    continue
+                # Nothing arrived: a batch whose worker failed (e.g. the process died) will never send the rest
+                # of its records, so they are written as errors here; once every batch is done, so is anything
+                # still missing
+                all_done = all(future.done() for future in chunks)
+                for future, chunk in chunks.items():
+                    if future.done() and (future.exception() is not None or all_done):
+                        exception = future.exception()
+                        error = f"worker failed: {type(exception).__name__}: {exception}" if exception else "no result received"
+                        for conversation in chunk:
+                            if str(conversation["thread_id"]) not in written:
+                                write({"thread_id": str(conversation["thread_id"]), "turns": [], "error": error})
+                if all_done:
+                    break
+
+    seconds = time.perf_counter() - started_at
+    print(f"Replayed {finished} conversations ({turns} turns, {failed} failed) in {seconds:.1f} s "
+          f"({turns / seconds if seconds else 0:.1f} turns/s)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+# bench_checkpoint.py (Write amplification and DB size: SQLiteSaver vs AppendOnlySaver)
+#
+# Replays the checkpoint writes of long conversations directly against both savers. Every turn
+# produces the same checkpoints the graph writes: input, agent (tool call), tool_executor (tool
+# output), agent (final answer). Both savers get identical checkpoints.
+#
+# Usage: python bench_checkpoint.py --threads 20 --turns 50 --tool-bytes 2000
+
+import argparse
+import os
+import tempfile
+import time
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langgraph.checkpoint.base import empty_checkpoint
+from langgraph.checkpoint.id import uuid6
+from langgraph.checkpoint.sqlite import SQLiteSaver
+
+from append_only_saver import AppendOnlySaver
+
+
+def _db_size(path: str) -> int:
+    return sum(os.path.getsize(p) for p in (path, path + "-wal") if os.path.exists(p))
+
+
+def replay(saver, threads: int, turns: int, tool_bytes: int) -> dict:
+    payload = {"ids": ["MED-ID-12345-A", "MED-ID-12345-B"], "primary_id": "MED-ID-12345-A", "history": "x" * tool_bytes}
+    bytes_serialized = 0
+    puts = 0
+    start = time.perf_counter()
+    for thread in range(threads):
+        config = {"configurable": {"thread_id": f"thread-{thread}"}}
+        messages = []
+        for turn in range(turns):
+            call_id = f"call_{thread}_{turn}"
+            for new_message in (
+                HumanMessage(content=f"Turn {turn}: what's the status of my ID card? Member 12345.", id=f"h{turn}"),
+                AIMessage(content="", tool_calls=[{"name": "get_id_list", "args": {"member_id": "12345"}, "id": call_id}], id=f"a{turn}"),
+                ToolMessage(content=str(payload), name="get_id_list", tool_call_id=call_id, id=f"t{turn}"),
+                AIMessage(content="Your card MED-ID-12345-A has shipped (tracking TRK789).", id=f"f{turn}"),
+            ):
+                messages = messages + [new_message]
+                checkpoint = empty_checkpoint()
+                checkpoint["id"] = str(uuid6())
+                checkpoint["channel_values"] = {"messages": messages}
+                checkpoint["channel_versions"] = {"messages": len(messages)}
+                metadata = {"source": "loop", "step": len(messages)}
+                if isinstance(saver, SQLiteSaver):
+                    bytes_serialized += len(saver.serde.dumps(checkpoint)) + len(saver.serde.dumps(metadata))
+                config = saver.put(config, checkpoint, metadata)
+                puts += 1
+    return {"seconds": time.perf_counter() - start, "puts": puts, "bytes_written": bytes_serialized}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Checkpoint write amplification benchmark")
+    parser.add_argument("--threads", type=int, default=20)
+    parser.add_argument("--turns", type=int, default=50)
+    parser.add_argument("--tool-bytes", type=int, default=2000, help="Size of the padding in each ToolMessage payload")
+    parser.add_argument("--keep-last", type=int, default=20, help="AppendOnlySaver retention (checkpoints per thread)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        baseline_path = os.path.join(tmp_dir, "baseline.db")
+        append_path = os.path.join(tmp_dir, "append_only.db")
+        baseline = SQLiteSaver.from_conn_string(baseline_path)
+        append_only = AppendOnlySaver.from_conn_string(append_path, keep_last=args.keep_last)
+
+        base = replay(baseline, args.threads, args.turns, args.tool_bytes)
+        ours = replay(append_only, args.threads, args.turns, args.tool_bytes)
+        ours["bytes_written"] = append_only.stats()["bytes_written"]
+        base_size, ours_size = _db_size(baseline_path), _db_size(append_path)
+
+    print(f"{args.threads} threads x {args.turns} turns ({base['puts']} checkpoints per saver, {args.tool_bytes} B tool payloads)")
+    print(f"  {'saver':<16}{'bytes written':>16}{'DB size':>14}{'seconds':>10}")
+    print(f"  {'SQLiteSaver':<16}{base['bytes_written']:>16,}{base_size:>14,}{base['seconds']:>10.2f}")
+    print(f"  {'AppendOnlySaver':<16}{ours['bytes_written']:>16,}{ours_size:>14,}{ours['seconds']:>10.2f}")
+    print(f"  write amplification reduced {base['bytes_written'] / max(ours['bytes_written'], 1):.1f}x, "
+          f"DB size reduced {base_size / max(ours_size, 1):.1f}x")
+
+
+if __name__ == "__main__":
+    main()
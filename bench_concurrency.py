@@ -0,0 +1,133 @@
+# bench_concurrency.py (Sync vs async graph throughput under the same load)
+#
+# Runs the same set of simulated conversations through the graph twice:
+#   - sync:  app_graph.invoke on a fixed-size thread pool (one thread per in-flight turn)
+#   - async: async_app_graph.ainvoke on a single event loop (no thread per in-flight turn)
+# The model is the scripted fake from fake_llm.py and the backend is MockApiClient with injected
+# latency, so no OpenAI key or network is needed.
+# --saver picks the checkpointer both runs write to: langgraph's SQLiteSaver/AsyncSqliteSaver (the default),
+# AppendOnlySaver (append_only_saver.py) or ShardedSaver with --shards files (sharded_saver.py).
+#
+# Usage: python bench_concurrency.py --conversations 200 --turns 3 --llm-latency 0.05 --api-latency 0.02 [--saver sharded]
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Iterator
+
+from langchain_core.messages import HumanMessage
+from langgraph.checkpoint.sqlite import SQLiteSaver
+from langgraph.checkpoint.aiosqlite import AsyncSqliteSaver
+
+import app
+from append_only_saver import AppendOnlySaver
+from fake_llm import ScriptedChatModel
+from sharded_saver import ShardedSaver
+
+SAVERS = ("sqlite", "append_only", "sharded")
+
+USER_TURNS = [
+    "What's the status of my ID card? My member ID is 12345.",
+    "Do I have dental coverage?",
+    "Am I an active member?",
+]
+
+
+def _config(thread_id: str, llm: ScriptedChatModel) -> dict:
+    # The fast path is off so every turn pays the simulated model latency this benchmark is about
+    return {"configurable": {"thread_id": thread_id, "llm": llm, "tools": app.all_tools, "fast_path": False}}
+
+
+@contextmanager
+def open_saver(kind: str, db_path: str, shards: int) -> Iterator[Any]:
+    if kind == "sqlite":
+        with SQLiteSaver.from_conn_string(db_path) as saver:
+            yield saver
+    elif kind == "append_only":
+        saver = AppendOnlySaver.from_conn_string(db_path)
+        try:
+            yield saver
+        finally:
+            saver.conn.close()
+    else:
+        yield ShardedSaver(db_path, shards)
+
+
+@asynccontextmanager
+async def open_async_saver(kind: str, db_path: str, shards: int) -> AsyncIterator[Any]:
+    if kind == "sqlite":
+        # The saver must be closed: aiosqlite's connection thread is not a daemon and keeps the process alive
+        async with AsyncSqliteSaver.from_conn_string(db_path) as saver:
+            yield saver
+    else:
+        # AppendOnlySaver and ShardedSaver serve both paths (their async methods run on the default executor)
+        with open_saver(kind, db_path, shards) as saver:
+            yield saver
+
+
+def run_sync(conversations: int, turns: int, llm: ScriptedChatModel, workers: int, db_path: str,
+             saver_kind: str = "sqlite", shards: int = 4) -> float:
+    with open_saver(saver_kind, db_path, shards) as saver:
+        graph = app.workflow.compile(checkpointer=saver)
+
+        def converse(index: int) -> None:
+            config = _config(f"sync-{index}", llm)
+            for turn in range(turns):
+                graph.invoke({"messages": [HumanMessage(content=USER_TURNS[turn % len(USER_TURNS)])]}, config=config)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(converse, range(conversations)))
+        return time.perf_counter() - start
+
+
+async def run_async(conversations: int, turns: int, llm: ScriptedChatModel, db_path: str,
+                    saver_kind: str = "sqlite", shards: int = 4) -> float:
+    async with open_async_saver(saver_kind, db_path, shards) as saver:
+        graph = app.workflow.compile(checkpointer=saver)
+
+        async def converse(index: int) -> None:
+            config = _config(f"async-{index}", llm)
+            for turn in range(turns):
+                await graph.ainvoke({"messages": [HumanMessage(content=USER_TURNS[turn % len(USER_TURNS)])]}, config=config)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(converse(i) for i in range(conversations)))
+        return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Sync vs async graph throughput under the same load")
+    parser.add_argument("--conversations", type=int, default=200, help="Concurrent simulated conversations (thread_ids)")
+    parser.add_argument("--turns", type=int, default=3, help="User turns per conversation")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Seconds per fake model call")
+    parser.add_argument("--api-latency", type=float, default=0.02, help="Seconds per mock backend call")
+    parser.add_argument("--workers", type=int, default=16, help="Thread pool size for the sync run")
+    parser.add_argument("--saver", choices=SAVERS, default="sqlite", help="Checkpointer both runs write to")
+    parser.add_argument("--shards", type=int, default=4, help="Shard files for --saver sharded")
+    args = parser.parse_args()
+
+    llm = ScriptedChatModel(latency=args.llm_latency)
+    app._mock_api_client.latency = args.api_latency
+    total_turns = args.conversations * args.turns
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        sync_seconds = run_sync(args.conversations, args.turns, llm, args.workers, os.path.join(tmp_dir, "sync.db"),
+                                args.saver, args.shards)
+        async_seconds = asyncio.run(run_async(args.conversations, args.turns, llm, os.path.join(tmp_dir, "async.db"),
+                                              args.saver, args.shards))
+
+    print(f"Load: {args.conversations} conversations x {args.turns} turns = {total_turns} turns "
+          f"(llm {args.llm_latency * 1000:.0f} ms, backend {args.api_latency * 1000:.0f} ms, "
+          f"saver {args.saver}{f' x {args.shards}' if args.saver == 'sharded' else ''})")
+    print(f"  sync  ({args.workers} threads): {sync_seconds:8.2f} s  {total_turns / sync_seconds:8.1f} turns/s")
+    print(f"  async (1 event loop): {async_seconds:8.2f} s  {total_turns / async_seconds:8.1f} turns/s")
+    print(f"  speedup: {sync_seconds / async_seconds:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+# bench_load.py (Offline load test of the full graph: throughput, latency percentiles, per-node time, DB growth, RSS)
+#
+# Drives N concurrent simulated conversations through the compiled graph for many turns, with the
+# scripted fake model from fake_llm.py and either MockApiClient or the local HTTP stub (stub_server.py)
+# as the backend, both with configurable latency. No OpenAI key or network is needed, so the numbers
+# can be compared run to run to catch regressions in the graph, checkpointer and tools.
+#
+# Usage: python bench_load.py --conversations 50 --turns 10 --llm-latency 0.05 --api-latency 0.02 [--backend stub]
+#        python bench_load.py --mode sync --workers 16 --no-fast-path --no-cache --json results.json
+#        python bench_load.py --no-fast-path --backend stub --prefetch   (prefetch hit/waste and extra backend requests)
+#        python bench_load.py --no-cache --batch-window-ms 5 --max-batch 16   (singleflight + micro-batching)
+#        python bench_load.py --no-fast-path --llm-rpm 1200 --llm-burst-seconds 1 --tenants 4   (LLM queue wait under a rate limit)
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Tuple
+
+from langchain_core.messages import HumanMessage
+
+import app
+from api_client import ApiClient
+from append_only_saver import AppendOnlySaver
+from fake_llm import ScriptedChatModel
+from instrumentation import tracer
+from stub_server import StubBackend
+
+# A mix of fast-path intents, multi-step tool chains and plain chat, cycled per conversation
+USER_TURNS = [
+    "What's the status of my ID card? My member ID is 12345.",
+    "Do I have dental coverage?",
+    "Am I an active member? My member ID is 12345.",
+    "Can you check my ID cards again? Member 12345.",
+    "Thanks, that's all for now.",
+]
+
+
+class NodeTimeSink:
+    """Trace sink that keeps every span duration per (kind, name) for the per-node breakdown."""
+    sampled = False
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.durations: Dict[Tuple[str, str], List[float]] = {}
+
+    def export(self, span: Any) -> None:
+        label = str(span.attributes.get("tool") or span.attributes.get("endpoint") or span.name)
+        with self._lock:
+            self.durations.setdefault((span.kind, label), []).append(span.duration_ms)
+
+
+def percentile(ordered: List[float], q: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(int(len(ordered) * q), len(ordered) - 1)]
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024 # bytes on macOS, KiB on Linux
+
+
+def _file_size(path: str) -> int:
+    return os.path.getsize(path) if os.path.exists(path) else 0
+
+
+class LoadRun:
+    def __init__(self, args: argparse.Namespace, db_path: str):
+        self.args = args
+        self.db_path = db_path
+        self.saver = AppendOnlySaver.from_conn_string(db_path, keep_last=args.keep_last)
+        self.graph = app.workflow.compile(checkpointer=self.saver)
+        self.llm = ScriptedChatModel(latency=args.llm_latency)
+        self.turn_ms: List[float] = []
+        # (turns completed, main DB bytes, WAL bytes). Mid-run samples are taken as is: the main file only grows
+        # when SQLite checkpoints the WAL into it, so read them together. The final sample follows a TRUNCATE
+        # checkpoint, so its main DB size is everything the run wrote.
+        self.db_growth: List[Tuple[int, int, int]] = []
+        self._lock = threading.Lock()
+
+    def config(self, index: int) -> Dict[str, Any]:
+        return {"configurable": {"thread_id": f"load-{index}", "tenant_id": f"tenant-{index % self.args.tenants}",
+                                 "llm": self.llm, "tools": app.all_tools, "fast_path": not self.args.no_fast_path}}
+
+    def message(self, index: int, turn: int) -> Dict[str, Any]:
+        return {"messages": [HumanMessage(content=USER_TURNS[(index + turn) % len(USER_TURNS)])]}
+
+    def record(self, started_at: float) -> None:
+        with self._lock:
+            self.turn_ms.append((time.perf_counter() - started_at) * 1000)
+            if len(self.turn_ms) % self.args.sample_every == 0:
+                self.sample_db()
+
+    def sample_db(self, checkpoint: bool = False) -> None:
+        if checkpoint:
+            with self.saver.lock:
+                self.saver.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        self.db_growth.append((len(self.turn_ms), _file_size(self.db_path), _file_size(self.db_path + "-wal")))
+
+    def run_sync(self) -> float:
+        def converse(index: int) -> None:
+            config = self.config(index)
+            for turn in range(self.args.turns):
+                started_at = time.perf_counter()
+                self.graph.invoke(self.message(index, turn), config=config)
+                self.record(started_at)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.args.workers) as pool:
+            list(pool.map(converse, range(self.args.conversations)))
+        return time.perf_counter() - start
+
+    async def run_async(self) -> float:
+        async def converse(index: int) -> None:
+            config = self.config(index)
+            for turn in range(self.args.turns):
+                started_at = time.perf_counter()
+                await self.graph.ainvoke(self.message(index, turn), config=config)
+                self.record(started_at)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(converse(i) for i in range(self.args.conversations)))
+        return time.perf_counter() - start
+
+
+def report(args: argparse.Namespace, run: LoadRun, seconds: float, node_times: NodeTimeSink, rss_before: float) -> Dict[str, Any]:
+    ordered = sorted(run.turn_ms)
+    breakdown = {
+        f"{kind}:{name}": {"count": len(durations), "total_ms": round(sum(durations), 1),
+                           "p50_ms": round(percentile(sorted(durations), 0.50), 2),
+                           "p95_ms": round(percentile(sorted(durations), 0.95), 2)}
+        for (kind, name), durations in sorted(node_times.durations.items())
+    }
+    return {
+        "load": {"conversations": args.conversations, "turns": args.turns, "mode": args.mode, "backend": args.backend,
+                 "llm_latency_ms": args.llm_latency * 1000, "api_latency_ms": args.api_latency * 1000,
+                 "fast_path": not args.no_fast_path, "cache": not args.no_cache, "prefetch": args.prefetch,
+                 "coalesce": not args.no_coalesce, "batch_window_ms": args.batch_window_ms,
+                 "llm_rpm": args.llm_rpm, "llm_tpm": args.llm_tpm, "tenants": args.tenants},
+        "seconds": round(seconds, 3),
+        "turns_per_second": round(len(ordered) / seconds, 2),
+        "turn_latency_ms": {"p50": round(percentile(ordered, 0.50), 2), "p95": round(percentile(ordered, 0.95), 2),
+                            "p99": round(percentile(ordered, 0.99), 2), "max": round(ordered[-1], 2) if ordered else 0.0},
+        "breakdown": breakdown,
+        "db_growth_bytes": run.db_growth,
+        "db_bytes_per_turn": round(run.db_growth[-1][1] / run.db_growth[-1][0], 1) if run.db_growth else 0.0,
+        "fast_path": app.fast_path.stats(),
+        "prefetch": app._backend.stats(),
+        "coalescing": app._coalescing_client.stats(),
+        "llm_scheduler": app.llm_scheduler.stats(),
+        "answer_cache": app.answer_cache.stats(),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "rss_growth_mb": round(peak_rss_mb() - rss_before, 1),
+    }
+
+
+def print_report(result: Dict[str, Any]) -> None:
+    load = result["load"]
+    print(f"Load: {load['conversations']} conversations x {load['turns']} turns, {load['mode']}, backend={load['backend']} "
+          f"(llm {load['llm_latency_ms']:.0f} ms, backend {load['api_latency_ms']:.0f} ms, "
+          f"fast path {'on' if load['fast_path'] else 'off'}, cache {'on' if load['cache'] else 'off'})")
+    latency = result["turn_latency_ms"]
+    print(f"  {result['turns_per_second']:.1f} turns/s over {result['seconds']:.2f} s")
+    print(f"  turn latency ms: p50 {latency['p50']:.1f}  p95 {latency['p95']:.1f}  p99 {latency['p99']:.1f}  max {latency['max']:.1f}")
+    print(f"  {'span':<34}{'count':>8}{'total ms':>12}{'p50 ms':>10}{'p95 ms':>10}")
+    for name, row in result["breakdown"].items():
+        print(f"  {name:<34}{row['count']:>8}{row['total_ms']:>12.1f}{row['p50_ms']:>10.2f}{row['p95_ms']:>10.2f}")
+    if result["db_growth_bytes"]:
+        turns, size, _ = result["db_growth_bytes"][-1]
+        peak_wal = max(wal for _, _, wal in result["db_growth_bytes"])
+        print(f"  checkpoint DB: {size:,} bytes after {turns} turns ({result['db_bytes_per_turn']:.0f} bytes/turn, "
+              f"WAL checkpointed; peak WAL {peak_wal:,} bytes)")
+    print(f"  fast path hit rate: {result['fast_path']['hit_rate']:.0%}")
+    prefetch = result["prefetch"]
+    if prefetch["enabled"]:
+        print(f"  prefetch: {prefetch['started']:.0f} started, {prefetch['hits']:.0f} used ({prefetch['hit_rate']:.0%}), "
+              f"{prefetch['wasted']:.0f} wasted, {prefetch['avg_saved_ms']:.1f} ms saved per use")
+    coalescing = result["coalescing"]
+    if load["coalesce"]:
+        print(f"  coalescing: {coalescing['requests']} lookups -> {coalescing['backend_calls']} backend calls "
+              f"(ratio {coalescing['coalesce_ratio']:.2f}, {coalescing['coalesced']} shared, "
+              f"{coalescing['batches']} batches of {coalescing['avg_batch_size']:.1f})")
+    scheduler = result["llm_scheduler"]
+    if scheduler["limited"]:
+        print(f"  llm queue: {scheduler['queued']} of {scheduler['granted']} calls waited (p50 {scheduler['wait_ms']['p50']:.0f} ms, "
+              f"p95 {scheduler['wait_ms']['p95']:.0f} ms), peak depth {scheduler['peak_queue_depth']}, "
+              f"{scheduler['rejected'] + scheduler['timed_out']} rejected")
+    answers = result["answer_cache"]
+    if answers["lookups"]:
+        print(f"  answer cache: {answers['hits']} of {answers['lookups']} lookups hit ({answers['hit_rate']:.0%}), "
+              f"{answers['avg_saved_ms']:.0f} ms saved per hit, {sum(answers['bypassed'].values())} member-specific/contextual turns bypassed")
+    if "backend_requests" in result:
+        print(f"  backend requests: {result['backend_requests']}")
+    print(f"  peak RSS: {result['peak_rss_mb']:.1f} MB (+{result['rss_growth_mb']:.1f} MB during the run)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Offline load test of the full graph")
+    parser.add_argument("--conversations", type=int, default=50, help="Concurrent simulated conversations (thread_ids)")
+    parser.add_argument("--turns", type=int, default=10, help="User turns per conversation")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Seconds per fake model call")
+    parser.add_argument("--api-latency", type=float, default=0.02, help="Seconds per backend call")
+    parser.add_argument("--backend", choices=("mock", "stub"), default="mock", help="In-process MockApiClient or the HTTP stub server")
+    parser.add_argument("--mode", choices=("async", "sync"), default="async", help="One event loop, or a thread pool")
+    parser.add_argument("--workers", type=int, default=16, help="Thread pool size for --mode sync")
+    parser.add_argument("--no-fast-path", action="store_true", help="Send every turn through the agent")
+    parser.add_argument("--no-cache", action="store_true", help="Disable the backend response cache")
+    parser.add_argument("--no-coalesce", action="store_true", help="Disable singleflight and batching of backend lookups")
+    parser.add_argument("--batch-window-ms", type=float, default=0.0, help="Micro-batching window for /id-status and /comets-data (0 = off)")
+    parser.add_argument("--max-batch", type=int, default=16, help="Most IDs per batched request")
+    parser.add_argument("--prefetch", action="store_true", help="Prefetch /id-status and /comets-data after /id-list")
+    parser.add_argument("--prefetch-all-ids", action="store_true", help="With --prefetch, for every card ID, not just the primary")
+    parser.add_argument("--llm-rpm", type=float, default=0, help="LLM requests per minute (0 = no limit)")
+    parser.add_argument("--llm-tpm", type=float, default=0, help="LLM tokens per minute (0 = no limit)")
+    parser.add_argument("--llm-burst-seconds", type=float, default=60.0, help="Seconds of budget the rate-limit buckets hold")
+    parser.add_argument("--llm-max-in-flight", type=int, default=0, help="Concurrent LLM calls (0 = no limit)")
+    parser.add_argument("--tenants", type=int, default=1, help="Spread the conversations over this many tenants")
+    parser.add_argument("--keep-last", type=int, default=20, help="Checkpoints kept per thread")
+    parser.add_argument("--sample-every", type=int, default=50, help="Record the DB size every N completed turns")
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+
+    rss_before = peak_rss_mb()
+    node_times = NodeTimeSink()
+    tracer.add_sink(node_times)
+    if args.no_cache:
+        app._api_client.endpoint_ttls = {}
+    app._backend.enabled = args.prefetch
+    app._coalescing_client.enabled = not args.no_coalesce
+    app._coalescing_client.batch_window = args.batch_window_ms / 1000
+    app._coalescing_client.max_batch_size = args.max_batch
+    app._backend.all_ids = args.prefetch_all_ids
+    app.llm_scheduler.configure(args.llm_rpm, args.llm_tpm, args.llm_burst_seconds)
+    app.llm_scheduler.max_in_flight = args.llm_max_in_flight
+    app.llm_scheduler.max_queue = max(app.llm_scheduler.max_queue, args.conversations) # measure waits, not rejections
+    app.llm_scheduler.max_wait = 300.0
+
+    stub = None
+    if args.backend == "stub":
+        stub = StubBackend(latency=args.api_latency).start()
+        app._coalescing_client.client = ApiClient(stub.base_url, pool_size=max(args.workers, 32))
+    else:
+        app._mock_api_client.latency = args.api_latency
+
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            run = LoadRun(args, os.path.join(tmp_dir, "load.db"))
+            seconds = run.run_sync() if args.mode == "sync" else asyncio.run(run.run_async())
+            run.sample_db(checkpoint=True)
+            result = report(args, run, seconds, node_times, rss_before)
+            if stub is not None:
+                result["backend_requests"] = stub.stats()["requests"]
+    finally:
+        if stub is not None:
+            stub.stop()
+
+    print_report(result)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# bench_prompt_tokens.py (Prompt-token savings report)
+#
+# 1. Runs the example queries from SYSTEM_PROMPT through the tool registry and reports how many
+#    tool-schema tokens per turn are saved by offering only the relevant tools.
+# 2. Replays a long scripted thread and reports the history tokens sent per agent step with and
+#    without the history compactor.
+#
+# Usage: python bench_prompt_tokens.py [--turns 40] [--budget 4000]
+
+import argparse
+
+from langchain_core.messages import HumanMessage, ToolMessage
+
+import app
+from fake_llm import ScriptedChatModel
+from history_compaction import HistoryCompactor
+from token_counting import count_messages_tokens
+from tool_registry import ToolRegistry
+
+EXAMPLE_QUERIES = [
+    "List my ID cards. My member ID is 12345.",
+    "What's the status of my ID card?",
+    "Where is my new Medicare card?",
+    "I need a new ID card, I lost it.",
+    "What are the benefits of my plan?",
+    "Is dental included in my Medicare plan?",
+    "Am I an active member?",
+    "What's my membership status?",
+    "Hello!",
+]
+
+
+def report_tool_subsetting() -> None:
+    registry = ToolRegistry(app.all_tools)
+    llm = ScriptedChatModel()
+    full = sum(registry.schema_tokens.values())
+    print(f"All {len(registry.tool_names)} tool schemas: {full} tokens per agent step")
+    for query in EXAMPLE_QUERIES:
+        _, names = registry.bind(llm, [HumanMessage(content=query)])
+        sent = sum(registry.schema_tokens[name] for name in names)
+        print(f"  {sent:5d} tokens ({len(names)} tools)  {query}")
+    stats = registry.stats()
+    print(f"Saved {stats['tokens_saved_per_turn']:.0f} tool-schema tokens per turn on average "
+          f"({stats['schema_tokens_saved']} of {stats['schema_tokens_full']})")
+
+
+def report_history_compaction(turns: int, budget: int) -> None:
+    compactor = HistoryCompactor(max_prompt_tokens=budget)
+    llm = ScriptedChatModel()
+    messages = []
+    uncompacted_total = 0
+    for turn in range(turns):
+        messages.append(HumanMessage(content=EXAMPLE_QUERIES[turn % len(EXAMPLE_QUERIES)] + " My member ID is 12345."))
+        while True: # one agent step per iteration, as in the graph
+            uncompacted_total += count_messages_tokens(messages)
+            reply = llm.invoke(compactor.compact(messages))
+            messages.append(reply)
+            if not reply.tool_calls:
+                break
+            for call in reply.tool_calls:
+                tool_ = next(t for t in app.all_tools if t.name == call["name"])
+                messages.append(ToolMessage(content=str(tool_.invoke(call["args"])), name=call["name"], tool_call_id=call["id"]))
+    stats = compactor.stats()
+    print(f"{turns} turns, {stats['calls']} agent steps, history budget {budget} tokens")
+    print(f"  history tokens sent without compaction: {uncompacted_total}")
+    print(f"  history tokens sent with compaction:    {stats['prompt_tokens_after']}")
+    print(f"  saved: {stats['prompt_tokens_saved']} ({stats['saved_ratio']:.0%}), "
+          f"final thread size {count_messages_tokens(messages)} tokens")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prompt-token savings report")
+    parser.add_argument("--turns", type=int, default=40, help="Turns in the simulated long thread")
+    parser.add_argument("--budget", type=int, default=4000, help="History token budget for the compactor")
+    args = parser.parse_args()
+
+    report_tool_subsetting()
+    print()
+    report_history_compaction(args.turns, args.budget)
@@ -0,0 +1,89 @@
+# bench_sharded_saver.py (Checkpoint write throughput vs shard count, with concurrent writer processes)
+#
+# Starts --writers processes that all write checkpoints at once, the way several server workers share one
+# checkpoint store. Each writer owns its own threads and writes the checkpoints a turn produces (input,
+# tool call, tool output, final answer), with one SQLite commit per checkpoint. The same load runs against
+# 1, 2, 4, ... shard files; with one file every commit waits for the single database write lock.
+#
+# Usage: python bench_sharded_saver.py --writers 8 --threads 8 --turns 10 --shards 1 2 4 8
+
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+from typing import Dict, List
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langgraph.checkpoint.base import empty_checkpoint
+from langgraph.checkpoint.id import uuid6
+
+from sharded_saver import ShardedSaver
+
+
+def write_conversations(base_path: str, shards: int, writer: int, threads: int, turns: int, start_at: float) -> Dict[str, float]:
+    saver = ShardedSaver(base_path, shards, keep_last=20)
+    payload = '{"ids":["MED-ID-12345-A","MED-ID-12345-B"],"primary_id":"MED-ID-12345-A"}'
+    time.sleep(max(0.0, start_at - time.time())) # all writers start together
+    started_at = time.perf_counter()
+    put_ms: List[float] = []
+    for thread in range(threads):
+        thread_id = f"writer-{writer}-thread-{thread}"
+        config = {"configurable": {"thread_id": thread_id}}
+        messages = []
+        for turn in range(turns):
+            call_id = f"call_{writer}_{thread}_{turn}"
+            for new_message in (
+                HumanMessage(content=f"Turn {turn}: what's the status of my ID card? Member 12345.", id=f"h{turn}"),
+                AIMessage(content="", tool_calls=[{"name": "get_id_list", "args": {"member_id": "12345"}, "id": call_id}], id=f"a{turn}"),
+                ToolMessage(content=payload, name="get_id_list", tool_call_id=call_id, id=f"t{turn}"),
+                AIMessage(content="Your card MED-ID-12345-A has shipped (tracking TRK789).", id=f"f{turn}"),
+            ):
+                messages = messages + [new_message]
+                checkpoint = empty_checkpoint()
+                checkpoint["id"] = str(uuid6())
+                checkpoint["channel_values"] = {"messages": messages}
+                checkpoint["channel_versions"] = {"messages": len(messages)}
+                put_started_at = time.perf_counter()
+                config = saver.put(config, checkpoint, {"source": "loop", "step": len(messages)})
+                put_ms.append((time.perf_counter() - put_started_at) * 1000)
+    put_ms.sort()
+    return {"seconds": time.perf_counter() - started_at, "puts": len(put_ms),
+            "p50_ms": put_ms[len(put_ms) // 2], "p99_ms": put_ms[min(int(len(put_ms) * 0.99), len(put_ms) - 1)]}
+
+
+def run(shards: int, args: argparse.Namespace) -> Dict[str, float]:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        base_path = os.path.join(tmp_dir, "conversations.db")
+        start_at = time.time() + 0.5 # leaves time for every writer process to import and start
+        with multiprocessing.Pool(args.writers) as pool:
+            results = pool.starmap(write_conversations, [
+                (base_path, shards, writer, args.threads, args.turns, start_at) for writer in range(args.writers)
+            ])
+    seconds = max(result["seconds"] for result in results)
+    puts = sum(result["puts"] for result in results)
+    return {"shards": shards, "puts": puts, "seconds": seconds, "puts_per_second": puts / seconds,
+            "p50_ms": max(result["p50_ms"] for result in results), "p99_ms": max(result["p99_ms"] for result in results)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Checkpoint write throughput vs shard count")
+    parser.add_argument("--writers", type=int, default=8, help="Concurrent writer processes")
+    parser.add_argument("--threads", type=int, default=8, help="Conversations per writer")
+    parser.add_argument("--turns", type=int, default=10, help="Turns per conversation (4 checkpoints each)")
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4, 8], help="Shard counts to compare")
+    args = parser.parse_args()
+
+    print(f"{args.writers} writer processes x {args.threads} threads x {args.turns} turns "
+          f"({args.writers * args.threads * args.turns * 4} checkpoints per run)")
+    print(f"  {'shards':>6}{'puts/s':>10}{'seconds':>10}{'p50 ms':>9}{'p99 ms':>9}{'speedup':>9}")
+    baseline = None
+    for shards in args.shards:
+        result = run(shards, args)
+        baseline = baseline or result["puts_per_second"]
+        print(f"  {shards:>6}{result['puts_per_second']:>10.0f}{result['seconds']:>10.2f}"
+              f"{result['p50_ms']:>9.2f}{result['p99_ms']:>9.2f}{result['puts_per_second'] / baseline:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+# bench_startup.py (Import time and time to first served turn, in fresh processes)
+#
+# Each run starts a new interpreter in an empty working directory and measures:
+#   import_ms        `import app`
+#   warm_up_ms       create_app().warm_up() (only with --warm-up, and only if the checkout has create_app)
+#   first_turn_ms    the first app_graph.invoke (scripted fake model, no network)
+# Point --repo at another checkout to compare, e.g. `git worktree add /tmp/before <commit>`.
+#
+# Usage: python bench_startup.py --runs 5 [--warm-up] [--repo /tmp/before]
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from typing import Dict, List
+
+RUN_ONE = """
+import json, time
+started_at = time.perf_counter()
+import app
+imported_at = time.perf_counter()
+from langchain_core.messages import HumanMessage
+from fake_llm import ScriptedChatModel
+if {warm_up} and hasattr(app, "create_app"):
+    app.create_app().warm_up(include_llm=False)
+warmed_at = time.perf_counter()
+config = {{"configurable": {{"thread_id": "startup", "llm": ScriptedChatModel(), "tools": app.all_tools, "fast_path": False}}}}
+app.app_graph.invoke({{"messages": [HumanMessage(content="What's the status of my ID card? My member ID is 12345.")]}}, config=config)
+done_at = time.perf_counter()
+print(json.dumps({{
+    "import_ms": (imported_at - started_at) * 1000,
+    "warm_up_ms": (warmed_at - imported_at) * 1000,
+    "first_turn_ms": (done_at - warmed_at) * 1000,
+    "import_to_first_turn_ms": (done_at - started_at) * 1000,
+}}))
+"""
+
+
+def run_once(repo: str, warm_up: bool) -> Dict[str, float]:
+    env = dict(os.environ)
+    env.setdefault("OPENAI_API_KEY", "sk-benchmark-placeholder") # older checkouts refuse to import without one
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [repo, env.get("PYTHONPATH")]))
+    with tempfile.TemporaryDirectory() as tmp_dir: # fresh conversations.db every run
+        output = subprocess.run([sys.executable, "-c", RUN_ONE.format(warm_up=warm_up)], cwd=tmp_dir, env=env,
+                                capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Import time and time to first served turn")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--warm-up", action="store_true", help="Call create_app().warm_up() before the first turn")
+    parser.add_argument("--repo", default=os.path.dirname(os.path.abspath(__file__)), help="Checkout to measure")
+    args = parser.parse_args()
+
+    samples: List[Dict[str, float]] = [run_once(args.repo, args.warm_up) for _ in range(args.runs)]
+    print(f"{args.repo}: median of {args.runs} fresh processes{' (with warm-up)' if args.warm_up else ''}")
+    for key in ("import_ms", "warm_up_ms", "first_turn_ms", "import_to_first_turn_ms"):
+        print(f"  {key:<26}{statistics.median(sample[key] for sample in samples):>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+# chat_server.py (Flask /chat endpoint that streams the agent's reply as Server-Sent Events)
+#
+# POST /chat with JSON or form field `user_message`. The response is text/event-stream:
+#   event: tool_start / tool_end   tool_executor progress (see streaming.py)
+#   event: token                   model text as it is generated
+#   event: node                    a graph node finished ({"name": "agent"}, ...)
+#   event: done                    the turn is checkpointed; {"content": <final answer>, "thread_id": ...}
+#   event: error                   the turn failed; {"message": ...} (+ "retry_after" when the LLM queue rejected it)
+# The thread_id lives in the Flask session, so a browser keeps its conversation across requests. An
+# X-Tenant-ID header names the tenant the LLM scheduler shares model calls fairly between (see llm_scheduler.py);
+# while its queue is full, /chat answers 429 with a Retry-After header instead of starting the turn.
+# GET /chat/metrics reports time-to-first-byte, total turn latency and the LLM queue; GET /metrics exposes
+# the span counters and latency histograms from instrumentation.py in Prometheus text format.
+#
+# Usage: FLASK_SECRET_KEY=... python chat_server.py   (CHAT_FAKE_LLM=1 uses the scripted model, no OpenAI calls)
+
+import os
+import queue
+import threading
+import time
+import uuid
+from typing import Any, Dict, Iterator, List
+
+from flask import Flask, Response, jsonify, request, session, stream_with_context
+from langchain_core.messages import HumanMessage
+
+from app import all_tools, create_app, llm_scheduler
+from fake_llm import ScriptedChatModel
+from llm_scheduler import QueueFullError
+from instrumentation import PrometheusSink, configure_logging, tracer
+from streaming import STREAM_HANDLER_KEY, format_sse
+
+server = Flask(__name__)
+server.secret_key = os.getenv("FLASK_SECRET_KEY") or os.urandom(32) # without a fixed key, sessions reset on restart
+
+application = create_app()
+if os.getenv("CHAT_FAKE_LLM") == "1":
+    llm_model = ScriptedChatModel(latency=float(os.getenv("CHAT_FAKE_LLM_LATENCY", "0.2")))
+else:
+    llm_model = application.llm
+
+_DONE = object() # end-of-turn marker on the event queue
+
+
+class StreamMetrics:
+    """Time to first byte (first SSE event), time to first model token and total turn time, in ms."""
+
+    def __init__(self, window: int = 1000):
+        self.window = window
+        self._lock = threading.Lock()
+        self.ttfb: List[float] = []
+        self.first_token: List[float] = []
+        self.total: List[float] = []
+
+    def record(self, series: List[float], started_at: float) -> None:
+        with self._lock:
+            series.append((time.perf_counter() - started_at) * 1000)
+            del series[:-self.window]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {name: _summary(series) for name, series in
+                    (("ttfb_ms", self.ttfb), ("first_token_ms", self.first_token), ("total_ms", self.total))}
+
+
+def _summary(series: List[float]) -> Dict[str, float]:
+    if not series:
+        return {"count": 0}
+    ordered = sorted(series)
+    return {
+        "count": len(ordered),
+        "p50": round(ordered[len(ordered) // 2], 1),
+        "p95": round(ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)], 1),
+        "max": round(ordered[-1], 1),
+    }
+
+
+metrics = StreamMetrics()
+
+
+def run_turn(thread_id: str, user_message: str, tenant_id: str = "default") -> Iterator[Dict[str, Any]]:
+    """
+    Runs one turn with app_graph.stream on a worker thread and yields its events as they happen.
+    Node updates go through the normal checkpointer, so tool calls and the final answer are saved exactly
+    as with app_graph.invoke; the stream handler only adds a live view of the same turn.
+    """
+    events: "queue.Queue[Any]" = queue.Queue()
+    config = {"configurable": {"thread_id": thread_id, "tenant_id": tenant_id, "llm": llm_model, "tools": all_tools,
+                               STREAM_HANDLER_KEY: events.put}}
+
+    def worker() -> None:
+        final_message = None
+        try:
+            for update in application.app_graph.stream({"messages": [HumanMessage(content=user_message)]}, config=config, stream_mode="updates"):
+                for node, output in update.items():
+                    events.put({"type": "node", "name": node})
+                    if output and output.get("messages"):
+                        final_message = output["messages"][-1]
+            events.put({"type": "done", "thread_id": thread_id, "content": final_message.content if final_message else ""})
+        except QueueFullError as e:
+            events.put({"type": "error", "message": str(e), "retry_after": e.retry_after})
+        except Exception as e:
+            events.put({"type": "error", "message": f"{type(e).__name__}: {e}"})
+        finally:
+            events.put(_DONE)
+
+    threading.Thread(target=worker, name=f"chat-{thread_id[:8]}", daemon=True).start()
+    while True:
+        event = events.get()
+        if event is _DONE:
+            return
+        yield event
+
+
+@server.post("/chat")
+def chat() -> Any:
+    payload = request.get_json(silent=True) or request.form
+    user_message = str(payload.get("user_message", "")).strip()
+    if not user_message:
+        return jsonify({"error": "user_message is required"}), 400
+    if not llm_scheduler.admits():
+        # Backpressure: the turn would only wait in a full queue, so ask the client to come back later
+        retry_after = llm_scheduler.retry_after()
+        body = {"error": "The assistant is busy, please retry shortly", "retry_after": retry_after}
+        return jsonify(body), 429, {"Retry-After": str(int(retry_after))}
+    thread_id = session.setdefault("thread_id", uuid.uuid4().hex)
+    tenant_id = request.headers.get("X-Tenant-ID", "default")
+    started_at = time.perf_counter()
+
+    def generate() -> Iterator[str]:
+        first_event = first_token = True
+        for event in run_turn(thread_id, user_message, tenant_id):
+            if first_event:
+                metrics.record(metrics.ttfb, started_at)
+                first_event = False
+            if first_token and event["type"] == "token":
+                metrics.record(metrics.first_token, started_at)
+                first_token = False
+            yield format_sse(event)
+        metrics.record(metrics.total, started_at)
+
+    # X-Accel-Buffering stops nginx-style proxies from holding the stream back until it completes
+    return Response(stream_with_context(generate()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@server.get("/chat/metrics")
+def chat_metrics() -> Any:
+    return jsonify({**metrics.stats(), "llm_scheduler": llm_scheduler.stats()})
+
+
+def _register_gauges() -> None:
+    sink = tracer.sink(PrometheusSink)
+    if sink is None:
+        return
+    sink.gauge("agent_llm_queue_depth", lambda: {f'priority="{name}"': depth for name, depth in
+                                                  llm_scheduler.stats()["queue_depth_by_priority"].items()})
+    sink.gauge("agent_llm_in_flight", lambda: {"": llm_scheduler.stats()["in_flight"]})
+
+
+_register_gauges() # queue wait times are the "llm_queue" span histogram
+
+
+@server.get("/metrics")
+def prometheus_metrics() -> Any:
+    sink = tracer.sink(PrometheusSink)
+    return Response(sink.render() if sink else "", mimetype="text/plain; version=0.0.4")
+
+
+if __name__ == "__main__":
+    configure_logging()
+    application.warm_up(include_llm=False)
+    server.run(host="127.0.0.1", port=int(os.getenv("PORT", "5000")), threaded=True)
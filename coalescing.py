@@ -0,0 +1,283 @@
+# coalescing.py (Singleflight and micro-batching for backend lookups)
+
+import asyncio
+import concurrent.futures
+import threading
+from typing import Any, Coroutine, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from instrumentation import logger, tracer
+from tool_cache import CacheKey, make_cache_key
+
+# Per-card lookups the backend can also answer in bulk (GET <endpoint>/batch?ids=A,B,C)
+DEFAULT_BATCH_ENDPOINTS: Tuple[str, ...] = ("/id-status", "/comets-data")
+
+
+class _Batch:
+    """Card IDs collected for one bulk request; `full` wakes the caller waiting out the window."""
+
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+        self.futures: Dict[str, concurrent.futures.Future] = {}
+        self.closed = False
+        self.full = threading.Event()
+
+
+class CoalescingApiClient:
+    """
+    Sits between the response cache and the backend client (MockApiClient or ApiClient), with the same
+    get/post/aget/apost interface, so only cache misses reach it.
+    - Singleflight: a GET identical to one already in flight (same endpoint and params) waits for that
+      request's response instead of sending its own.
+    - Micro-batching: with `batch_window` > 0, lookups for `batch_endpoints` ({"id": ...} params) that
+      arrive within the window are sent as one bulk request (client.get_batch) of at most
+      `max_batch_size` IDs, and the response is split back to the callers. A window that collects a
+      single ID sends the ordinary request.
+    Sync callers wait out the window on their own thread; async callers share one timer per event loop.
+    Writes pass straight through; forget() stops later GETs from joining a request sent before a write.
+    stats() reports requests, backend calls and the coalesce ratio.
+    """
+
+    def __init__(self, client: Any, enabled: bool = True, batch_window: float = 0.0, max_batch_size: int = 16,
+                 batch_endpoints: Sequence[str] = DEFAULT_BATCH_ENDPOINTS):
+        self.client = client
+        self.enabled = enabled
+        self.batch_window = batch_window # seconds; 0 disables batching (singleflight still applies)
+        self.max_batch_size = max_batch_size
+        self.batch_endpoints = frozenset(batch_endpoints)
+        self._lock = threading.Lock()
+        self._inflight: Dict[CacheKey, concurrent.futures.Future] = {}
+        self._tasks: Set["asyncio.Task[None]"] = set() # backend calls in flight on event loops; referenced until done
+        self._open: Dict[Tuple[str, Any], _Batch] = {} # (endpoint, event loop or None for sync callers) -> collecting batch
+        # Metrics
+        self.requests = 0
+        self.coalesced = 0 # answered by another caller's in-flight request
+        self.backend_calls = 0
+        self.batches = 0
+        self.batched_items = 0
+
+    # --- Reads ---
+    def get(self, endpoint: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        if not self.enabled:
+            return self.client.get(endpoint, params)
+        key = make_cache_key(endpoint, params)
+        future, leader = self._join(key)
+        if leader:
+            if self._batchable(endpoint, params):
+                self._add_to_batch(endpoint, params["id"], future, loop=None)
+            else:
+                self._resolve(key, future, lambda: self._call(self.client.get, endpoint, params))
+        return dict(future.result())
+
+    async def aget(self, endpoint: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        if not self.enabled:
+            return await self.client.aget(endpoint, params)
+        key = make_cache_key(endpoint, params)
+        future, leader = self._join(key)
+        if leader:
+            if self._batchable(endpoint, params):
+                self._add_to_batch(endpoint, params["id"], future, loop=asyncio.get_running_loop())
+            else:
+                # The backend call runs in its own task: cancelling this caller (e.g. its tool timed out) must
+                # not cancel the request the followers are waiting for
+                self._spawn(asyncio.get_running_loop(), self._aproduce(key, future, endpoint, params))
+        return dict(await asyncio.shield(asyncio.wrap_future(future)))
+
+    # --- Writes ---
+    def post(self, endpoint: str, json_data: Dict[str, Any]) -> Dict[str, Any]:
+        return self.client.post(endpoint, json_data)
+
+    async def apost(self, endpoint: str, json_data: Dict[str, Any]) -> Dict[str, Any]:
+        return await self.client.apost(endpoint, json_data)
+
+    def forget(self, keys: Iterable[CacheKey]) -> None:
+        """
+        Later GETs for `keys` send a new request instead of joining the one in flight, whose response may
+        predate a write (see CachingApiClient.invalidate_member). Callers already waiting still get it.
+        Lookups waiting in a batch that has not been sent yet are kept: that request goes out after the write.
+        """
+        with self._lock:
+            unsent = {id(future) for batch in self._open.values() for future in batch.futures.values()}
+            for key in keys:
+                future = self._inflight.get(key)
+                if future is not None and id(future) not in unsent:
+                    del self._inflight[key]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "backend_calls": self.backend_calls,
+                "coalesced": self.coalesced,
+                "batches": self.batches,
+                "avg_batch_size": self.batched_items / self.batches if self.batches else 0.0,
+                "coalesce_ratio": self.requests / self.backend_calls if self.backend_calls else 0.0,
+                "batch_window_ms": self.batch_window * 1000,
+                "max_batch_size": self.max_batch_size,
+            }
+
+    # --- Singleflight ---
+    def _join(self, key: CacheKey) -> Tuple[concurrent.futures.Future, bool]:
+        """The in-flight future for `key` and whether this caller has to produce the response."""
+        with self._lock:
+            self.requests += 1
+            future = self._inflight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, False
+            future = self._inflight[key] = concurrent.futures.Future()
+            future.set_running_or_notify_cancel() # a cancelled waiter must not cancel the response others share
+            return future, True
+
+    async def _aproduce(self, key: CacheKey, future: concurrent.futures.Future, endpoint: str, params: Dict[str, Any]) -> None:
+        try:
+            self._count_call()
+            response = await self.client.aget(endpoint, params)
+        except BaseException as e:
+            self._fail(key, future, e)
+            if not isinstance(e, Exception):
+                raise
+            return
+        self._succeed(key, future, response)
+
+    def _spawn(self, loop: asyncio.AbstractEventLoop, coroutine: Coroutine[Any, Any, None]) -> None:
+        task = loop.create_task(coroutine)
+        with self._lock:
+            self._tasks.add(task)
+        task.add_done_callback(self._forget_task)
+
+    def _forget_task(self, task: "asyncio.Task[None]") -> None:
+        with self._lock:
+            self._tasks.discard(task)
+
+    def _resolve(self, key: CacheKey, future: concurrent.futures.Future, produce: Any) -> None:
+        try:
+            response = produce()
+        except BaseException as e:
+            self._fail(key, future, e)
+            raise
+        self._succeed(key, future, response)
+
+    def _succeed(self, key: CacheKey, future: concurrent.futures.Future, response: Dict[str, Any]) -> None:
+        with self._lock:
+            if self._inflight.get(key) is future: # after forget(), the key may belong to a newer request
+                del self._inflight[key]
+        future.set_result(response)
+
+    def _fail(self, key: CacheKey, future: concurrent.futures.Future, error: BaseException) -> None:
+        with self._lock:
+            if self._inflight.get(key) is future: # after forget(), the key may belong to a newer request
+                del self._inflight[key]
+        if isinstance(error, asyncio.CancelledError):
+            # Only reachable when the event loop itself shuts down; a CancelledError on the shared future
+            # would read as "cancelled" to every follower, so they get an ordinary error instead
+            error = RuntimeError("The shared backend request was cancelled")
+        if not future.done():
+            future.set_exception(error)
+
+    def _call(self, method: Any, *args: Any) -> Dict[str, Any]:
+        self._count_call()
+        return method(*args)
+
+    def _count_call(self) -> None:
+        with self._lock:
+            self.backend_calls += 1
+
+    # --- Micro-batching ---
+    def _batchable(self, endpoint: str, params: Dict[str, Any]) -> bool:
+        return (self.batch_window > 0 and endpoint in self.batch_endpoints and set(params) == {"id"}
+                and hasattr(self.client, "get_batch"))
+
+    def _add_to_batch(self, endpoint: str, card_id: str, future: concurrent.futures.Future, loop: Optional[asyncio.AbstractEventLoop]) -> None:
+        with self._lock:
+            batch = self._open.get((endpoint, loop))
+            opened = batch is None
+            if opened:
+                batch = self._open[(endpoint, loop)] = _Batch(endpoint)
+            batch.futures[card_id] = future
+            filled = len(batch.futures) >= self.max_batch_size and self._close(batch, loop)
+        if loop is not None:
+            if filled:
+                self._spawn(loop, self._asend(batch))
+            elif opened:
+                loop.call_later(self.batch_window, self._flush_async, batch, loop)
+            return
+        if opened:
+            # The caller that opened the batch waits out the window (or until it is full) and sends it;
+            # the others only wait for their own future
+            if not filled:
+                batch.full.wait(self.batch_window)
+                with self._lock:
+                    self._close(batch, loop)
+            self._send(batch)
+
+    def _close(self, batch: _Batch, loop: Optional[asyncio.AbstractEventLoop]) -> bool:
+        # Called with self._lock held; True if this call closed it
+        if batch.closed:
+            return False
+        batch.closed = True
+        if self._open.get((batch.endpoint, loop)) is batch:
+            del self._open[(batch.endpoint, loop)]
+        batch.full.set()
+        return True
+
+    def _flush_async(self, batch: _Batch, loop: asyncio.AbstractEventLoop) -> None:
+        with self._lock:
+            if not self._close(batch, loop):
+                return # filled up and already sent
+        self._spawn(loop, self._asend(batch))
+
+    def _send(self, batch: _Batch) -> None:
+        card_ids = list(batch.futures)
+        try:
+            if len(card_ids) == 1:
+                responses = {card_ids[0]: self._call(self.client.get, batch.endpoint, {"id": card_ids[0]})}
+            else:
+                with tracer.span("backend_batch", kind="backend", endpoint=f"{batch.endpoint}/batch", size=len(card_ids)):
+                    responses = _split(self._call(self.client.get_batch, batch.endpoint, card_ids), card_ids)
+                self._count_batch(len(card_ids))
+        except BaseException as e:
+            self._fail_batch(batch, e)
+            if not isinstance(e, Exception):
+                raise
+            return
+        self._settle_batch(batch, responses)
+
+    async def _asend(self, batch: _Batch) -> None:
+        card_ids = list(batch.futures)
+        try:
+            self._count_call()
+            if len(card_ids) == 1:
+                responses = {card_ids[0]: await self.client.aget(batch.endpoint, {"id": card_ids[0]})}
+            else:
+                with tracer.span("backend_batch", kind="backend", endpoint=f"{batch.endpoint}/batch", size=len(card_ids)):
+                    responses = _split(await self.client.aget_batch(batch.endpoint, card_ids), card_ids)
+                self._count_batch(len(card_ids))
+        except BaseException as e:
+            self._fail_batch(batch, e)
+            if not isinstance(e, Exception):
+                raise
+            return
+        self._settle_batch(batch, responses)
+
+    def _count_batch(self, size: int) -> None:
+        with self._lock:
+            self.batches += 1
+            self.batched_items += size
+        logger.debug("Coalescing: sent a batch of %d lookups", size)
+
+    def _settle_batch(self, batch: _Batch, responses: Dict[str, Dict[str, Any]]) -> None:
+        for card_id, future in batch.futures.items():
+            self._succeed(make_cache_key(batch.endpoint, {"id": card_id}), future, responses[card_id])
+
+    def _fail_batch(self, batch: _Batch, error: BaseException) -> None:
+        for card_id, future in batch.futures.items():
+            self._fail(make_cache_key(batch.endpoint, {"id": card_id}), future, error)
+
+
+def _split(response: Dict[str, Any], card_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Per-ID responses from a bulk response; a failed bulk request fails every ID the same way."""
+    if "error" in response:
+        return {card_id: dict(response) for card_id in card_ids}
+    results = response.get("results") or {}
+    return {card_id: results.get(card_id) or {"error": "Not Found", "message": f"No result for {card_id} in the batch response"}
+            for card_id in card_ids}
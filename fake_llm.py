@@ -0,0 +1,108 @@
+# fake_llm.py (Deterministic stand-in for ChatOpenAI, used by benchmarks)
+
+import asyncio
+import json
+import re
+import time
+from typing import Any, AsyncIterator, Iterator, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+MEMBER_ID_PATTERN = re.compile(r"\b(\d{5})\b")
+PRIMARY_ID_PATTERN = re.compile(r"primary_id['\"]?\s*[:=]\s*['\"]([^'\"]+)['\"]")
+
+
+class ScriptedChatModel(BaseChatModel):
+    """
+    A chat model that follows the same tool chains the real agent is prompted to use, without the network.
+    - A question about an ID card with a member ID -> get_id_list, then get_id_card_status on the primary_id.
+    - A question about dental coverage or membership status -> the matching member tool.
+    - Anything else, or any tool output that ends a chain -> a final text answer.
+    `latency` simulates the model round trip (time.sleep on the sync path, asyncio.sleep on the async path).
+    stream/astream wait `latency` for the first chunk, then yield the answer word by word and a tool call
+    as one tool_call_chunk, like a streaming OpenAI response.
+    """
+    latency: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted-fake"
+
+    def bind_tools(self, tools: List[Any], **kwargs: Any) -> "ScriptedChatModel":
+        # The script already knows the tool names, so binding is a no-op
+        return self
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        if self.latency:
+            time.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=self._next_message(messages))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=self._next_message(messages))])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        if self.latency:
+            time.sleep(self.latency)
+        yield from _chunks(self._next_message(messages))
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        for chunk in _chunks(self._next_message(messages)):
+            yield chunk
+
+    # --- Script ---
+    def _next_message(self, messages: List[BaseMessage]) -> AIMessage:
+        last_message = messages[-1]
+        call_id = f"call_{len(messages)}"
+
+        if isinstance(last_message, HumanMessage):
+            text = last_message.content.lower()
+            member_id = _find_member_id(messages)
+            if member_id is None:
+                return AIMessage(content="Could you please share your member ID?")
+            if "dental" in text:
+                return _tool_call(call_id, "get_dental_coverage_status", {"member_id": member_id})
+            if "active" in text or "membership" in text:
+                return _tool_call(call_id, "get_member_status", {"member_id": member_id})
+            if "card" in text or "id" in text:
+                return _tool_call(call_id, "get_id_list", {"member_id": member_id})
+            return AIMessage(content="I can help with Medicare ID cards and member benefits.")
+
+        if isinstance(last_message, ToolMessage) and last_message.name == "get_id_list":
+            match = PRIMARY_ID_PATTERN.search(last_message.content)
+            if match:
+                return _tool_call(call_id, "get_id_card_status", {"id": match.group(1)})
+
+        if isinstance(last_message, ToolMessage):
+            return AIMessage(content=f"Here is what I found: {last_message.content}")
+
+        return AIMessage(content="Is there anything else I can help you with?")
+
+
+def _find_member_id(messages: List[BaseMessage]) -> Optional[str]:
+    # Most recent user message that mentions a member ID wins
+    for message in reversed(messages):
+        if isinstance(message, HumanMessage):
+            match = MEMBER_ID_PATTERN.search(message.content)
+            if match:
+                return match.group(1)
+    return None
+
+
+def _chunks(message: AIMessage) -> Iterator[ChatGenerationChunk]:
+    if message.tool_calls:
+        tool_call_chunks = [{"name": call["name"], "args": json.dumps(call["args"]), "id": call["id"], "index": index}
+                            for index, call in enumerate(message.tool_calls)]
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", tool_call_chunks=tool_call_chunks))
+        return
+    for word in re.findall(r"\S+\s*", message.content):
+        yield ChatGenerationChunk(message=AIMessageChunk(content=word))
+
+
+def _tool_call(call_id: str, name: str, args: dict) -> AIMessage:
+    return AIMessage(content="", tool_calls=[{"name": name, "args": args, "id": call_id}])
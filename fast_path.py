@@ -0,0 +1,237 @@
+# fast_path.py (Deterministic router that answers common intents without the LLM)
+
+import json
+import re
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+from langchain_core.runnables import RunnableConfig
+
+from instrumentation import logger
+from state_access import state_field, state_messages
+from streaming import emit
+
+MEMBER_ID_PATTERN = re.compile(r"\bmember(?:\s+id|\s+number)?(?:\s+is|\s*[:#])?\s*(\d{5,})\b", re.IGNORECASE)
+ID_CARD_PATTERN = re.compile(r"\bMED-ID-[\w-]+\b", re.IGNORECASE)
+
+# Words that make an otherwise canned query ambiguous (a second request, a hypothetical, a change of card)
+AMBIGUOUS_PATTERN = re.compile(r"\b(and also|also|but|if|replace|replacement|lost|cancel|change|why|instead|not)\b", re.IGNORECASE)
+
+
+class Intent:
+    """
+    One canned query: `patterns` must match the user's message, `chain` lists the tool steps and
+    `template` renders the final answer from the tool outputs. Each step is (tool_name, args_fn), where
+    args_fn gets the member ID and the outputs so far and returns the tool arguments, or None to stop.
+    """
+
+    def __init__(self, name: str, patterns: Sequence[str], chain: Sequence[Tuple[str, Callable[..., Optional[Dict[str, Any]]]]],
+                 template: Callable[[List[Dict[str, Any]]], str]):
+        self.name = name
+        self.patterns = [re.compile(pattern, re.IGNORECASE) for pattern in patterns]
+        self.chain = list(chain)
+        self.template = template
+
+    def matches(self, text: str) -> bool:
+        return any(pattern.search(text) for pattern in self.patterns)
+
+
+def _id_card_status_answer(outputs: List[Dict[str, Any]]) -> str:
+    id_list, status = outputs
+    answer = f"Your ID card {id_list['primary_id']} is {status['status'].lower()}."
+    if "tracking_number" in status:
+        answer += f" The tracking number is {status['tracking_number']}."
+    if "estimated_delivery" in status:
+        answer += f" Estimated delivery: {status['estimated_delivery']}."
+    return answer
+
+
+def _id_list_answer(outputs: List[Dict[str, Any]]) -> str:
+    (id_list,) = outputs
+    answer = f"You have {len(id_list['ids'])} active ID card(s): {', '.join(id_list['ids'])}."
+    if "primary_id" in id_list:
+        answer += f" Your primary ID is {id_list['primary_id']}."
+    return answer
+
+
+def _member_status_answer(outputs: List[Dict[str, Any]]) -> str:
+    return f"Your membership status is {outputs[0]['enrollment_status'].lower()}."
+
+
+def _dental_coverage_answer(outputs: List[Dict[str, Any]]) -> str:
+    (coverage,) = outputs
+    answer = f"Your dental coverage is {coverage['dental_status'].lower()}."
+    if "preventative_coinsurance" in coverage:
+        answer += f" Preventative care is covered at {coverage['preventative_coinsurance']}."
+    return answer
+
+
+def _primary_id_step(member_id: str, outputs: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    primary_id = outputs[-1].get("primary_id")
+    return {"id": primary_id} if primary_id else None
+
+
+# Ordered from most to least specific; a message matching more than one intent falls back to the LLM.
+# request_new_id_card is deliberately absent: writes stay with the agent, which confirms details first.
+DEFAULT_INTENTS = [
+    Intent("id_card_status",
+           [r"\bstatus of my (?:medicare )?(?:id )?card\b", r"\bwhere(?:'s| is) my (?:new )?(?:medicare )?(?:id )?card\b",
+            r"\b(?:id )?card status\b"],
+           [("get_id_list", lambda member_id, outputs: {"member_id": member_id}), ("get_id_card_status", _primary_id_step)],
+           _id_card_status_answer),
+    Intent("id_list",
+           [r"\blist (?:all )?my (?:medicare )?id(?: card)?s\b", r"\bwhat ids do i have\b", r"\bwhich id cards do i have\b"],
+           [("get_id_list", lambda member_id, outputs: {"member_id": member_id})],
+           _id_list_answer),
+    Intent("member_status",
+           [r"\bam i an? active member\b", r"\bwhat(?:'s| is) my membership status\b", r"\bis my membership active\b"],
+           [("get_member_status", lambda member_id, outputs: {"member_id": member_id})],
+           _member_status_answer),
+    Intent("dental_coverage",
+           [r"\bis dental (?:included|covered)\b", r"\bdo i have dental(?: coverage)?\b", r"\bdental coverage status\b"],
+           [("get_dental_coverage_status", lambda member_id, outputs: {"member_id": member_id})],
+           _dental_coverage_answer),
+]
+
+
+class FastPathRouter:
+    """
+    Graph node that runs before `agent`. When the latest user message is a canned query (exactly one
+    intent matches, it has no ambiguous wording, the member ID is in the message or was pinned on an
+    earlier turn by member_context.py) it runs the intent's tool chain through `tool_node` and appends the
+    same messages the agent would have produced: an AIMessage with tool_calls and its ToolMessages per
+    step, then the templated final AIMessage. Anything else is a miss and leaves the state untouched for
+    the agent.
+    If a tool returns an error the exchange so far is kept and the agent takes over to explain it.
+    """
+
+    def __init__(self, tool_node: Any, intents: Sequence[Intent] = DEFAULT_INTENTS, enabled: bool = True, max_words: int = 30):
+        self.tool_node = tool_node
+        self.intents = list(intents)
+        self.enabled = enabled
+        self.max_words = max_words
+        self._lock = threading.Lock()
+        # Metrics
+        self.attempts = 0
+        self.hits: Dict[str, int] = {}
+        self.misses: Dict[str, int] = {}
+        self.handoffs = 0 # tool error mid-chain, agent finishes the turn
+        self.hit_seconds = 0.0
+
+    # --- Graph nodes ---
+    def route(self, state: Any, config: Optional[RunnableConfig] = None) -> Dict[str, List[BaseMessage]]:
+        started_at = time.perf_counter()
+        match = self._match(state, config)
+        if match is None:
+            return {"messages": []}
+        intent, member_id = match
+        messages: List[BaseMessage] = []
+        outputs: List[Dict[str, Any]] = []
+        for tool_name, args_fn in intent.chain:
+            call_message = self._call_message(tool_name, args_fn(member_id, outputs))
+            if call_message is None:
+                return self._handoff(intent, messages)
+            tool_messages = self.tool_node.invoke([call_message], config)["messages"]
+            messages += [call_message] + tool_messages
+            output = _parse(tool_messages)
+            if output is None:
+                return self._handoff(intent, messages)
+            outputs.append(output)
+        return self._finish(intent, messages, outputs, started_at, config)
+
+    async def aroute(self, state: Any, config: Optional[RunnableConfig] = None) -> Dict[str, List[BaseMessage]]:
+        started_at = time.perf_counter()
+        match = self._match(state, config)
+        if match is None:
+            return {"messages": []}
+        intent, member_id = match
+        messages: List[BaseMessage] = []
+        outputs: List[Dict[str, Any]] = []
+        for tool_name, args_fn in intent.chain:
+            call_message = self._call_message(tool_name, args_fn(member_id, outputs))
+            if call_message is None:
+                return self._handoff(intent, messages)
+            tool_messages = (await self.tool_node.ainvoke([call_message], config))["messages"]
+            messages += [call_message] + tool_messages
+            output = _parse(tool_messages)
+            if output is None:
+                return self._handoff(intent, messages)
+            outputs.append(output)
+        return self._finish(intent, messages, outputs, started_at, config)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hits = sum(self.hits.values())
+            return {
+                "attempts": self.attempts,
+                "hits": hits,
+                "hit_rate": hits / self.attempts if self.attempts else 0.0,
+                "hits_by_intent": dict(self.hits),
+                "misses_by_reason": dict(self.misses),
+                "handoffs": self.handoffs,
+                "avg_hit_ms": self.hit_seconds * 1000 / hits if hits else 0.0,
+            }
+
+    # --- Matching ---
+    def _match(self, state: Any, config: Optional[RunnableConfig]) -> Optional[Tuple[Intent, str]]:
+        if not self.enabled or not (config or {}).get("configurable", {}).get("fast_path", True):
+            return None
+        messages = state_messages(state)
+        if not messages or not isinstance(messages[-1], HumanMessage):
+            return None
+        with self._lock:
+            self.attempts += 1
+        text = " ".join(str(messages[-1].content).split())
+        intents = [intent for intent in self.intents if intent.matches(text)]
+        member_ids = set(MEMBER_ID_PATTERN.findall(text))
+        if not intents:
+            return self._miss("no_intent")
+        if len(intents) > 1 or len(text.split()) > self.max_words or AMBIGUOUS_PATTERN.search(text) or ID_CARD_PATTERN.search(text):
+            return self._miss("ambiguous")
+        if not member_ids and state_field(state, "current_member_id"):
+            member_ids = {state_field(state, "current_member_id")} # pinned by member_context on an earlier turn
+        if len(member_ids) != 1:
+            return self._miss("missing_member_id" if not member_ids else "ambiguous")
+        return intents[0], member_ids.pop()
+
+    def _miss(self, reason: str) -> None:
+        with self._lock:
+            self.misses[reason] = self.misses.get(reason, 0) + 1
+        return None
+
+    # --- Results ---
+    def _call_message(self, tool_name: str, args: Optional[Dict[str, Any]]) -> Optional[AIMessage]:
+        if args is None:
+            return None
+        call_id = f"fastpath_{uuid.uuid4().hex[:12]}"
+        return AIMessage(content="", tool_calls=[{"name": tool_name, "args": args, "id": call_id}])
+
+    def _finish(self, intent: Intent, messages: List[BaseMessage], outputs: List[Dict[str, Any]], started_at: float,
+                config: Optional[RunnableConfig]) -> Dict[str, List[BaseMessage]]:
+        answer = AIMessage(content=intent.template(outputs))
+        emit(config, "token", content=answer.content) # streaming consumers get the whole answer as one chunk
+        with self._lock:
+            self.hits[intent.name] = self.hits.get(intent.name, 0) + 1
+            self.hit_seconds += time.perf_counter() - started_at
+        logger.debug("Fast path: '%s' answered without the LLM", intent.name)
+        return {"messages": messages + [answer]}
+
+    def _handoff(self, intent: Intent, messages: List[BaseMessage]) -> Dict[str, List[BaseMessage]]:
+        with self._lock:
+            self.handoffs += 1
+        logger.debug("Fast path: '%s' chain stopped early. Handing off to the agent.", intent.name)
+        return {"messages": messages}
+
+
+def _parse(tool_messages: List[ToolMessage]) -> Optional[Dict[str, Any]]:
+    """The tool output as a dict, or None if it is a ToolError or not JSON."""
+    try:
+        output = json.loads(tool_messages[0].content)
+    except (IndexError, TypeError, ValueError):
+        return None
+    if not isinstance(output, dict) or "error" in output:
+        return None
+    return output
@@ -0,0 +1,174 @@
+# history_compaction.py (Token-budgeted view of the conversation history sent to the LLM)
+
+import json
+import threading
+from typing import Any, Dict, List, Sequence
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage, ToolMessage
+
+from token_counting import count_messages_tokens, count_tokens
+
+
+class HistoryCompactor:
+    """
+    Shrinks `state.messages` to a token budget before it is sent to the model. The checkpointed history
+    is never modified; only the prompt is compacted. In order, until the history fits the budget:
+    1. Finished tool exchanges in older turns (an AIMessage with tool_calls plus all of its ToolMessages)
+       are collapsed into one short SystemMessage of facts. Both halves go together, so every remaining
+       tool_call still has its ToolMessage and vice versa.
+    2. The oldest turns are dropped and replaced by a short summary of what the user asked and the facts
+       found, itself capped at `summary_token_budget`.
+    3. Oversized ToolMessage payloads in the current turn are truncated to `max_tool_chars`.
+    The current turn (from the latest HumanMessage on) is never collapsed or dropped, and the last
+    `keep_recent_turns` earlier turns are not collapsed by step 1.
+    """
+
+    def __init__(self, max_prompt_tokens: int = 4000, keep_recent_turns: int = 2, summary_token_budget: int = 300,
+                 max_fact_chars: int = 200, max_tool_chars: int = 2000):
+        self.max_prompt_tokens = max_prompt_tokens
+        self.keep_recent_turns = keep_recent_turns
+        self.summary_token_budget = summary_token_budget
+        self.max_fact_chars = max_fact_chars
+        self.max_tool_chars = max_tool_chars
+        self._lock = threading.Lock()
+        # Metrics
+        self.calls = 0
+        self.compactions = 0
+        self.tokens_before = 0
+        self.tokens_after = 0
+
+    def compact(self, messages: Sequence[BaseMessage]) -> List[BaseMessage]:
+        messages = list(messages)
+        before = count_messages_tokens(messages)
+        result = messages
+        if before > self.max_prompt_tokens:
+            result = self._compact(messages)
+        self._record(before, count_messages_tokens(result) if result is not messages else before)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            saved = self.tokens_before - self.tokens_after
+            return {
+                "calls": self.calls,
+                "compactions": self.compactions,
+                "prompt_tokens_before": self.tokens_before,
+                "prompt_tokens_after": self.tokens_after,
+                "prompt_tokens_saved": saved,
+                "saved_ratio": saved / self.tokens_before if self.tokens_before else 0.0,
+            }
+
+    # --- Stages ---
+    def _compact(self, messages: List[BaseMessage]) -> List[BaseMessage]:
+        turns = _split_turns(messages)
+        current, older = turns[-1], turns[:-1]
+        protected = max(len(older) - self.keep_recent_turns, 0) # older[:protected] may be collapsed/dropped
+
+        # 1. Collapse finished tool exchanges in older turns
+        older = [self._collapse_tool_exchanges(turn) if index < protected else turn for index, turn in enumerate(older)]
+        if self._fits(older, current):
+            return _flatten(older) + current
+
+        # 2. Drop the oldest turns, replacing them with a summary
+        dropped: List[List[BaseMessage]] = []
+        while older:
+            dropped.append(older.pop(0))
+            if self._fits(older, current, with_summary=True):
+                break
+        summary = [self._summarize(dropped)] if dropped else []
+        result = summary + _flatten(older) + current
+        if count_messages_tokens(result) <= self.max_prompt_tokens:
+            return result
+
+        # 3. Truncate large tool payloads in the current turn (content only, so tool_call ids stay paired)
+        current = [_truncate_tool_message(m, self.max_tool_chars) if isinstance(m, ToolMessage) else m for m in current]
+        return summary + _flatten(older) + current
+
+    def _collapse_tool_exchanges(self, turn: List[BaseMessage]) -> List[BaseMessage]:
+        result: List[BaseMessage] = []
+        index = 0
+        while index < len(turn):
+            message = turn[index]
+            if isinstance(message, AIMessage) and message.tool_calls:
+                call_ids = {call["id"] for call in message.tool_calls}
+                tool_messages = []
+                end = index + 1
+                while end < len(turn) and isinstance(turn[end], ToolMessage):
+                    tool_messages.append(turn[end])
+                    end += 1
+                if call_ids == {m.tool_call_id for m in tool_messages}: # finished exchange
+                    result.append(SystemMessage(content=self._facts(message, tool_messages)))
+                    index = end
+                    continue
+            result.append(message)
+            index += 1
+        return result
+
+    def _facts(self, ai_message: AIMessage, tool_messages: List[ToolMessage]) -> str:
+        outputs = {m.tool_call_id: m.content for m in tool_messages}
+        lines = []
+        for call in ai_message.tool_calls:
+            args = ", ".join(f"{key}={value}" for key, value in call["args"].items())
+            output = _shorten(str(outputs.get(call["id"], "")), self.max_fact_chars)
+            lines.append(f"{call['name']}({args}) -> {output}")
+        return "Earlier tool results: " + "; ".join(lines)
+
+    def _summarize(self, dropped: List[List[BaseMessage]]) -> SystemMessage:
+        lines = []
+        for turn in dropped:
+            for message in turn:
+                if isinstance(message, HumanMessage):
+                    lines.append(f"User asked: {_shorten(str(message.content), 120)}")
+                elif isinstance(message, SystemMessage): # collapsed facts from stage 1
+                    lines.append(message.content)
+                elif isinstance(message, ToolMessage):
+                    lines.append(f"{message.name} -> {_shorten(str(message.content), self.max_fact_chars)}")
+        header = f"Summary of {len(dropped)} earlier turn(s) omitted to save space:"
+        # Keep the most recent lines that fit the summary budget
+        kept: List[str] = []
+        budget = self.summary_token_budget - count_tokens(header)
+        for line in reversed(lines):
+            cost = count_tokens(line) + 1
+            if cost > budget:
+                break
+            kept.insert(0, line)
+            budget -= cost
+        return SystemMessage(content="\n".join([header] + kept))
+
+    def _fits(self, older: List[List[BaseMessage]], current: List[BaseMessage], with_summary: bool = False) -> bool:
+        summary_tokens = self.summary_token_budget if with_summary else 0
+        return summary_tokens + count_messages_tokens(_flatten(older) + current) <= self.max_prompt_tokens
+
+    def _record(self, before: int, after: int) -> None:
+        with self._lock:
+            self.calls += 1
+            self.tokens_before += before
+            self.tokens_after += after
+            if after < before:
+                self.compactions += 1
+
+
+def _split_turns(messages: List[BaseMessage]) -> List[List[BaseMessage]]:
+    """Each turn starts at a HumanMessage; anything before the first HumanMessage is its own turn."""
+    turns: List[List[BaseMessage]] = []
+    for message in messages:
+        if isinstance(message, HumanMessage) or not turns:
+            turns.append([])
+        turns[-1].append(message)
+    return turns or [[]]
+
+
+def _flatten(turns: List[List[BaseMessage]]) -> List[BaseMessage]:
+    return [message for turn in turns for message in turn]
+
+
+def _shorten(text: str, limit: int) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= limit else text[: limit - 3] + "..."
+
+
+def _truncate_tool_message(message: ToolMessage, limit: int) -> ToolMessage:
+    content = message.content if isinstance(message.content, str) else json.dumps(message.content)
+    if len(content) <= limit:
+        return message
+    return ToolMessage(content=content[:limit] + " ...[truncated]", name=message.name, tool_call_id=message.tool_call_id)
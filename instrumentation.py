@@ -0,0 +1,287 @@
+# instrumentation.py (Spans and metrics for graph nodes, LLM calls, tools and backend calls)
+#
+# Every unit of work runs inside `tracer.span(name, kind=...)`. A span records its latency, status and
+# attributes (prompt/completion tokens, tool name, endpoint, cache hit, ...) plus the thread_id of the
+# conversation, and is handed to the tracer's sinks when it ends:
+#   - PrometheusSink aggregates every span into counters and latency histograms (cheap, always on).
+#   - InMemorySink / JsonLinesSink keep individual spans, only for sampled traces (TRACE_SAMPLE_RATE).
+# Sampling is decided once per trace (the outermost span) and inherited by its children.
+# Human-readable logs go through the "medicare_agent" logger and are quiet unless LOG_LEVEL asks for them.
+
+import json
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from langchain_core.runnables import RunnableConfig, RunnableLambda
+
+logger = logging.getLogger("medicare_agent")
+
+current_thread_id: ContextVar[Optional[str]] = ContextVar("current_thread_id", default=None)
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+
+def configure_logging(level: Optional[str] = None) -> None:
+    """Attach a stderr handler to the agent logger at LOG_LEVEL (default WARNING, so the hot path stays quiet)."""
+    logger.setLevel((level or os.getenv("LOG_LEVEL", "WARNING")).upper())
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+        logger.addHandler(handler)
+
+
+class Span:
+    __slots__ = ("name", "kind", "span_id", "trace_id", "parent_id", "thread_id", "sampled", "attributes",
+                 "status", "start_time", "duration_ms")
+
+    recording = True
+
+    def __init__(self, name: str, kind: str, trace_id: str, parent_id: Optional[str], thread_id: Optional[str],
+                 sampled: bool, attributes: Dict[str, Any]):
+        self.name = name
+        self.kind = kind
+        self.span_id = uuid.uuid4().hex[:16]
+        self.trace_id = trace_id
+        self.parent_id = parent_id
+        self.thread_id = thread_id
+        self.sampled = sampled
+        self.attributes = attributes
+        self.status = "ok"
+        self.start_time = time.time()
+        self.duration_ms = 0.0
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+    def fail(self, error: str) -> None:
+        self.status = "error"
+        self.attributes["error"] = error
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name, "kind": self.kind, "span_id": self.span_id, "trace_id": self.trace_id,
+            "parent_id": self.parent_id, "thread_id": self.thread_id, "status": self.status,
+            "start_time": self.start_time, "duration_ms": round(self.duration_ms, 3), "attributes": self.attributes,
+        }
+
+
+class _NoopSpan:
+    """Returned when the tracer has no sinks, so instrumented code needs no `if tracing:` checks."""
+    recording = False
+
+    def set(self, **attributes: Any) -> None:
+        pass
+
+    def fail(self, error: str) -> None:
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+# --- Sinks ---
+class InMemorySink:
+    """Keeps the last `max_spans` sampled spans; for tests and ad-hoc inspection."""
+    sampled = True
+
+    def __init__(self, max_spans: int = 10000):
+        self._spans: Deque[Span] = deque(maxlen=max_spans)
+        self._lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        with self._lock:
+            self._spans.append(span)
+
+    @property
+    def spans(self) -> List[Span]:
+        with self._lock:
+            return list(self._spans)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._spans.clear()
+
+
+class JsonLinesSink:
+    """Appends one JSON object per sampled span to `path`."""
+    sampled = True
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        line = json.dumps(span.to_dict(), default=str, separators=(",", ":"))
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+
+class PrometheusSink:
+    """
+    Aggregates every span, sampled or not, so rates and latency percentiles stay exact. `render()` returns
+    the Prometheus text exposition format:
+      agent_spans_total{kind,name,status}          span counts
+      agent_span_duration_ms{kind,name}             latency histogram
+      agent_llm_tokens_total{type}                  prompt / completion tokens
+      agent_cache_lookups_total{endpoint,result}    backend cache hits / misses
+    Tool spans are labelled with the tool name and backend spans with the endpoint. Values that are not
+    spans (e.g. the LLM queue depth) can be added as gauges, read when the metrics are rendered.
+    """
+    sampled = False
+    DEFAULT_BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._counts: Dict[Tuple[str, str, str], int] = {}
+        self._histograms: Dict[Tuple[str, str], List[float]] = {} # bucket counts..., +Inf count, sum
+        self._tokens: Dict[str, int] = {}
+        self._cache: Dict[Tuple[str, str], int] = {}
+        self._gauges: Dict[str, Callable[[], Dict[str, float]]] = {}
+
+    def gauge(self, name: str, read: Callable[[], Dict[str, float]]) -> None:
+        """Adds a gauge; `read` returns {label set: value} at render time, e.g. {'priority="new"': 3} ("" = no labels)."""
+        with self._lock:
+            self._gauges[name] = read
+
+    def export(self, span: Span) -> None:
+        label = str(span.attributes.get("tool") or span.attributes.get("endpoint") or span.name)
+        with self._lock:
+            count_key = (span.kind, label, span.status)
+            self._counts[count_key] = self._counts.get(count_key, 0) + 1
+            histogram = self._histograms.setdefault((span.kind, label), [0.0] * (len(self.buckets) + 2))
+            for index, bound in enumerate(self.buckets):
+                if span.duration_ms <= bound:
+                    histogram[index] += 1
+            histogram[-2] += 1
+            histogram[-1] += span.duration_ms
+            for token_type in ("prompt_tokens", "completion_tokens"):
+                if token_type in span.attributes:
+                    self._tokens[token_type] = self._tokens.get(token_type, 0) + int(span.attributes[token_type])
+            if "cache_hit" in span.attributes:
+                cache_key = (label, "hit" if span.attributes["cache_hit"] else "miss")
+                self._cache[cache_key] = self._cache.get(cache_key, 0) + 1
+
+    def render(self) -> str:
+        with self._lock:
+            lines = ["# TYPE agent_spans_total counter"]
+            for (kind, name, status), count in sorted(self._counts.items()):
+                lines.append(f'agent_spans_total{{kind="{kind}",name="{name}",status="{status}"}} {count}')
+            lines.append("# TYPE agent_span_duration_ms histogram")
+            for (kind, name), histogram in sorted(self._histograms.items()):
+                labels = f'kind="{kind}",name="{name}"'
+                for bound, count in zip(self.buckets, histogram):
+                    lines.append(f'agent_span_duration_ms_bucket{{{labels},le="{bound:g}"}} {count:g}')
+                lines.append(f'agent_span_duration_ms_bucket{{{labels},le="+Inf"}} {histogram[-2]:g}')
+                lines.append(f"agent_span_duration_ms_count{{{labels}}} {histogram[-2]:g}")
+                lines.append(f"agent_span_duration_ms_sum{{{labels}}} {histogram[-1]:.3f}")
+            lines.append("# TYPE agent_llm_tokens_total counter")
+            for token_type, count in sorted(self._tokens.items()):
+                lines.append(f'agent_llm_tokens_total{{type="{token_type.replace("_tokens", "")}"}} {count}')
+            lines.append("# TYPE agent_cache_lookups_total counter")
+            for (endpoint, result), count in sorted(self._cache.items()):
+                lines.append(f'agent_cache_lookups_total{{endpoint="{endpoint}",result="{result}"}} {count}')
+            gauges = list(self._gauges.items())
+        for name, read in gauges: # read outside the lock: a gauge may take its own locks
+            lines.append(f"# TYPE {name} gauge")
+            for labels, value in sorted(read().items()):
+                lines.append(f"{name}{{{labels}}} {value:g}" if labels else f"{name} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+# --- Tracer ---
+class Tracer:
+    def __init__(self, sinks: Sequence[Any] = (), sample_rate: float = 1.0):
+        self.sinks = list(sinks)
+        self.sample_rate = sample_rate
+
+    @classmethod
+    def from_env(cls) -> "Tracer":
+        """PrometheusSink always; JsonLinesSink when TRACE_JSONL_PATH is set; TRACE_SAMPLE_RATE (default 0.01)."""
+        sinks: List[Any] = [PrometheusSink()]
+        if os.getenv("TRACE_JSONL_PATH"):
+            sinks.append(JsonLinesSink(os.environ["TRACE_JSONL_PATH"]))
+        return cls(sinks, sample_rate=float(os.getenv("TRACE_SAMPLE_RATE", "0.01")))
+
+    def add_sink(self, sink: Any) -> None:
+        self.sinks.append(sink)
+
+    def sink(self, sink_type: type) -> Any:
+        return next((sink for sink in self.sinks if isinstance(sink, sink_type)), None)
+
+    @contextmanager
+    def span(self, name: str, kind: str = "internal", thread_id: Optional[str] = None, **attributes: Any) -> Iterator[Any]:
+        thread_token = current_thread_id.set(thread_id) if thread_id is not None else None
+        if not self.sinks:
+            # No spans to record, but the thread_id is still published (prefetch.py keys its store by it)
+            try:
+                yield _NOOP_SPAN
+            finally:
+                if thread_token is not None:
+                    current_thread_id.reset(thread_token)
+            return
+        parent = _current_span.get()
+        span = Span(
+            name, kind,
+            trace_id=parent.trace_id if parent else uuid.uuid4().hex,
+            parent_id=parent.span_id if parent else None,
+            thread_id=current_thread_id.get(),
+            sampled=parent.sampled if parent else random.random() < self.sample_rate,
+            attributes=attributes,
+        )
+        span_token = _current_span.set(span)
+        started_at = time.perf_counter()
+        try:
+            yield span
+        except BaseException as e:
+            span.fail(type(e).__name__)
+            raise
+        finally:
+            span.duration_ms = (time.perf_counter() - started_at) * 1000
+            _current_span.reset(span_token)
+            if thread_token is not None:
+                current_thread_id.reset(thread_token)
+            self._export(span)
+
+    def _export(self, span: Span) -> None:
+        for sink in self.sinks:
+            if sink.sampled and not span.sampled:
+                continue
+            try:
+                sink.export(span)
+            except Exception:
+                logger.exception("Trace sink %s failed", type(sink).__name__)
+
+
+tracer = Tracer.from_env()
+
+
+def thread_id_from(config: Optional[RunnableConfig]) -> Optional[str]:
+    return (config or {}).get("configurable", {}).get("thread_id")
+
+
+def traced_node(name: str, node: Any) -> RunnableLambda:
+    """Wraps a graph node (any Runnable) so each run is a "node" span carrying the thread_id from the config."""
+
+    def run(state: Any, config: RunnableConfig) -> Any:
+        with tracer.span(name, kind="node", thread_id=thread_id_from(config)):
+            return node.invoke(state, config)
+
+    async def arun(state: Any, config: RunnableConfig) -> Any:
+        with tracer.span(name, kind="node", thread_id=thread_id_from(config)):
+            return await node.ainvoke(state, config)
+
+    return RunnableLambda(run, afunc=arun, name=name)
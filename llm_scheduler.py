@@ -0,0 +1,418 @@
+# llm_scheduler.py (Admission control and fair scheduling for LLM calls under provider rate limits)
+
+import asyncio
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Callable, Deque, Dict, Iterator, List, Optional
+
+from instrumentation import logger, tracer
+
+# Queue priorities, served strictly in this order
+PRIORITY_CONTINUATION = 0 # the turn is part way through a tool chain (the last message is a tool result)
+PRIORITY_NEW = 1          # a new user message
+PRIORITY_NAMES = {PRIORITY_CONTINUATION: "continuation", PRIORITY_NEW: "new"}
+
+
+class QueueFullError(RuntimeError):
+    """
+    The LLM queue cannot take the call: it is full ("queue_full"), or the call waited longer than
+    max_wait ("wait_timeout"). `retry_after` is a hint in seconds; chat_server.py answers 429 with it.
+    """
+
+    def __init__(self, message: str, reason: str, retry_after: float):
+        super().__init__(message)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """
+    Refills continuously at `per_minute` / 60 per second and holds at most `burst_seconds` worth of it
+    (by default a full minute, as providers count it); `per_minute` 0 means unlimited.
+    """
+
+    def __init__(self, per_minute: float, burst_seconds: float = 60.0, clock: Callable[[], float] = time.monotonic):
+        self.per_minute = per_minute
+        self.capacity = per_minute * burst_seconds / 60
+        self.level = self.capacity
+        self._updated = clock()
+
+    @property
+    def unlimited(self) -> bool:
+        return self.per_minute <= 0
+
+    def delay(self, amount: float, now: float) -> float:
+        """Seconds until `amount` is available (an amount above the capacity waits for a full bucket)."""
+        if self.unlimited:
+            return 0.0
+        self._refill(now)
+        missing = min(amount, self.capacity) - self.level
+        return missing * 60 / self.per_minute if missing > 0 else 0.0
+
+    def take(self, amount: float, now: float) -> None:
+        if not self.unlimited:
+            self._refill(now)
+            self.level -= min(amount, self.capacity)
+
+    def adjust(self, amount: float) -> None:
+        # Refund (> 0) or charge (< 0) the difference between a reservation and the actual usage;
+        # the level may go negative, which holds the next calls back until the overrun is paid off
+        if not self.unlimited:
+            self.level = min(self.capacity, self.level + amount)
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.per_minute / 60)
+        self._updated = now
+
+
+class _Ticket:
+    """One queued LLM call. Sync callers wait on `event`; async callers on `future`, resolved on their loop."""
+    __slots__ = ("thread_id", "tenant", "priority", "tokens", "enqueued_at", "granted", "event", "loop", "future")
+
+    def __init__(self, thread_id: str, tenant: str, priority: int, tokens: int, enqueued_at: float,
+                 loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.thread_id = thread_id
+        self.tenant = tenant
+        self.priority = priority
+        self.tokens = tokens
+        self.enqueued_at = enqueued_at
+        self.granted = False
+        self.loop = loop
+        self.event = threading.Event() if loop is None else None
+        self.future: Optional[asyncio.Future] = loop.create_future() if loop is not None else None
+
+    def wake(self) -> None:
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(_resolve, self.future)
+
+
+def _resolve(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+class LlmPermit:
+    """The right to make one LLM call; settle() reports the tokens it actually used."""
+
+    def __init__(self, scheduler: "LlmScheduler", tokens: int, waited_ms: float):
+        self.scheduler = scheduler
+        self.tokens = tokens # reserved when the call was admitted
+        self.waited_ms = waited_ms
+        self.settled = False
+
+    def settle(self, tokens_used: int) -> None:
+        if not self.settled:
+            self.settled = True
+            self.scheduler._settle(self, tokens_used)
+
+
+class LlmScheduler:
+    """
+    Sits in front of the model client in call_agent / acall_agent. Each call first takes a slot:
+    - Rate limits: token buckets for requests per minute and tokens per minute (the prompt estimate plus
+      `completion_reserve`, corrected by the usage the call reports); `burst_seconds` below 60 keeps a
+      burst from spending a whole minute's budget at once. A provider rate-limit error pauses
+      all calls for `backoff` seconds (throttle()) instead of letting every thread retry at once.
+    - Concurrency: at most `max_in_flight` calls at a time (0 = no limit).
+    - Bounded queue: calls that cannot start wait in a queue of at most `max_queue`; a call arriving at a
+      full queue, or waiting longer than `max_wait` seconds, raises QueueFullError (backpressure for the
+      HTTP layer, see chat_server.py).
+    - Fairness: calls that continue a tool chain go before new turns; within a priority the queue is served
+      round-robin across tenants, then across the tenant's threads, so one busy tenant or thread cannot
+      starve the others.
+    With no limits set (the default) slots are granted immediately and only counted.
+    stats() reports queue depth, wait times, rejections and token usage.
+    """
+
+    def __init__(self, requests_per_minute: float = 0, tokens_per_minute: float = 0, burst_seconds: float = 60.0,
+                 max_in_flight: int = 0, max_queue: int = 256, max_wait: float = 30.0, completion_reserve: int = 256,
+                 backoff: float = 2.0, clock: Callable[[], float] = time.monotonic, wait_window: int = 1000):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.completion_reserve = completion_reserve
+        self.backoff = backoff
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.configure(requests_per_minute, tokens_per_minute, burst_seconds)
+        # priority -> tenant -> thread_id -> waiting tickets; OrderedDicts rotate for round-robin
+        self._queues: List["OrderedDict[str, OrderedDict[str, Deque[_Ticket]]]"] = [OrderedDict() for _ in PRIORITY_NAMES]
+        self._waiting = 0
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._timer: Optional[threading.Timer] = None
+        self._timer_at = 0.0
+        # Metrics
+        self.granted = 0
+        self.queued = 0 # had to wait
+        self.rejected = 0
+        self.timed_out = 0
+        self.throttled = 0
+        self.peak_queue_depth = 0
+        self.tokens_reserved = 0
+        self.tokens_used = 0
+        self._waits: Deque[float] = deque(maxlen=wait_window) # ms, calls that had to wait
+
+    def configure(self, requests_per_minute: float, tokens_per_minute: float, burst_seconds: float = 60.0) -> None:
+        with self._lock:
+            self.requests = TokenBucket(requests_per_minute, burst_seconds, self._clock)
+            self.tokens = TokenBucket(tokens_per_minute, burst_seconds, self._clock)
+
+    @property
+    def limited(self) -> bool:
+        return not (self.requests.unlimited and self.tokens.unlimited) or self.max_in_flight > 0
+
+    # --- Slots ---
+    @contextmanager
+    def slot(self, thread_id: Optional[str], tenant: Optional[str] = None, priority: int = PRIORITY_NEW,
+             tokens: int = 0) -> Iterator[LlmPermit]:
+        """Blocks until the call may start; the slot is released when the block exits."""
+        permit = self._acquire(_Ticket(thread_id or "", tenant or "default", priority, self._reservation(tokens), self._clock()))
+        try:
+            yield permit
+        finally:
+            self._release(permit)
+
+    @asynccontextmanager
+    async def aslot(self, thread_id: Optional[str], tenant: Optional[str] = None, priority: int = PRIORITY_NEW,
+                    tokens: int = 0) -> AsyncIterator[LlmPermit]:
+        """Same as slot(), but waits on the event loop instead of blocking the thread."""
+        ticket = _Ticket(thread_id or "", tenant or "default", priority, self._reservation(tokens), self._clock(),
+                         loop=asyncio.get_running_loop())
+        permit = await self._aacquire(ticket)
+        try:
+            yield permit
+        finally:
+            self._release(permit)
+
+    def admits(self) -> bool:
+        """False while the queue is full: a new turn would be rejected, so the HTTP layer can answer 429 up front."""
+        with self._lock:
+            return not self.limited or self._waiting < self.max_queue
+
+    def retry_after(self) -> float:
+        """Rough seconds until the current queue has drained, as a Retry-After hint."""
+        with self._lock:
+            return self._retry_after()
+
+    def throttle(self, seconds: Optional[float] = None) -> None:
+        """Pauses every call for `seconds` (default `backoff`), e.g. after the provider answered 429."""
+        with self._lock:
+            self.throttled += 1
+            self._paused_until = max(self._paused_until, self._clock() + (self.backoff if seconds is None else seconds))
+            logger.warning("LLM scheduler: provider rate limit hit, pausing calls for %.1f s", self._paused_until - self._clock())
+            self._dispatch(self._clock())
+
+    def note_error(self, error: BaseException) -> None:
+        """Called with an exception from the model client; a provider rate-limit error throttles all calls."""
+        retry_after = _rate_limit_retry_after(error)
+        if retry_after is not None:
+            self.throttle(retry_after or None)
+
+    def reset(self) -> None:
+        """Forgets queued calls and timers (e.g. in a forked child, where the waiting threads do not exist)."""
+        with self._lock:
+            self._queues = [OrderedDict() for _ in PRIORITY_NAMES]
+            self._waiting = self._in_flight = 0
+            self._timer = None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            waits = sorted(self._waits)
+            return {
+                "limited": self.limited,
+                "requests_per_minute": self.requests.per_minute,
+                "tokens_per_minute": self.tokens.per_minute,
+                "queue_depth": self._waiting,
+                "queue_depth_by_priority": {name: self._depth(priority) for priority, name in PRIORITY_NAMES.items()},
+                "peak_queue_depth": self.peak_queue_depth,
+                "in_flight": self._in_flight,
+                "granted": self.granted,
+                "queued": self.queued,
+                "rejected": self.rejected,
+                "timed_out": self.timed_out,
+                "throttled": self.throttled,
+                "wait_ms": {
+                    "p50": round(waits[len(waits) // 2], 1) if waits else 0.0,
+                    "p95": round(waits[min(int(len(waits) * 0.95), len(waits) - 1)], 1) if waits else 0.0,
+                    "max": round(waits[-1], 1) if waits else 0.0,
+                },
+                "tokens_reserved": self.tokens_reserved,
+                "tokens_used": self.tokens_used,
+            }
+
+    # --- Internals ---
+    def _reservation(self, prompt_tokens: int) -> int:
+        return prompt_tokens + self.completion_reserve if not self.tokens.unlimited else 0
+
+    def _acquire(self, ticket: _Ticket) -> LlmPermit:
+        if not self._enqueue(ticket):
+            with tracer.span("llm_queue", kind="queue", priority=PRIORITY_NAMES[ticket.priority]):
+                deadline = ticket.enqueued_at + self.max_wait
+                while not ticket.event.wait(max(0.0, deadline - self._clock())):
+                    if self._clock() >= deadline:
+                        self._give_up(ticket)
+                        break
+        return self._permit(ticket)
+
+    async def _aacquire(self, ticket: _Ticket) -> LlmPermit:
+        if not self._enqueue(ticket):
+            with tracer.span("llm_queue", kind="queue", priority=PRIORITY_NAMES[ticket.priority]):
+                try:
+                    await asyncio.wait_for(asyncio.shield(ticket.future), self.max_wait)
+                except asyncio.TimeoutError:
+                    self._give_up(ticket)
+                except asyncio.CancelledError:
+                    with self._lock:
+                        if not ticket.granted:
+                            self._remove(ticket)
+                            self._dispatch(self._clock())
+                            raise
+                    self._release(self._permit(ticket)) # granted just as the caller went away
+                    raise
+        return self._permit(ticket)
+
+    def _enqueue(self, ticket: _Ticket) -> bool:
+        """Queues the ticket; True if it was granted straight away."""
+        with self._lock:
+            if not self.limited:
+                self.granted += 1
+                ticket.granted = True
+                return True
+            if self._waiting >= self.max_queue:
+                self.rejected += 1
+                raise QueueFullError(f"LLM queue is full ({self._waiting} calls waiting)", "queue_full", self._retry_after())
+            tenants = self._queues[ticket.priority].setdefault(ticket.tenant, OrderedDict())
+            tenants.setdefault(ticket.thread_id, deque()).append(ticket)
+            self._waiting += 1
+            self._dispatch(ticket.enqueued_at)
+            if ticket.granted:
+                return True
+            self.queued += 1
+            self.peak_queue_depth = max(self.peak_queue_depth, self._waiting)
+            return False
+
+    def _give_up(self, ticket: _Ticket) -> None:
+        # The wait timed out; unless it was granted in the meantime, leave the queue and reject the call
+        with self._lock:
+            if ticket.granted:
+                return
+            self._remove(ticket)
+            self.timed_out += 1
+            self._dispatch(self._clock())
+            retry_after = self._retry_after()
+        raise QueueFullError(f"Waited more than {self.max_wait:.0f} s for an LLM slot", "wait_timeout", retry_after)
+
+    def _permit(self, ticket: _Ticket) -> LlmPermit:
+        return LlmPermit(self, ticket.tokens, (self._clock() - ticket.enqueued_at) * 1000)
+
+    def _release(self, permit: LlmPermit) -> None:
+        if not permit.settled:
+            permit.settle(permit.tokens) # the call failed or reported nothing: keep the reservation
+        with self._lock:
+            if self.limited:
+                self._in_flight = max(0, self._in_flight - 1)
+                self._dispatch(self._clock())
+
+    def _settle(self, permit: LlmPermit, tokens_used: int) -> None:
+        with self._lock:
+            self.tokens_reserved += permit.tokens
+            self.tokens_used += tokens_used
+            if permit.tokens:
+                self.tokens.adjust(permit.tokens - tokens_used)
+
+    def _dispatch(self, now: float) -> None:
+        # Called with self._lock held: grants queued calls in fair order while the limits allow, and
+        # arms a timer for the moment the next one can start
+        while self._waiting:
+            ticket = self._head()
+            if self.max_in_flight and self._in_flight >= self.max_in_flight:
+                return # the next release dispatches again
+            delay = max(self._paused_until - now, self.requests.delay(1, now), self.tokens.delay(ticket.tokens, now))
+            if delay > 0:
+                self._arm_timer(now + delay)
+                return
+            self.requests.take(1, now)
+            self.tokens.take(ticket.tokens, now)
+            self._pop(ticket)
+            self._in_flight += 1
+            self.granted += 1
+            ticket.granted = True
+            if now > ticket.enqueued_at:
+                self._waits.append((now - ticket.enqueued_at) * 1000)
+            ticket.wake()
+
+    def _arm_timer(self, at: float) -> None:
+        if self._timer is not None and self._timer_at <= at:
+            return
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = threading.Timer(max(0.0, at - self._clock()), self._on_timer)
+        self._timer.daemon = True
+        self._timer_at = at
+        self._timer.start()
+
+    def _on_timer(self) -> None:
+        with self._lock:
+            if self._timer is threading.current_thread():
+                self._timer = None
+                self._dispatch(self._clock())
+
+    def _head(self) -> _Ticket:
+        tenants = next(queue for queue in self._queues if queue)
+        threads = next(iter(tenants.values()))
+        return next(iter(threads.values()))[0]
+
+    def _pop(self, ticket: _Ticket) -> None:
+        # Removes the granted head and rotates its thread and tenant to the back of their round-robin order
+        tenants = self._queues[ticket.priority]
+        threads = tenants[ticket.tenant]
+        threads[ticket.thread_id].popleft()
+        if threads[ticket.thread_id]:
+            threads.move_to_end(ticket.thread_id)
+        else:
+            del threads[ticket.thread_id]
+        if threads:
+            tenants.move_to_end(ticket.tenant)
+        else:
+            del tenants[ticket.tenant]
+        self._waiting -= 1
+
+    def _remove(self, ticket: _Ticket) -> None:
+        tenants = self._queues[ticket.priority]
+        threads = tenants.get(ticket.tenant, {})
+        tickets = threads.get(ticket.thread_id)
+        if not tickets or ticket not in tickets:
+            return
+        tickets.remove(ticket)
+        if not tickets:
+            del threads[ticket.thread_id]
+        if not threads:
+            del tenants[ticket.tenant]
+        self._waiting -= 1
+
+    def _depth(self, priority: int) -> int:
+        return sum(len(tickets) for threads in self._queues[priority].values() for tickets in threads.values())
+
+    def _retry_after(self) -> float:
+        # Called with self._lock held
+        seconds = max(0.0, self._paused_until - self._clock())
+        if not self.requests.unlimited:
+            seconds += self._waiting * 60 / self.requests.per_minute
+        return float(max(1, math.ceil(min(seconds, self.max_wait))))
+
+
+def _rate_limit_retry_after(error: BaseException) -> Optional[float]:
+    """For a provider 429 (openai.RateLimitError or anything with status_code 429): its Retry-After, or 0 if it has none."""
+    if type(error).__name__ != "RateLimitError" and getattr(error, "status_code", None) != 429:
+        return None
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after", 0))
+    except (TypeError, ValueError):
+        return 0.0
@@ -0,0 +1,210 @@
+# member_context.py (Pins the conversation's member ID and keeps a compact member profile in state)
+
+import json
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+from langchain_core.runnables import RunnableConfig
+
+from fast_path import MEMBER_ID_PATTERN
+from instrumentation import logger
+from state_access import state_field, state_messages
+
+# How long a fetched fact may be reused before the model has to call the tool again, in seconds.
+# Same values as the backend cache TTLs in tool_cache.py, so the summary never reports a fact the
+# cache itself would already have refetched.
+DEFAULT_FIELD_TTLS: Dict[str, float] = {
+    "cards": 300.0,             # /id-list: card IDs and primary ID
+    "card_status": 60.0,        # /id-status, per card
+    "enrollment_status": 900.0, # /member-status
+    "new_card_request": 3600.0, # /new-id-card-request (not cached; kept so a follow-up can mention it)
+}
+
+# Tool -> profile field its result fills (get_id_card_status fills the per-card "card_status" map)
+TOOL_FIELDS: Dict[str, str] = {
+    "get_id_list": "cards",
+    "get_member_status": "enrollment_status",
+    "request_new_id_card": "new_card_request",
+}
+
+
+class MemberContext:
+    """
+    Graph node that runs after the fast path and after every tool_executor step. It keeps two state fields:
+    - current_member_id: pinned from the latest user message when it names exactly one member ID, or from
+      the member_id argument of a tool call if nothing is pinned yet. A different ID starts a new profile.
+    - member_profile: a JSON-friendly dict of what this turn's tool results said about that member
+      (card IDs, primary ID, enrollment status, per-card status, a new card request), each with the time
+      it was fetched. Entries older than their TTL are dropped, which is what makes the model fetch them again.
+    summary() renders the fresh part of the profile as one short note for the prompt, so follow-up turns
+    can answer from it instead of repeating the /id-list and /member-status calls.
+    """
+
+    def __init__(self, ttls: Optional[Dict[str, float]] = None, enabled: bool = True, clock: Callable[[], float] = time.time):
+        self.ttls = dict(DEFAULT_FIELD_TTLS if ttls is None else ttls)
+        self.enabled = enabled
+        self.clock = clock # wall time: profiles are checkpointed and may be read by another process
+        self._lock = threading.Lock()
+        # Metrics
+        self.pins = 0
+        self.switches = 0
+        self.facts_recorded = 0
+        self.facts_expired = 0
+        self.summaries = 0
+
+    # --- Graph node ---
+    def update(self, state: Any, config: Optional[RunnableConfig] = None) -> Dict[str, Any]:
+        if not self.enabled:
+            return {"messages": []}
+        messages = state_messages(state)
+        turn = messages[_turn_start(messages):]
+        member_id = state_field(state, "current_member_id")
+        profile = dict(state_field(state, "member_profile") or {})
+
+        pinned = self._pin(turn, member_id)
+        if pinned != member_id:
+            with self._lock:
+                self.pins += 1
+                self.switches += member_id is not None
+            logger.debug("Member context: pinned member %s (was %s)", pinned, member_id)
+            member_id, profile = pinned, {"member_id": pinned}
+        if member_id is None:
+            return {"messages": []}
+
+        now = self.clock()
+        recorded = self._record_tool_results(turn, member_id, profile, now)
+        expired = self._expire(profile, now)
+        with self._lock:
+            self.facts_recorded += recorded
+            self.facts_expired += expired
+        if pinned == state_field(state, "current_member_id") and not recorded and not expired:
+            return {"messages": []}
+        return {"current_member_id": member_id, "member_profile": profile}
+
+    async def aupdate(self, state: Any, config: Optional[RunnableConfig] = None) -> Dict[str, Any]:
+        return self.update(state, config) # no I/O; avoids a thread-pool hop on the async path
+
+    # --- Prompt ---
+    def summary(self, state: Any) -> Optional[str]:
+        """One-line note of the pinned member ID and every still-fresh fact, or None when nothing is pinned."""
+        member_id = state_field(state, "current_member_id")
+        if not self.enabled or not member_id:
+            return None
+        profile = state_field(state, "member_profile") or {}
+        now = self.clock()
+        facts = [f"member ID {member_id}."]
+        cards = profile.get("cards")
+        if cards and self._fresh("cards", cards, now):
+            ids = [f"{card_id} (primary)" if card_id == cards.get("primary_id") else card_id for card_id in cards["ids"]]
+            facts.append(f"ID cards: {', '.join(ids)} [{_age(now, cards)}].")
+        enrollment = profile.get("enrollment_status")
+        if enrollment and self._fresh("enrollment_status", enrollment, now):
+            facts.append(f"Enrollment status: {enrollment['value']} [{_age(now, enrollment)}].")
+        for card_id, status in sorted((profile.get("card_status") or {}).items()):
+            if self._fresh("card_status", status, now):
+                details = "".join(f", {label} {status[key]}" for key, label in
+                                  (("tracking_number", "tracking"), ("estimated_delivery", "estimated delivery")) if key in status)
+                facts.append(f"Card {card_id}: {status['status']}{details} [{_age(now, status)}].")
+        request = profile.get("new_card_request")
+        if request and self._fresh("new_card_request", request, now):
+            facts.append(f"New ID card request {request['request_id']}: {request['status']} [{_age(now, request)}].")
+        with self._lock:
+            self.summaries += 1
+        return ("Member context (from tool results earlier in this conversation; use these facts instead of "
+                "calling the tools again, unless the user asks to re-check): " + " ".join(facts))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "pins": self.pins,
+                "member_switches": self.switches,
+                "facts_recorded": self.facts_recorded,
+                "facts_expired": self.facts_expired,
+                "summaries": self.summaries,
+            }
+
+    # --- Internals ---
+    def _pin(self, turn: List[BaseMessage], member_id: Optional[str]) -> Optional[str]:
+        if turn and isinstance(turn[0], HumanMessage):
+            named = set(MEMBER_ID_PATTERN.findall(" ".join(str(turn[0].content).split())))
+            if len(named) == 1:
+                return named.pop() # the user named one member: pin it, even if it replaces the previous one
+        if member_id is None:
+            # e.g. the user answered "it's 12345" to the agent's question; the agent's tool call carries the ID
+            for message in reversed(turn):
+                for call in getattr(message, "tool_calls", None) or []:
+                    if call["args"].get("member_id"):
+                        return str(call["args"]["member_id"])
+        return member_id
+
+    def _record_tool_results(self, turn: List[BaseMessage], member_id: str, profile: Dict[str, Any], now: float) -> int:
+        calls = {call["id"]: call for message in turn if isinstance(message, AIMessage) for call in message.tool_calls}
+        recorded = 0
+        for message in turn:
+            call = calls.get(message.tool_call_id) if isinstance(message, ToolMessage) else None
+            output = _parse(message) if call else None
+            if output is None or str(call["args"].get("member_id", member_id)) != member_id:
+                continue # failed call, or a lookup for some other member
+            entry = {"fetched_at": now, "call_id": call["id"]} # call_id: each result is recorded once, not on every step
+            if call["name"] == "get_id_card_status":
+                card_id = str(call["args"].get("id"))
+                statuses = dict(profile.get("card_status") or {})
+                if (statuses.get(card_id) or {}).get("call_id") == call["id"]:
+                    continue
+                statuses[card_id] = {key: output[key] for key in ("status", "tracking_number", "estimated_delivery") if key in output}
+                statuses[card_id].update(entry)
+                profile["card_status"] = statuses
+            else:
+                field = TOOL_FIELDS.get(call["name"])
+                if field is None or (profile.get(field) or {}).get("call_id") == call["id"]:
+                    continue
+                if field == "cards":
+                    profile["cards"] = {"ids": output["ids"], "primary_id": output.get("primary_id"), **entry}
+                elif field == "enrollment_status":
+                    profile["enrollment_status"] = {"value": output["enrollment_status"], **entry}
+                else:
+                    profile["new_card_request"] = {"request_id": output["request_id"], "status": output["status"], **entry}
+                    # A new card is on its way: the card list and statuses on record are about to change
+                    profile.pop("cards", None)
+                    profile.pop("card_status", None)
+            recorded += 1
+        return recorded
+
+    def _expire(self, profile: Dict[str, Any], now: float) -> int:
+        expired = 0
+        for field in ("cards", "enrollment_status", "new_card_request"):
+            if field in profile and not self._fresh(field, profile[field], now):
+                del profile[field]
+                expired += 1
+        statuses = profile.get("card_status")
+        if statuses:
+            fresh = {card_id: status for card_id, status in statuses.items() if self._fresh("card_status", status, now)}
+            expired += len(statuses) - len(fresh)
+            profile["card_status"] = fresh
+        return expired
+
+    def _fresh(self, field: str, entry: Dict[str, Any], now: float) -> bool:
+        return now - entry["fetched_at"] <= self.ttls.get(field, 0.0)
+
+
+def _turn_start(messages: List[BaseMessage]) -> int:
+    """Index of the latest HumanMessage (the start of the current turn)."""
+    for index in range(len(messages) - 1, -1, -1):
+        if isinstance(messages[index], HumanMessage):
+            return index
+    return 0
+
+
+def _age(now: float, entry: Dict[str, Any]) -> str:
+    seconds = max(0, int(now - entry["fetched_at"]))
+    return f"checked {seconds} s ago" if seconds < 120 else f"checked {seconds // 60} min ago"
+
+
+def _parse(message: ToolMessage) -> Optional[Dict[str, Any]]:
+    try:
+        output = json.loads(message.content)
+    except (TypeError, ValueError):
+        return None
+    return output if isinstance(output, dict) and "error" not in output else None
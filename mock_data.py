@@ -0,0 +1,36 @@
+# mock_data.py (Canned backend responses shared by MockApiClient and the local stub server)
+
+from typing import Any, Dict, List
+
+
+def mock_get_response(endpoint: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    if endpoint in ("/id-status/batch", "/comets-data/batch"):
+        # Bulk per-card lookup: ?ids=A,B -> {"results": {"A": <single response>, "B": ...}}
+        ids = params.get("ids", "")
+        ids = ids.split(",") if isinstance(ids, str) else list(ids)
+        return mock_get_batch_response(endpoint[:-len("/batch")], [card_id for card_id in ids if card_id])
+    if endpoint == "/id-list" and params.get("member_id") == "12345":
+        return {"ids": ["MED-ID-12345-A", "MED-ID-12345-B"], "primary_id": "MED-ID-12345-A"}
+    if endpoint == "/id-status" and params.get("id") == "MED-ID-12345-A":
+        return {"status": "Shipped", "tracking_number": "TRK789", "estimated_delivery": "2025-07-08"}
+    if endpoint == "/comets-data" and params.get("id") == "MED-ID-12345-A":
+         return {"comets_status": "Active", "last_update": "2025-06-30", "details": "No issues detected."}
+    if endpoint == "/member-benefits" and params.get("member_id") == "67890" and params.get("plan_type", "").lower() == "hmo":
+        return {"member_id": "67890", "plan_type": "HMO", "benefits": ["dental", "vision", "prescription"]}
+    if endpoint == "/dental-coverage" and params.get("member_id") == "12345":
+        return {"member_id": "12345", "dental_status": "Active", "preventative_coinsurance": "80%"}
+    if endpoint == "/member-status" and params.get("member_id") == "12345":
+        return {"member_id": "12345", "enrollment_status": "Active"}
+    # Add more mock responses for other endpoints/tools
+    return {"error": "Not Found", "message": f"No mock data for {endpoint} with {params}"}
+
+
+def mock_get_batch_response(endpoint: str, ids: List[str]) -> Dict[str, Any]:
+    return {"results": {card_id: mock_get_response(endpoint, {"id": card_id}) for card_id in ids}}
+
+
+def mock_post_response(endpoint: str, json_data: Dict[str, Any]) -> Dict[str, Any]:
+    if endpoint == "/new-id-card-request":
+        return {"request_id": "REQ9876", "status": "Pending", "message": "New ID card request submitted."}
+    # Add more mock responses for other endpoints/tools
+    return {"error": "Not Implemented", "message": f"No mock data for POST {endpoint} with {json_data}"}
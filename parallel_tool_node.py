@@ -0,0 +1,222 @@
+# parallel_tool_node.py (Tool executor that runs all tool calls of one AIMessage concurrently)
+
+import asyncio
+import contextvars
+import json
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Dict, List, Optional, Sequence
+
+from langchain_core.messages import AIMessage, ToolMessage
+from langchain_core.runnables import RunnableConfig
+from langchain_core.tools import BaseTool
+from langgraph.utils import RunnableCallable
+
+from instrumentation import tracer
+from state_access import state_messages
+from streaming import emit
+from tool_results import make_error, render
+
+
+class ParallelToolNode(RunnableCallable):
+    """
+    Drop-in replacement for langgraph's ToolNode for the `tool_executor` node.
+    - All tool calls in the last AIMessage run concurrently: on a bounded, process-wide thread pool for
+      invoke/stream, and under a semaphore of the same size for ainvoke/astream.
+    - Each call has a timeout (per tool name, or the default), counted from when a worker starts it. A call
+      that times out or raises becomes a ToolMessage holding a ToolError (see tool_results.py) so the agent
+      can react to it; the other calls are unaffected.
+    - A call that waits longer than queue_timeout for a free worker (e.g. while hung calls hold the pool) is
+      not run at all and becomes a retryable "queue_timeout" ToolError instead of a tool timeout.
+    - ToolMessages are returned in the same order as the tool calls, however the calls finish.
+    - With a stream handler in the config (see streaming.py), tool_start/tool_end events are emitted per call.
+    Works with a pydantic state (AgentState), a dict state with "messages", or a plain message list.
+    """
+
+    def __init__(
+        self,
+        tools: Sequence[BaseTool],
+        *,
+        max_workers: int = 8,
+        default_timeout: float = 10.0,
+        tool_timeouts: Optional[Dict[str, float]] = None,
+        queue_timeout: Optional[float] = None,
+        name: str = "tools",
+    ) -> None:
+        super().__init__(self._func, self._afunc, name=name, trace=False)
+        self.tools_by_name: Dict[str, BaseTool] = {tool_.name: tool_ for tool_ in tools}
+        self.max_workers = max_workers
+        self.default_timeout = default_timeout
+        self.tool_timeouts = dict(tool_timeouts or {})
+        self.queue_timeout = default_timeout if queue_timeout is None else queue_timeout
+        self.metrics = {"timeouts": 0, "queue_timeouts": 0}
+        self._lock = threading.Lock() # metrics are updated from concurrent graph runs
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tool-executor")
+        self._semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary() # one per event loop
+
+    def timeout_for(self, tool_name: str) -> float:
+        return self.tool_timeouts.get(tool_name, self.default_timeout)
+
+    def reset_pool(self) -> None:
+        """Replaces the worker pool, e.g. in a forked child, which does not inherit the parent's threads."""
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="tool-executor")
+        self._semaphores = weakref.WeakKeyDictionary()
+
+    # --- Sync path ---
+    def _func(self, input: Any, config: RunnableConfig) -> Dict[str, List[ToolMessage]]:
+        tool_calls = _last_tool_calls(input)
+        submitted_at = time.monotonic()
+        for call in tool_calls:
+            emit(config, "tool_start", name=call["name"], id=call["id"])
+        # Each call runs in a copy of the caller's context so its spans keep the node's thread_id and parent
+        pending = []
+        for call in tool_calls:
+            start = _Start()
+            pending.append((call, start, self._executor.submit(contextvars.copy_context().run, self._start_one, start, call, config, submitted_at)))
+
+        outputs = []
+        for call, start, future in pending:
+            # Waiting for a free worker is bounded by queue_timeout; the tool's own timeout starts when it runs
+            queue_remaining = self.queue_timeout - (time.monotonic() - submitted_at)
+            if not start.event.wait(timeout=max(queue_remaining, 0.0)) and future.cancel():
+                self._count("queue_timeouts")
+                outputs.append(_queue_timeout_message(call, self.queue_timeout))
+            else:
+                start.event.wait() # cancel() failed, so a worker has just picked the call up
+                timeout = self.timeout_for(call["name"])
+                try:
+                    outputs.append(future.result(timeout=max(timeout - (time.monotonic() - start.at), 0.0)))
+                except FutureTimeoutError:
+                    # The worker thread cannot be interrupted; its late result is simply discarded
+                    self._count("timeouts")
+                    outputs.append(_timeout_message(call, timeout))
+            _emit_end(config, call, outputs[-1], submitted_at)
+        return {"messages": outputs}
+
+    def _start_one(self, start: "_Start", call: Dict[str, Any], config: RunnableConfig, submitted_at: float) -> ToolMessage:
+        start.at = time.monotonic()
+        start.event.set()
+        if start.at - submitted_at > self.queue_timeout:
+            # Picked up late, after the caller stopped watching the queue (it was waiting on an earlier call)
+            self._count("queue_timeouts")
+            return _queue_timeout_message(call, self.queue_timeout)
+        return self._run_one(call, config)
+
+    def _run_one(self, call: Dict[str, Any], config: RunnableConfig) -> ToolMessage:
+        with tracer.span("tool", kind="tool", tool=call["name"]) as span:
+            tool_ = self.tools_by_name.get(call["name"])
+            if tool_ is None:
+                message = _unknown_tool_message(call)
+            else:
+                try:
+                    message = ToolMessage(content=str(tool_.invoke(call["args"], config)), name=call["name"], tool_call_id=call["id"])
+                except Exception as e:
+                    message = _error_message(call, e)
+            _record_outcome(span, message)
+            return message
+
+    # --- Async path ---
+    async def _afunc(self, input: Any, config: RunnableConfig) -> Dict[str, List[ToolMessage]]:
+        tool_calls = _last_tool_calls(input)
+        semaphore = self._semaphore()
+        outputs = await asyncio.gather(*(self._arun_one(call, config, semaphore) for call in tool_calls))
+        return {"messages": list(outputs)}
+
+    async def _arun_one(self, call: Dict[str, Any], config: RunnableConfig, semaphore: asyncio.Semaphore) -> ToolMessage:
+        started_at = time.monotonic()
+        emit(config, "tool_start", name=call["name"], id=call["id"])
+        tool_ = self.tools_by_name.get(call["name"])
+        if tool_ is None:
+            message = _unknown_tool_message(call)
+            _emit_end(config, call, message, started_at)
+            return message
+
+        timeout = self.timeout_for(call["name"])
+        with tracer.span("tool", kind="tool", tool=call["name"]) as span:
+            try:
+                # As on the sync path, the wait for a slot has its own budget and the tool's timeout starts once it runs
+                await asyncio.wait_for(semaphore.acquire(), timeout=self.queue_timeout)
+            except asyncio.TimeoutError:
+                self._count("queue_timeouts")
+                message = _queue_timeout_message(call, self.queue_timeout)
+            else:
+                try:
+                    output = await asyncio.wait_for(tool_.ainvoke(call["args"], config), timeout=timeout)
+                    message = ToolMessage(content=str(output), name=call["name"], tool_call_id=call["id"])
+                except asyncio.TimeoutError:
+                    self._count("timeouts")
+                    message = _timeout_message(call, timeout)
+                except Exception as e:
+                    message = _error_message(call, e)
+                finally:
+                    semaphore.release()
+            _record_outcome(span, message)
+        _emit_end(config, call, message, started_at)
+        return message
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            metrics = dict(self.metrics)
+        return {**metrics, "max_workers": self.max_workers, "queue_timeout": self.queue_timeout}
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self.metrics[key] += 1
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if loop not in self._semaphores:
+            self._semaphores[loop] = asyncio.Semaphore(self.max_workers)
+        return self._semaphores[loop]
+
+
+class _Start:
+    """Set by the worker when it picks a submitted call up, with the time it did."""
+    __slots__ = ("event", "at")
+
+    def __init__(self) -> None:
+        self.event = threading.Event()
+        self.at = 0.0
+
+
+def _last_tool_calls(input: Any) -> List[Dict[str, Any]]:
+    messages = state_messages(input)
+    if not messages or not isinstance(messages[-1], AIMessage):
+        raise ValueError("Last message is not an AIMessage")
+    return messages[-1].tool_calls
+
+
+def _is_error(message: ToolMessage) -> bool:
+    return str(message.content).startswith('{"error":') # ToolError renders with "error" first
+
+
+def _record_outcome(span: Any, message: ToolMessage) -> None:
+    if span.recording and _is_error(message):
+        span.fail(json.loads(message.content)["error"])
+
+
+def _emit_end(config: RunnableConfig, call: Dict[str, Any], message: ToolMessage, started_at: float) -> None:
+    ok = not _is_error(message)
+    emit(config, "tool_end", name=call["name"], id=call["id"], ok=ok, ms=round((time.monotonic() - started_at) * 1000, 1))
+
+
+def _timeout_message(call: Dict[str, Any], timeout: float) -> ToolMessage:
+    error = make_error("timeout", f"{call['name']} timed out after {timeout:g}s")
+    return ToolMessage(content=render(error), name=call["name"], tool_call_id=call["id"])
+
+
+def _queue_timeout_message(call: Dict[str, Any], queue_timeout: float) -> ToolMessage:
+    error = make_error("queue_timeout", f"{call['name']} was not run: no tool worker was free within {queue_timeout:g}s")
+    return ToolMessage(content=render(error), name=call["name"], tool_call_id=call["id"])
+
+
+def _error_message(call: Dict[str, Any], exception: Exception) -> ToolMessage:
+    error = make_error("tool_failed", f"{call['name']} failed: {type(exception).__name__}: {exception}")
+    return ToolMessage(content=render(error), name=call["name"], tool_call_id=call["id"])
+
+
+def _unknown_tool_message(call: Dict[str, Any]) -> ToolMessage:
+    error = make_error("unknown_tool", f"{call['name']} is not a valid tool")
+    return ToolMessage(content=render(error), name=call["name"], tool_call_id=call["id"])
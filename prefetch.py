@@ -0,0 +1,267 @@
+# prefetch.py (Speculative background lookups for the calls that usually follow get_id_list)
+
+import asyncio
+import concurrent.futures
+import contextvars
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from instrumentation import current_thread_id, logger, tracer
+from tool_cache import CacheKey, make_cache_key
+
+# Lookup that triggers the prefetch -> lookups started for each card ID in its response
+DEFAULT_FOLLOW_UPS: Dict[str, Sequence[str]] = {
+    "/id-list": ("/id-status", "/comets-data"),
+}
+
+
+class _Prefetch:
+    __slots__ = ("endpoint", "future", "started_at", "finished_at", "expires_at")
+
+    def __init__(self, endpoint: str, future: Any, started_at: float, expires_at: float):
+        self.endpoint = endpoint
+        self.future = future # concurrent.futures.Future (sync path) or asyncio.Task (async path)
+        self.started_at = started_at
+        self.finished_at: Optional[float] = None
+        self.expires_at = expires_at
+
+
+class PrefetchingApiClient:
+    """
+    Wraps the backend client (the CachingApiClient in app.py) with the same get/post/aget/apost interface.
+    When enabled, a successful lookup listed in `follow_ups` (by default /id-list) starts the lookups that
+    usually follow it in the background: /id-status and /comets-data for the primary_id, or for every ID
+    with `all_ids`. Results are kept per conversation thread (the thread_id of the running graph node) for
+    `ttl` seconds. A matching tool call takes the result, or joins the call still in flight, instead of
+    starting its own; a prefetch that failed is ignored and the tool makes the call itself.
+    Any write drops the thread's pending results, and a new card request also drops the member's /id-list and
+    /id-status results from every thread (card IDs as seen in the member's last /id-list response). Disabled (the default) it only passes calls through.
+    stats() reports prefetches started, used (hits), expired unused (wasted) and the backend time saved,
+    per endpoint, to weigh the extra backend load against the latency it removes.
+    """
+
+    def __init__(self, client: Any, enabled: bool = False, all_ids: bool = False,
+                 follow_ups: Optional[Dict[str, Sequence[str]]] = None, ttl: float = 30.0, max_threads: int = 1024,
+                 max_workers: int = 4, clock: Callable[[], float] = time.monotonic):
+        self.client = client
+        self.enabled = enabled
+        self.all_ids = all_ids
+        self.follow_ups = dict(DEFAULT_FOLLOW_UPS if follow_ups is None else follow_ups)
+        self.ttl = ttl
+        self.max_threads = max_threads
+        self.max_workers = max_workers
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._stores: "OrderedDict[str, Dict[CacheKey, _Prefetch]]" = OrderedDict() # thread_id -> pending results
+        # member_id -> card IDs from the last /id-list response, to find the member's results in every thread
+        self._member_cards: "OrderedDict[str, Tuple[str, ...]]" = OrderedDict()
+        self._executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+        # Metrics, per endpoint
+        self._counts: Dict[str, Dict[str, float]] = {}
+
+    # --- Reads ---
+    def get(self, endpoint: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        entry = self._take(endpoint, params)
+        if entry is not None:
+            with tracer.span("backend", kind="backend", endpoint=endpoint, method="GET", prefetched=True) as span:
+                response = self._result(entry)
+                if response is not None:
+                    return response
+                span.fail("prefetch_unusable")
+        response = self.client.get(endpoint, params)
+        self._prefetch_follow_ups(endpoint, params, response, self._submit)
+        return response
+
+    async def aget(self, endpoint: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        entry = self._take(endpoint, params)
+        if entry is not None:
+            with tracer.span("backend", kind="backend", endpoint=endpoint, method="GET", prefetched=True) as span:
+                response = await self._aresult(entry)
+                if response is not None:
+                    return response
+                span.fail("prefetch_unusable")
+        response = await self.client.aget(endpoint, params)
+        self._prefetch_follow_ups(endpoint, params, response, self._create_task)
+        return response
+
+    # --- Writes ---
+    def post(self, endpoint: str, json_data: Dict[str, Any]) -> Dict[str, Any]:
+        self._drop_thread()
+        response = self.client.post(endpoint, json_data)
+        self._invalidate_after_write(endpoint, json_data)
+        return response
+
+    async def apost(self, endpoint: str, json_data: Dict[str, Any]) -> Dict[str, Any]:
+        self._drop_thread()
+        response = await self.client.apost(endpoint, json_data)
+        self._invalidate_after_write(endpoint, json_data)
+        return response
+
+    def invalidate_member(self, member_id: str) -> None:
+        """Drops the member's /id-list result and the /id-status result of every card on it, in every thread."""
+        with self._lock:
+            card_ids = self._member_cards.pop(member_id, ())
+            keys = {make_cache_key("/id-list", {"member_id": member_id})}
+            keys.update(make_cache_key("/id-status", {"id": card_id}) for card_id in card_ids)
+            for thread_id in list(self._stores):
+                store = self._stores[thread_id]
+                self._waste(store.pop(key) for key in keys & store.keys())
+                if not store:
+                    del self._stores[thread_id]
+
+    # --- Housekeeping ---
+    def reset_pool(self) -> None:
+        """Forgets the background threads and pending results (e.g. in a forked child, where neither survives)."""
+        with self._lock:
+            self._executor = None
+            self._stores.clear()
+            self._member_cards.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            now = self._clock()
+            for thread_id in list(self._stores):
+                self._purge(thread_id, now)
+            by_endpoint = {endpoint: dict(counts) for endpoint, counts in self._counts.items()}
+            pending = sum(len(store) for store in self._stores.values())
+        totals = {key: sum(counts.get(key, 0) for counts in by_endpoint.values())
+                  for key in ("started", "hits", "wasted", "failed", "saved_ms")}
+        for counts in by_endpoint.values():
+            counts["hit_rate"] = counts.get("hits", 0) / counts["started"] if counts.get("started") else 0.0
+        return {
+            "enabled": self.enabled,
+            **totals,
+            "pending": pending,
+            "hit_rate": totals["hits"] / totals["started"] if totals["started"] else 0.0,
+            "waste_rate": totals["wasted"] / totals["started"] if totals["started"] else 0.0,
+            "avg_saved_ms": totals["saved_ms"] / totals["hits"] if totals["hits"] else 0.0,
+            "by_endpoint": by_endpoint,
+        }
+
+    # --- Internals ---
+    def _prefetch_follow_ups(self, endpoint: str, params: Dict[str, Any], response: Dict[str, Any], start: Callable[[str, Dict[str, Any]], Any]) -> None:
+        follow_ups = self.follow_ups.get(endpoint) if self.enabled else None
+        thread_id = current_thread_id.get()
+        if not follow_ups or thread_id is None or "error" in response:
+            return
+        if endpoint == "/id-list" and "member_id" in params:
+            self._remember_cards(params["member_id"], response)
+        card_ids: List[str] = list(response.get("ids", [])) if self.all_ids else [response.get("primary_id")]
+        lookups = [(follow_up, {"id": card_id}) for card_id in filter(None, card_ids) for follow_up in follow_ups]
+        with self._lock:
+            store = self._stores.get(thread_id, {})
+            lookups = [(follow_up, params) for follow_up, params in lookups if make_cache_key(follow_up, params) not in store]
+        for follow_up, params in lookups:
+            started_at = self._clock()
+            entry = _Prefetch(follow_up, start(follow_up, params), started_at, started_at + self.ttl)
+            entry.future.add_done_callback(lambda _, entry=entry: setattr(entry, "finished_at", self._clock()))
+            with self._lock:
+                store = self._store(thread_id, entry.started_at)
+                store.setdefault(make_cache_key(follow_up, params), entry)
+                self._count(follow_up, "started")
+        if lookups:
+            logger.debug("Prefetch: %d lookups started after %s", len(lookups), endpoint)
+
+    def _submit(self, endpoint: str, params: Dict[str, Any]) -> concurrent.futures.Future:
+        with self._lock:
+            if self._executor is None:
+                self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="prefetch")
+            executor = self._executor
+        # copy_context: the backend spans of the prefetch join the trace of the tool call that triggered it
+        return executor.submit(contextvars.copy_context().run, self.client.get, endpoint, params)
+
+    def _create_task(self, endpoint: str, params: Dict[str, Any]) -> "asyncio.Task[Dict[str, Any]]":
+        return asyncio.get_running_loop().create_task(self.client.aget(endpoint, params))
+
+    def _take(self, endpoint: str, params: Dict[str, Any]) -> Optional[_Prefetch]:
+        thread_id = current_thread_id.get()
+        with self._lock:
+            if thread_id not in self._stores:
+                return None
+            self._purge(thread_id, self._clock())
+            return self._stores.get(thread_id, {}).pop(make_cache_key(endpoint, params), None)
+
+    def _result(self, entry: _Prefetch) -> Optional[Dict[str, Any]]:
+        taken_at = self._clock()
+        if not isinstance(entry.future, concurrent.futures.Future):
+            return self._used(entry, None, taken_at) # started on an event loop; a sync caller cannot wait for it
+        try:
+            response = entry.future.result()
+        except Exception:
+            response = None
+        return self._used(entry, response, taken_at)
+
+    async def _aresult(self, entry: _Prefetch) -> Optional[Dict[str, Any]]:
+        taken_at = self._clock()
+        future = entry.future
+        if isinstance(future, concurrent.futures.Future):
+            future = asyncio.wrap_future(future)
+        elif future.get_loop() is not asyncio.get_running_loop():
+            return self._used(entry, None, taken_at)
+        try:
+            response = await future
+        except Exception:
+            response = None
+        return self._used(entry, response, taken_at)
+
+    def _used(self, entry: _Prefetch, response: Optional[Dict[str, Any]], taken_at: float) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            if response is None or "error" in response:
+                self._count(entry.endpoint, "failed")
+                return None
+            self._count(entry.endpoint, "hits")
+            # Backend time that had already passed when the tool asked (all of it, if the prefetch was done)
+            finished_at = entry.finished_at if entry.finished_at is not None else taken_at
+            self._count(entry.endpoint, "saved_ms", (min(taken_at, finished_at) - entry.started_at) * 1000)
+        return dict(response)
+
+    def _store(self, thread_id: str, now: float) -> Dict[CacheKey, _Prefetch]:
+        # Called with self._lock held
+        if thread_id in self._stores:
+            self._purge(thread_id, now)
+        store = self._stores.get(thread_id)
+        if store is None:
+            store = self._stores[thread_id] = {}
+            while len(self._stores) > self.max_threads:
+                _, evicted = self._stores.popitem(last=False)
+                self._waste(evicted.values())
+        else:
+            self._stores.move_to_end(thread_id)
+        return store
+
+    def _purge(self, thread_id: str, now: float) -> None:
+        # Called with self._lock held
+        store = self._stores[thread_id]
+        expired = [key for key, entry in store.items() if entry.expires_at <= now]
+        self._waste(store.pop(key) for key in expired)
+        if not store:
+            del self._stores[thread_id]
+
+    def _remember_cards(self, member_id: str, response: Dict[str, Any]) -> None:
+        card_ids = tuple(dict.fromkeys(filter(None, [*response.get("ids", []), response.get("primary_id")])))
+        with self._lock:
+            self._member_cards[member_id] = card_ids
+            self._member_cards.move_to_end(member_id)
+            while len(self._member_cards) > self.max_threads:
+                self._member_cards.popitem(last=False)
+
+    def _invalidate_after_write(self, endpoint: str, json_data: Dict[str, Any]) -> None:
+        # A new card request changes the member's card list and the shipping status of their cards
+        if endpoint == "/new-id-card-request" and json_data.get("member_id"):
+            self.invalidate_member(json_data["member_id"])
+
+    def _drop_thread(self) -> None:
+        with self._lock:
+            self._waste(self._stores.pop(current_thread_id.get(), {}).values())
+
+    def _waste(self, entries: Any) -> None:
+        # Called with self._lock held. Calls still in flight are left to finish: their responses still
+        # reach the backend cache, and an asyncio task cannot be cancelled safely from another thread.
+        for entry in entries:
+            self._count(entry.endpoint, "wasted")
+
+    def _count(self, endpoint: str, key: str, amount: float = 1) -> None:
+        counts = self._counts.setdefault(endpoint, {})
+        counts[key] = counts.get(key, 0) + amount
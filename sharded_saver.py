@@ -0,0 +1,309 @@
+# sharded_saver.py (Checkpointer that spreads threads across several SQLite files by thread_id)
+#
+# SQLite allows one writer per database file, so with one conversations.db every checkpoint write from
+# every worker waits on the same lock. ShardedSaver hashes each thread_id to one of `shards` files and
+# keeps an AppendOnlySaver per file: a thread's reads and writes all go to its own shard, and writers
+# on different shards never wait for each other.
+#   - The hash is a stable digest of the thread_id (not Python's salted hash()), so every process and
+#     every restart agrees on where a thread lives. The shard count is part of each file name
+#     (conversations-002-of-004.db), so opening the same path with another count never misroutes a
+#     thread into the wrong file; use `python sharded_saver.py` to move threads between layouts.
+#   - Shard connections are opened lazily, per process: a forked child drops the ones it inherited and
+#     opens its own. Several processes can share the shard files; SQLite's file locks (WAL mode, 30 s busy
+#     timeout) serialize them per shard.
+#
+# Migration: python sharded_saver.py conversations.db --shards 4 [--remove-source]
+#   copies every thread of a single-file DB (AppendOnlySaver or SQLiteSaver), with its pending writes, into the 4-shard layout.
+# Rebalancing: python sharded_saver.py conversations.db --from-shards 4 --shards 8 [--remove-source]
+#   moves every thread from the 4-shard layout of the same base path into an 8-shard one.
+# Threads whose newest checkpoint is already in the target are skipped, so an interrupted run can be repeated.
+
+import argparse
+import asyncio
+import hashlib
+import heapq
+import os
+import sqlite3
+import sys
+import threading
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import BaseCheckpointSaver, Checkpoint, CheckpointMetadata, CheckpointTuple
+from langgraph.serde.base import SerializerProtocol
+
+from append_only_saver import AppendOnlySaver
+
+
+def shard_for(thread_id: str, shards: int) -> int:
+    digest = hashlib.blake2b(str(thread_id).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % shards
+
+
+def shard_paths(base_path: str, shards: int) -> List[str]:
+    """conversations.db with 4 shards -> conversations-000-of-004.db ... conversations-003-of-004.db"""
+    root, ext = os.path.splitext(base_path)
+    return [f"{root}-{index:03d}-of-{shards:03d}{ext or '.db'}" for index in range(shards)]
+
+
+class ShardedSaver(BaseCheckpointSaver):
+    def __init__(self, base_path: str, shards: int = 4, *, serde: Optional[SerializerProtocol] = None, **saver_kwargs: Any) -> None:
+        if shards < 1:
+            raise ValueError("shards must be at least 1")
+        super().__init__(serde=serde)
+        self.base_path = base_path
+        self.shards = shards
+        self.paths = shard_paths(base_path, shards)
+        self.saver_kwargs = saver_kwargs # passed to every shard's AppendOnlySaver (keep_last, max_idle_seconds, ...)
+        self._lock = threading.Lock()
+        self._pid: Optional[int] = None
+        self._savers: Dict[int, AppendOnlySaver] = {}
+
+    @classmethod
+    def from_conn_string(cls, conn_string: str, shards: int = 4, **kwargs: Any) -> "ShardedSaver":
+        path = conn_string[len("sqlite:///"):] if conn_string.startswith("sqlite:///") else conn_string
+        return cls(path, shards, **kwargs)
+
+    def shard(self, index: int) -> AppendOnlySaver:
+        with self._lock:
+            pid = os.getpid()
+            if self._pid != pid:
+                # Connections opened before a fork belong to the parent; never use them from the child
+                self._savers = {}
+                self._pid = pid
+            saver = self._savers.get(index)
+            if saver is None:
+                directory = os.path.dirname(self.paths[index])
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                saver = AppendOnlySaver.from_conn_string(self.paths[index], serde=self.serde, **self.saver_kwargs)
+                self._savers[index] = saver
+            return saver
+
+    def shard_for_config(self, config: RunnableConfig) -> AppendOnlySaver:
+        return self.shard(shard_for(config["configurable"]["thread_id"], self.shards))
+
+    # --- Reads ---
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return self.shard_for_config(config).get_tuple(config)
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        if config is not None:
+            yield from self.shard_for_config(config).list(config, filter=filter, before=before, limit=limit)
+            return
+        # No thread: every shard is newest-first already, so merging them keeps the order
+        per_shard = [self.shard(index).list(None, filter=filter, before=before, limit=limit) for index in range(self.shards)]
+        merged = heapq.merge(*per_shard, key=lambda checkpoint_tuple: checkpoint_tuple.config["configurable"]["thread_ts"], reverse=True)
+        for count, checkpoint_tuple in enumerate(merged, 1):
+            yield checkpoint_tuple
+            if limit and count >= limit:
+                return
+
+    # --- Writes ---
+    def put(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata) -> RunnableConfig:
+        return self.shard_for_config(config).put(config, checkpoint, metadata)
+
+    def put_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]], task_id: str) -> None:
+        self.shard_for_config(config).put_writes(config, writes, task_id)
+
+    # --- Retention ---
+    def prune(self, keep_last: Optional[int] = None, max_idle_seconds: Optional[float] = None) -> Dict[str, int]:
+        removed = {"threads": 0, "checkpoints": 0, "messages": 0}
+        for index in range(self.shards):
+            for key, count in self.shard(index).prune(keep_last, max_idle_seconds).items():
+                removed[key] += count
+        return removed
+
+    def vacuum(self) -> None:
+        for index in range(self.shards):
+            self.shard(index).vacuum()
+
+    def stats(self) -> Dict[str, Any]:
+        """Totals over the shards opened by this process, plus the per-shard put counts (to spot hot shards)."""
+        with self._lock:
+            savers = dict(self._savers)
+        totals: Dict[str, Any] = {"puts": 0, "bytes_written": 0, "messages_appended": 0, "rebases": 0}
+        for saver in savers.values():
+            for key, value in saver.stats().items():
+                totals[key] += value
+        totals["shards"] = self.shards
+        totals["puts_by_shard"] = [savers[index].puts if index in savers else 0 for index in range(self.shards)]
+        return totals
+
+    # --- Async variants ---
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await self.shard_for_config(config).aget_tuple(config)
+
+    async def aput(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata) -> RunnableConfig:
+        return await self.shard_for_config(config).aput(config, checkpoint, metadata)
+
+    async def aput_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]], task_id: str) -> None:
+        await self.shard_for_config(config).aput_writes(config, writes, task_id)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        if config is not None:
+            async for checkpoint_tuple in self.shard_for_config(config).alist(config, filter=filter, before=before, limit=limit):
+                yield checkpoint_tuple
+            return
+        results = await asyncio.get_running_loop().run_in_executor(
+            None, lambda: list(self.list(None, filter=filter, before=before, limit=limit))
+        )
+        for checkpoint_tuple in results:
+            yield checkpoint_tuple
+
+
+# --- Migration / rebalancing ---
+def _source_kind(path: str) -> Optional[str]:
+    """"append_only" or "sqlite" (langgraph's SQLiteSaver table) by the tables in the file, None if neither."""
+    conn = sqlite3.connect(path)
+    try:
+        tables = {name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    finally:
+        conn.close()
+    if "log_checkpoints" in tables:
+        return "append_only"
+    if "checkpoints" in tables:
+        return "sqlite"
+    return None
+
+
+ThreadWrites = Dict[str, List[Tuple[str, str, Any]]] # thread_ts -> [(task_id, channel, value)]
+
+
+def _read_sqlite_saver(path: str, serde: SerializerProtocol) -> Iterator[Tuple[str, List[CheckpointTuple], ThreadWrites]]:
+    # Reads SQLiteSaver's tables directly, so migrating needs no particular langgraph saver class
+    conn = sqlite3.connect(path)
+    try:
+        has_writes = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'writes'").fetchone() is not None
+        thread_ids = [row[0] for row in conn.execute("SELECT DISTINCT thread_id FROM checkpoints ORDER BY thread_id")]
+        for thread_id in thread_ids:
+            writes: ThreadWrites = {}
+            if has_writes: # langgraph versions with put_writes keep them in a "writes" table
+                for thread_ts, task_id, channel, value in conn.execute(
+                    "SELECT thread_ts, task_id, channel, value FROM writes WHERE thread_id = ? ORDER BY thread_ts, task_id, idx",
+                    (thread_id,),
+                ):
+                    writes.setdefault(thread_ts, []).append((task_id, channel, serde.loads(value)))
+            rows = conn.execute(
+                "SELECT thread_ts, parent_ts, checkpoint, metadata FROM checkpoints WHERE thread_id = ? ORDER BY thread_ts DESC",
+                (thread_id,),
+            ).fetchall()
+            yield thread_id, [
+                CheckpointTuple(
+                    {"configurable": {"thread_id": thread_id, "thread_ts": thread_ts}},
+                    serde.loads(checkpoint),
+                    serde.loads(metadata) if metadata is not None else {},
+                    {"configurable": {"thread_id": thread_id, "thread_ts": parent_ts}} if parent_ts else None,
+                )
+                for thread_ts, parent_ts, checkpoint, metadata in rows
+            ], writes
+    finally:
+        conn.close()
+
+
+def _read_append_only(path: str, serde: SerializerProtocol) -> Iterator[Tuple[str, List[CheckpointTuple], ThreadWrites]]:
+    source = AppendOnlySaver.from_conn_string(path, serde=serde, keep_last=None)
+    try:
+        with source.lock, source.cursor(transaction=False) as cur:
+            thread_ids = [row[0] for row in cur.execute("SELECT DISTINCT thread_id FROM log_checkpoints ORDER BY thread_id")]
+        for thread_id in thread_ids:
+            yield thread_id, list(source.list({"configurable": {"thread_id": thread_id}})), source.thread_writes(thread_id)
+    finally:
+        source.conn.close()
+
+
+def read_threads(path: str, serde: SerializerProtocol) -> Iterator[Tuple[str, List[CheckpointTuple], ThreadWrites]]:
+    """(thread_id, checkpoints newest first, pending writes by thread_ts) for every thread in a single-file checkpoint DB."""
+    kind = _source_kind(path)
+    if kind == "append_only":
+        return _read_append_only(path, serde)
+    if kind == "sqlite":
+        return _read_sqlite_saver(path, serde)
+    raise ValueError(f"{path}: no checkpoint tables found")
+
+
+def copy_thread(target: BaseCheckpointSaver, checkpoints: List[CheckpointTuple], writes: Optional[ThreadWrites] = None) -> int:
+    """
+    Writes a thread's checkpoints oldest first, each with its original parent, so history and ids are kept,
+    followed by each checkpoint's pending writes (grouped per task, in their original order).
+    """
+    for checkpoint_tuple in reversed(checkpoints):
+        thread_id = checkpoint_tuple.config["configurable"]["thread_id"]
+        thread_ts = checkpoint_tuple.config["configurable"]["thread_ts"]
+        parent_ts = checkpoint_tuple.parent_config["configurable"]["thread_ts"] if checkpoint_tuple.parent_config else None
+        checkpoint = {**checkpoint_tuple.checkpoint, "id": thread_ts}
+        config = target.put({"configurable": {"thread_id": thread_id, "thread_ts": parent_ts}}, checkpoint, checkpoint_tuple.metadata)
+        by_task: Dict[str, List[Tuple[str, Any]]] = {}
+        for task_id, channel, value in (writes or {}).get(thread_ts, []):
+            by_task.setdefault(task_id, []).append((channel, value))
+        for task_id, task_writes in by_task.items():
+            target.put_writes(config, task_writes, task_id)
+    return len(checkpoints)
+
+
+def migrate(source_paths: List[str], target: ShardedSaver) -> Dict[str, int]:
+    """Copies every thread in `source_paths` into `target`; threads already up to date there are skipped."""
+    counts = {"threads": 0, "checkpoints": 0, "skipped": 0}
+    for path in source_paths:
+        if not os.path.exists(path):
+            continue
+        for thread_id, checkpoints, writes in read_threads(path, target.serde):
+            if not checkpoints:
+                continue
+            newest = target.get_tuple({"configurable": {"thread_id": thread_id}})
+            if newest is not None and newest.config["configurable"]["thread_ts"] == checkpoints[0].config["configurable"]["thread_ts"]:
+                counts["skipped"] += 1
+                continue
+            counts["checkpoints"] += copy_thread(target, checkpoints, writes)
+            counts["threads"] += 1
+    return counts
+
+
+def _remove_db(path: str) -> None:
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Move checkpoint threads into a sharded layout")
+    parser.add_argument("db_path", help="Single-file checkpoint DB, or the base path of the shard files")
+    parser.add_argument("--shards", type=int, required=True, help="Shard count of the target layout")
+    parser.add_argument("--from-shards", type=int, help="Rebalance from this shard count instead of a single file")
+    parser.add_argument("--keep-last", type=int, default=None, help="Checkpoints kept per thread in the target (default: all)")
+    parser.add_argument("--remove-source", action="store_true", help="Delete the source files once every thread is copied")
+    args = parser.parse_args()
+
+    if args.from_shards == args.shards:
+        parser.error("--from-shards and --shards are the same layout")
+    source_paths = shard_paths(args.db_path, args.from_shards) if args.from_shards else [args.db_path]
+    missing = [path for path in source_paths if not os.path.exists(path)]
+    if len(missing) == len(source_paths):
+        parser.error(f"no source files found: {', '.join(source_paths)}")
+
+    target = ShardedSaver(args.db_path, args.shards, keep_last=args.keep_last)
+    counts = migrate(source_paths, target)
+    print(f"Copied {counts['threads']} threads ({counts['checkpoints']} checkpoints), {counts['skipped']} already up to date, "
+          f"into {args.shards} shards: {', '.join(target.paths)}", file=sys.stderr)
+    if args.remove_source:
+        for path in source_paths:
+            _remove_db(path)
+        print(f"Removed {', '.join(source_paths)}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
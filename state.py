@@ -1,8 +1,9 @@
 # agent/state.py
 
-from typing import List, Optional
+from typing import Annotated, Any, Dict, List, Optional
 from pydantic import BaseModel, Field
 from langchain_core.messages import BaseMessage # Crucial for messages list
+from langgraph.graph.message import add_messages # Appends node outputs instead of overwriting
 
 
 class AgentState(BaseModel):
@@ -10,7 +11,7 @@ class AgentState(BaseModel):
     Represents the state of the conversational agent at any point in the graph.
     This state is passed between nodes and updated by them.
     """
-    messages: List[BaseMessage] = Field(
+    messages: Annotated[List[BaseMessage], add_messages] = Field(
         default_factory=list,
         description="List of all messages in the conversation history. "
                     "This includes HumanMessages (user input), AIMessages (AI responses "
@@ -21,8 +22,14 @@ class AgentState(BaseModel):
     current_member_id: Optional[str] = Field(
         None,
         description="The confirmed member ID being discussed in the current conversation thread. "
-                    "This can be populated by the agent node if a member ID is clearly identified "
-                    "and needs to be persistent across multiple tool calls without re-parsing messages."
+                    "Populated by the member_context node once a member ID is clearly identified, "
+                    "so it persists across tool calls and turns without re-parsing messages."
+    )
+    member_profile: Optional[Dict[str, Any]] = Field(
+        None,
+        description="Compact facts about the pinned member from earlier tool results in this thread "
+                    "(card IDs, primary ID, enrollment status, card statuses), each with the time it was "
+                    "fetched. Maintained by the member_context node; stale entries are dropped so they are refetched."
     )
     # Example of another optional field if you later need to track a specific claim
     # current_claim_id: Optional[str] = Field(
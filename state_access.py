@@ -0,0 +1,19 @@
+# state_access.py (Reads graph state whether it is an AgentState, a plain dict or a bare message list)
+
+from typing import Any, List
+
+from langchain_core.messages import BaseMessage
+
+
+def state_field(state: Any, key: str) -> Any:
+    """A state key, or None if it is missing (nodes also run on dict states, e.g. in tests and replays)."""
+    if isinstance(state, dict):
+        return state.get(key)
+    return getattr(state, key, None)
+
+
+def state_messages(state: Any) -> List[BaseMessage]:
+    """A copy of the state's message list; a bare list of messages is accepted as the state itself."""
+    if isinstance(state, list):
+        return list(state)
+    return list(state_field(state, "messages") or [])
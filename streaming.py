@@ -0,0 +1,32 @@
+# streaming.py (Progress events from graph nodes to a live consumer, e.g. the /chat SSE endpoint)
+#
+# A consumer that wants incremental output puts a callable under config["configurable"]["stream_handler"].
+# Nodes call emit(config, ...) and it receives plain dict events:
+#   {"type": "token", "content": "..."}                                  model text as it is generated
+#   {"type": "tool_start", "name": "...", "id": "..."}                   tool_executor starts a tool call
+#   {"type": "tool_end", "name": "...", "id": "...", "ok": bool, "ms": float}
+# Without a handler nothing is emitted and the nodes behave exactly as before.
+
+import json
+from typing import Any, Callable, Dict, Optional
+
+from langchain_core.runnables import RunnableConfig
+
+STREAM_HANDLER_KEY = "stream_handler"
+
+StreamHandler = Callable[[Dict[str, Any]], None]
+
+
+def get_stream_handler(config: Optional[RunnableConfig]) -> Optional[StreamHandler]:
+    return (config or {}).get("configurable", {}).get(STREAM_HANDLER_KEY)
+
+
+def emit(config: Optional[RunnableConfig], event_type: str, **fields: Any) -> None:
+    handler = get_stream_handler(config)
+    if handler is not None:
+        handler({"type": event_type, **fields})
+
+
+def format_sse(event: Dict[str, Any]) -> str:
+    """One Server-Sent Events frame: the event type as `event:` and the whole event as JSON `data:`."""
+    return f"event: {event['type']}\ndata: {json.dumps(event, separators=(',', ':'))}\n\n"
@@ -0,0 +1,168 @@
+# stub_server.py (Local HTTP stand-in for the Medicare backend)
+#
+# Serves the canned responses from mock_data.py over real HTTP/1.1 keep-alive connections, with
+# injectable latency and error rates, so ApiClient's pooling, timeouts, retries and circuit breakers
+# can be exercised without outside services.
+#
+# In-process:
+#     with StubBackend(latency=0.05, error_rate=0.2) as backend:
+#         client = ApiClient(backend.base_url)
+#         client.get("/id-list", {"member_id": "12345"})
+#         backend.stats()
+#
+# Standalone (then run app.py with API_BASE_URL=http://127.0.0.1:8081):
+#     python stub_server.py --port 8081 --latency 0.05 --error-rate 0.1
+
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional
+from urllib.parse import parse_qsl, urlsplit
+
+from mock_data import mock_get_response, mock_post_response
+
+
+class _StubHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request: Any, client_address: Any) -> None:
+        pass # clients hanging up mid-response (read timeouts, shutdown) are expected here
+
+
+class StubBackend:
+    """
+    Runs the stub server on a background thread. All knobs can be changed while it is running:
+    - latency / latency_jitter: seconds added before every response (uniform jitter on top of latency)
+    - error_rate: probability of answering 503 instead of the canned response
+    - endpoint_overrides: {"/id-status": {"latency": 2.0, "error_rate": 1.0}} per-endpoint settings
+    - idle_close_after: a request arriving on a connection idle for at least this many seconds is read and
+      then dropped without an answer, like a server whose keep-alive timer fires as the request comes in
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0, latency_jitter: float = 0.0,
+                 error_rate: float = 0.0, endpoint_overrides: Optional[Dict[str, Dict[str, float]]] = None,
+                 seed: Optional[int] = None, idle_close_after: Optional[float] = None):
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self.endpoint_overrides = dict(endpoint_overrides or {})
+        self.idle_close_after = idle_close_after
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._counts = {"requests": 0, "posts": 0, "errors": 0, "dropped": 0, "connections": 0}
+        self.server = _StubHTTPServer((host, port), _make_handler(self))
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "StubBackend":
+        self._thread = threading.Thread(target=self.server.serve_forever, name="stub-backend", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self) -> "StubBackend":
+        return self.start()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.stop()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._counts)
+
+    # --- Called from handler threads ---
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self._counts[key] += 1
+
+    def _setting(self, endpoint: str, name: str) -> float:
+        return self.endpoint_overrides.get(endpoint, {}).get(name, getattr(self, name))
+
+    def _should_fail(self, endpoint: str) -> bool:
+        with self._lock:
+            return self._random.random() < self._setting(endpoint, "error_rate")
+
+    def _delay(self, endpoint: str) -> float:
+        with self._lock:
+            jitter = self._random.uniform(0, self._setting(endpoint, "latency_jitter"))
+        return self._setting(endpoint, "latency") + jitter
+
+
+def _make_handler(backend: StubBackend):
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1" # keep-alive, so client connection reuse is observable
+
+        def setup(self) -> None:
+            super().setup()
+            self.idle_since: Optional[float] = None # set once the connection has answered a request
+            backend._count("connections")
+
+        def do_GET(self) -> None:
+            parts = urlsplit(self.path)
+            self._respond(parts.path, lambda: mock_get_response(parts.path, dict(parse_qsl(parts.query))))
+
+        def do_POST(self) -> None:
+            parts = urlsplit(self.path)
+            length = int(self.headers.get("Content-Length") or 0)
+            body = json.loads(self.rfile.read(length) or b"{}")
+            backend._count("posts")
+            self._respond(parts.path, lambda: mock_post_response(parts.path, body))
+
+        def _respond(self, endpoint: str, build_response) -> None:
+            backend._count("requests")
+            idle_close_after = backend.idle_close_after
+            if idle_close_after is not None and self.idle_since is not None and time.monotonic() - self.idle_since >= idle_close_after:
+                backend._count("dropped")
+                self.close_connection = True
+                return
+            delay = backend._delay(endpoint)
+            if delay:
+                time.sleep(delay)
+            if backend._should_fail(endpoint):
+                backend._count("errors")
+                self._send_json(503, {"error": "Service Unavailable", "message": "Injected failure"})
+                return
+            response = build_response()
+            status = 404 if response.get("error") == "Not Found" else 501 if response.get("error") == "Not Implemented" else 200
+            self._send_json(status, response)
+
+        def _send_json(self, status: int, payload: Dict[str, Any]) -> None:
+            data = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+            self.idle_since = time.monotonic()
+
+        def log_message(self, format: str, *args: Any) -> None:
+            pass # keep load tests quiet
+
+    return StubHandler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stub of the Medicare backend APIs")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every response")
+    parser.add_argument("--latency-jitter", type=float, default=0.0, help="Extra uniform random delay, in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 503")
+    args = parser.parse_args()
+
+    backend = StubBackend(args.host, args.port, latency=args.latency, latency_jitter=args.latency_jitter, error_rate=args.error_rate)
+    print(f"Stub backend listening on {backend.base_url} (Ctrl+C to stop)")
+    try:
+        backend.server.serve_forever()
+    except KeyboardInterrupt:
+        backend.stop()
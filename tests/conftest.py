@@ -0,0 +1,12 @@
+# tests/conftest.py (Lets the tests import the top-level modules when run from the repository root)
+
+import importlib.util
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Only the API client tests run without the langchain/langgraph stack installed
+if importlib.util.find_spec("langchain_core") is None:
+    collect_ignore_glob = [name for name in os.listdir(os.path.dirname(os.path.abspath(__file__)))
+                           if name.startswith("test_") and name != "test_api_client.py"]
@@ -0,0 +1,99 @@
+# tests/test_answer_cache.py (AnswerCache: normalisation, required terms, rephrasings, routing)
+
+import unittest
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from answer_cache import AnswerCache, normalize, required_terms
+
+
+def question(text, **fields):
+    return {"messages": [HumanMessage(content=text)], **fields}
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class NormalizeTest(unittest.TestCase):
+    def test_negated_contractions_keep_their_not(self):
+        self.assertEqual(normalize("Why isn't my MRI covered?"), "why is not my mri covered")
+        self.assertEqual(normalize("Why isn’t my MRI covered?"), "why is not my mri covered") # curly apostrophe
+        self.assertEqual(normalize("I can't log in"), "i can not log in")
+        self.assertEqual(normalize("It won't print"), "it will not print")
+        self.assertEqual(normalize("Doesn't, don't, aren't"), "does not do not are not")
+
+    def test_other_apostrophes_are_dropped(self):
+        self.assertEqual(normalize("What's on the member's card?"), "whats on the members card")
+
+    def test_required_terms(self):
+        self.assertEqual(required_terms(normalize("Does Medicare Part B cover an HMO?")), {"medicare", "part b", "hmo"})
+        self.assertEqual(required_terms(normalize("Why isn't my MRI covered?")), {"not"})
+
+
+class AnswerCacheTest(unittest.TestCase):
+    STORED = ["Why is my MRI covered?", "What does Medicare Part A cover?",
+              "Is physical therapy covered by an HMO plan?", "How do I find an in-network doctor?"]
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = AnswerCache(ttl=60.0, clock=self.clock)
+        for text in self.STORED:
+            self.assertTrue(self.cache.remember(question(text), None, AIMessage(content=f"answer: {text}"), 0.5))
+
+    def answer(self, text, **fields):
+        messages = self.cache.lookup(question(text, **fields))["messages"]
+        return messages[0].content if messages else None
+
+    def test_rephrasings_hit(self):
+        for text, stored in [
+            ("why is my mri covered", "Why is my MRI covered?"),
+            ("What is covered by Medicare Part A?", "What does Medicare Part A cover?"),
+            ("Is physical therapy covered under an HMO plan?", "Is physical therapy covered by an HMO plan?"),
+            ("How can I find an in-network doctor?", "How do I find an in-network doctor?"),
+        ]:
+            with self.subTest(text=text):
+                self.assertEqual(self.answer(text), f"answer: {stored}")
+        self.assertEqual(self.cache.stats()["exact_hits"], 1)
+        self.assertEqual(self.cache.stats()["similar_hits"], 3)
+
+    def test_near_misses_that_change_the_answer_do_not_hit(self):
+        for text in [
+            "Why isn't my MRI covered?",
+            "Why isn’t my MRI covered?",
+            "Why doesn't Medicare Part A cover MRI?",
+            "What does Medicare Part B cover?",
+            "Is physical therapy covered by a PPO plan?",
+            "How do I find an out-of-network doctor?",
+        ]:
+            with self.subTest(text=text):
+                self.assertIsNone(self.answer(text))
+
+    def test_member_specific_questions_bypass_the_cache(self):
+        self.assertIsNone(self.answer("Why is my MRI covered?", current_member_id="12345"))
+        self.assertIsNone(self.answer("Is member 12345 covered for an MRI?"))
+        self.assertEqual(self.cache.stats()["bypassed"], {"member_specific": 2})
+
+    def test_entries_expire_after_the_ttl(self):
+        self.clock.now = 61.0
+        self.assertIsNone(self.answer("Why is my MRI covered?"))
+        self.assertEqual(self.cache.stats()["expirations"], 4)
+
+    def test_per_call_opt_out(self):
+        config = {"configurable": {"answer_cache": False}}
+        self.assertEqual(self.cache.lookup(question("Why is my MRI covered?"), config), {"messages": []})
+
+    def test_route_reads_dict_and_list_states(self):
+        self.assertEqual(self.cache.route(question("Why is my MRI covered?")), "lookup")
+        self.assertEqual(self.cache.route({"messages": [AIMessage(content="done")]}), "respond")
+        self.assertEqual(self.cache.route([HumanMessage(content="hi"), ToolMessage(content="{}", tool_call_id="1")]), "call_agent")
+        self.cache.enabled = False
+        self.assertEqual(self.cache.route(question("Why is my MRI covered?")), "call_agent")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,219 @@
+# tests/test_api_client.py (ApiClient against the StubBackend: breakers, retries, timeouts, pooling)
+
+import asyncio
+import threading
+import time
+import unittest
+from unittest import mock
+
+from api_client import ApiClient, CircuitBreaker, PoolTimeoutError
+from stub_server import StubBackend
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class CircuitBreakerTest(unittest.TestCase):
+    def test_closed_open_half_open_transitions(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10.0, clock=clock)
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(breaker.allow_request())
+
+        clock.now = 10.0
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertTrue(breaker.allow_request())
+        self.assertFalse(breaker.allow_request()) # one trial call at a time
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN) # a failed trial opens it again
+
+        clock.now = 20.0
+        self.assertTrue(breaker.allow_request())
+        breaker.record_success()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+
+class ApiClientStubTest(unittest.TestCase):
+    def setUp(self):
+        self.backend = StubBackend(seed=1).start()
+        self.clients = []
+
+    def tearDown(self):
+        for client in self.clients:
+            client.close()
+        self.backend.stop()
+
+    def client(self, **kwargs) -> ApiClient:
+        kwargs.setdefault("backoff_base", 0.001)
+        client = ApiClient(self.backend.base_url, **kwargs)
+        self.clients.append(client)
+        return client
+
+    def test_get_returns_canned_response(self):
+        response = self.client().get("/id-list", {"member_id": "12345"})
+        self.assertEqual(response["primary_id"], "MED-ID-12345-A")
+
+    def test_breaker_opens_on_backend_failures_and_recovers(self):
+        client = self.client(max_retries=0, failure_threshold=2, reset_timeout=0.2)
+        self.backend.error_rate = 1.0
+        for _ in range(2):
+            self.assertEqual(client.get("/id-list", {"member_id": "12345"})["status"], 503)
+        self.assertEqual(client.breaker_for("/id-list").state, CircuitBreaker.OPEN)
+
+        response = client.get("/id-list", {"member_id": "12345"})
+        self.assertEqual(response["error"], "Circuit Open")
+        self.assertEqual(self.backend.stats()["requests"], 2) # rejected without calling the backend
+
+        time.sleep(0.25)
+        self.assertEqual(client.breaker_for("/id-list").state, CircuitBreaker.HALF_OPEN)
+        self.backend.error_rate = 0.0
+        self.assertEqual(client.get("/id-list", {"member_id": "12345"})["primary_id"], "MED-ID-12345-A")
+        self.assertEqual(client.breaker_for("/id-list").state, CircuitBreaker.CLOSED)
+
+    def test_breakers_are_per_endpoint(self):
+        client = self.client(max_retries=0, failure_threshold=1)
+        self.backend.endpoint_overrides = {"/id-status": {"error_rate": 1.0}}
+        client.get("/id-status", {"id": "MED-ID-12345-A"})
+        self.assertEqual(client.breaker_for("/id-status").state, CircuitBreaker.OPEN)
+        self.assertEqual(client.get("/member-status", {"member_id": "12345"})["enrollment_status"], "Active")
+
+    def test_get_retries_503_with_backoff(self):
+        client = self.client(max_retries=3, backoff_base=0.01, backoff_max=0.03, failure_threshold=10)
+        self.backend.endpoint_overrides = {"/id-list": {"error_rate": 1.0}}
+        delays = []
+        backoff = client._backoff
+
+        def record(attempt: int) -> float:
+            delays.append(backoff(attempt))
+            return delays[-1]
+
+        with mock.patch.object(client, "_backoff", side_effect=record):
+            response = client.get("/id-list", {"member_id": "12345"})
+        self.assertEqual(response["status"], 503)
+        self.assertEqual(self.backend.stats()["requests"], 4) # first try + 3 retries
+        self.assertEqual(len(delays), 3)
+        for attempt, delay in enumerate(delays):
+            self.assertGreaterEqual(delay, 0.0)
+            self.assertLessEqual(delay, min(0.03, 0.01 * 2 ** attempt))
+
+    def test_get_retry_succeeds_once_backend_recovers(self):
+        client = self.client(max_retries=3, failure_threshold=10)
+        self.backend.error_rate = 1.0
+
+        def recover(attempt: int) -> float:
+            self.backend.error_rate = 0.0
+            return 0.0
+
+        with mock.patch.object(client, "_backoff", side_effect=recover):
+            response = client.get("/id-list", {"member_id": "12345"})
+        self.assertEqual(response["primary_id"], "MED-ID-12345-A")
+        self.assertEqual(self.backend.stats()["requests"], 2)
+
+    def test_post_is_never_retried(self):
+        client = self.client(max_retries=3, failure_threshold=10)
+        self.backend.error_rate = 1.0
+        response = client.post("/new-id-card-request", {"member_id": "12345", "reason": "lost"})
+        self.assertEqual(response["status"], 503)
+        self.assertEqual(self.backend.stats()["requests"], 1)
+
+    def test_non_retryable_status_is_not_retried(self):
+        client = self.client(max_retries=3)
+        response = client.get("/id-list", {"member_id": "00000"})
+        self.assertEqual(response["status"], 404)
+        self.assertEqual(self.backend.stats()["requests"], 1)
+        self.assertEqual(client.breaker_for("/id-list").state, CircuitBreaker.CLOSED) # 4xx: the backend is healthy
+
+    def test_read_timeout(self):
+        client = self.client(read_timeout=0.1, max_retries=0)
+        self.backend.latency = 0.5
+        started_at = time.perf_counter()
+        response = client.get("/id-list", {"member_id": "12345"})
+        self.assertLess(time.perf_counter() - started_at, 0.4)
+        self.assertEqual(response["error"], "Connection Error")
+        self.assertIn("timed out", response["message"])
+
+    def test_read_timeout_is_retried_for_gets(self):
+        client = self.client(read_timeout=0.1, max_retries=1, failure_threshold=10)
+        self.backend.latency = 0.3
+        with mock.patch.object(client, "_backoff", return_value=0.0):
+            client.get("/id-list", {"member_id": "12345"})
+        time.sleep(0.4) # let the stub finish the abandoned requests before counting
+        self.assertEqual(self.backend.stats()["requests"], 2)
+
+    def test_keep_alive_connections_are_reused(self):
+        client = self.client()
+        for _ in range(5):
+            client.get("/member-status", {"member_id": "12345"})
+        self.assertEqual(self.backend.stats()["connections"], 1)
+        self.assertEqual(client.pool.connections_opened, 1)
+
+    def test_get_is_resent_once_when_a_keep_alive_connection_was_closed(self):
+        client = self.client(max_retries=0)
+        client.get("/member-status", {"member_id": "12345"})
+        self.backend.idle_close_after = 0.05
+        time.sleep(0.1)
+        response = client.get("/member-status", {"member_id": "12345"})
+        self.assertNotIn("error", response)
+        self.assertEqual(self.backend.stats()["dropped"], 1)
+        self.assertEqual(self.backend.stats()["connections"], 2)
+
+    def test_post_is_not_resent_when_a_keep_alive_connection_was_closed(self):
+        client = self.client(max_retries=3)
+        client.get("/member-status", {"member_id": "12345"})
+        self.backend.idle_close_after = 0.05
+        time.sleep(0.1)
+        response = client.post("/new-id-card-request", {"member_id": "12345", "reason": "lost"})
+        self.assertEqual(response["error"], "Connection Error")
+        self.assertEqual(self.backend.stats()["posts"], 1) # the backend may have acted on it; never send it twice
+        self.assertEqual(self.backend.stats()["dropped"], 1)
+
+    def test_pool_caps_open_connections(self):
+        client = self.client(pool_size=2)
+        self.backend.latency = 0.1
+        threads = [threading.Thread(target=client.get, args=("/member-status", {"member_id": "12345"})) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.backend.stats()["requests"], 6)
+        self.assertLessEqual(self.backend.stats()["connections"], 2)
+        self.assertLessEqual(client.pool.connections_opened, 2)
+
+    def test_pool_timeout_when_every_connection_is_busy(self):
+        client = self.client(pool_size=1)
+        client.pool.pool_timeout = 0.05
+        connection, _ = client.pool.acquire()
+        try:
+            with self.assertRaises(PoolTimeoutError):
+                client.pool.acquire()
+            response = client.get("/member-status", {"member_id": "12345"})
+            self.assertEqual(response["error"], "Connection Error")
+        finally:
+            client.pool.release(connection, reusable=False)
+        self.assertEqual(client.get("/member-status", {"member_id": "12345"})["enrollment_status"], "Active")
+
+    def test_async_calls_use_the_client_executor(self):
+        client = self.client(pool_size=3)
+
+        async def run():
+            return await asyncio.gather(*(client.aget("/member-status", {"member_id": "12345"}) for _ in range(6)))
+
+        with mock.patch.object(client, "get", wraps=client.get) as get:
+            results = asyncio.run(run())
+        self.assertTrue(all(result["enrollment_status"] == "Active" for result in results))
+        self.assertEqual(get.call_count, 6)
+        self.assertEqual(client._executor._max_workers, 3)
+        self.assertTrue(all(thread.name.startswith("api-client") for thread in client._executor._threads))
+
+
+if __name__ == "__main__":
+    unittest.main()
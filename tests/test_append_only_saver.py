@@ -0,0 +1,146 @@
+# tests/test_append_only_saver.py (AppendOnlySaver: prefix reuse, rebases, retention, older files)
+
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from append_only_saver import SCHEMA, AppendOnlySaver
+
+
+def make_checkpoint(checkpoint_id, messages):
+    return {
+        "v": 1,
+        "id": checkpoint_id,
+        "ts": checkpoint_id,
+        "channel_values": {"messages": list(messages)},
+        "channel_versions": {},
+        "versions_seen": {},
+    }
+
+
+def thread_config(thread_id="t1", thread_ts=None):
+    return {"configurable": {"thread_id": thread_id, "thread_ts": thread_ts}}
+
+
+def turn(n):
+    return [HumanMessage(content=f"question {n}", id=f"h{n}"), AIMessage(content=f"answer {n}", id=f"a{n}")]
+
+
+class AppendOnlySaverTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "conversations.db")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def saver(self, **kwargs):
+        kwargs.setdefault("keep_last", None)
+        saver = AppendOnlySaver.from_conn_string(self.path, **kwargs)
+        self.addCleanup(saver.conn.close)
+        return saver
+
+    def log_length(self, saver, thread_id="t1"):
+        return saver.conn.execute("SELECT COUNT(*) FROM log_messages WHERE thread_id = ?", (thread_id,)).fetchone()[0]
+
+    def write_turns(self, saver, turns, thread_id="t1"):
+        config, messages = thread_config(thread_id), []
+        for n in range(turns):
+            messages += turn(n)
+            config = saver.put(config, make_checkpoint(f"ts-{n:03d}", messages), {"step": n})
+        return config, messages
+
+    def test_each_step_appends_only_the_new_messages(self):
+        saver = self.saver()
+        config, messages = self.write_turns(saver, 5)
+        self.assertEqual(saver.stats()["messages_appended"], 10)
+        self.assertEqual(saver.stats()["rebases"], 0)
+        self.assertEqual(self.log_length(saver), 10)
+
+        loaded = saver.get_tuple(config)
+        self.assertEqual(loaded.checkpoint["channel_values"]["messages"], messages)
+        self.assertEqual(loaded.parent_config["configurable"]["thread_ts"], "ts-003")
+        older = saver.get_tuple(thread_config("t1", "ts-001"))
+        self.assertEqual([m.id for m in older.checkpoint["channel_values"]["messages"]], ["h0", "a0", "h1", "a1"])
+
+    def test_replaced_message_starts_a_new_slice(self):
+        saver = self.saver()
+        config, messages = self.write_turns(saver, 2)
+        edited = messages[:-1] + [AIMessage(content="a better answer", id="a1-edited")] + turn(2)
+        config = saver.put(config, make_checkpoint("ts-002", edited), {"step": 2})
+        self.assertEqual(saver.stats()["rebases"], 1)
+        self.assertEqual(self.log_length(saver), 4 + len(edited))
+        self.assertEqual(saver.get_tuple(config).checkpoint["channel_values"]["messages"], edited)
+
+    def test_resuming_from_an_older_checkpoint_rebases(self):
+        saver = self.saver()
+        self.write_turns(saver, 3)
+        forked = turn(0) + turn(1)[:1] + [AIMessage(content="another answer", id="a1-fork")]
+        config = saver.put(thread_config("t1", "ts-000"), make_checkpoint("ts-010", forked), {"step": 1})
+        self.assertEqual(saver.stats()["rebases"], 1)
+        self.assertEqual(saver.get_tuple(config).checkpoint["channel_values"]["messages"], forked)
+        self.assertEqual(len(saver.get_tuple(thread_config("t1", "ts-002")).checkpoint["channel_values"]["messages"]), 6)
+
+    def test_keep_last_trims_checkpoints_writes_and_the_log(self):
+        saver = self.saver(keep_last=2)
+        config, messages = thread_config(), []
+        for n in range(4):
+            messages += turn(n)
+            config = saver.put(config, make_checkpoint(f"ts-{n:03d}", messages), {"step": n})
+            saver.put_writes(config, [("messages", f"pending {n}")], "task")
+        self.assertEqual([t.config["configurable"]["thread_ts"] for t in saver.list(thread_config())], ["ts-003", "ts-002"])
+        self.assertEqual(sorted(saver.thread_writes("t1")), ["ts-002", "ts-003"])
+        self.assertEqual(saver.thread_writes("t1")["ts-003"], [("task", "messages", "pending 3")])
+        self.assertEqual(saver.get_tuple(config).checkpoint["channel_values"]["messages"], messages)
+
+        # A rebase leaves the old slice unreferenced once its checkpoints are trimmed
+        edited = [HumanMessage(content="start over", id="fresh")]
+        for n in range(4, 6):
+            config = saver.put(config, make_checkpoint(f"ts-{n:03d}", edited), {"step": n})
+        self.assertEqual(self.log_length(saver), 1)
+
+    def test_prune_drops_idle_threads_with_their_writes(self):
+        saver = self.saver()
+        config, _ = self.write_turns(saver, 2, thread_id="old")
+        saver.put_writes(config, [("messages", "pending")], "task")
+        saver.conn.execute("UPDATE log_threads SET updated_at = 0 WHERE thread_id = 'old'")
+        saver.conn.commit()
+        self.write_turns(saver, 1, thread_id="new")
+        self.assertEqual(saver.prune(max_idle_seconds=3600), {"threads": 1, "checkpoints": 2, "messages": 4})
+        self.assertEqual(saver.thread_writes("old"), {})
+        self.assertIsNotNone(saver.get_tuple(thread_config("new")))
+
+    def test_files_written_before_last_key_still_reuse_the_prefix(self):
+        # Build a file with the first released schema (no last_key / metadata_encoding columns)
+        current = self.saver()
+        self.write_turns(current, 2)
+        old_path = os.path.join(self.tmp.name, "old.db")
+        old = sqlite3.connect(old_path)
+        old.executescript(SCHEMA.replace("    last_key TEXT,\n", "").replace("    metadata_encoding INTEGER NOT NULL DEFAULT 0,\n", ""))
+        old.execute("ATTACH DATABASE ? AS current", (self.path,))
+        old.execute("INSERT INTO log_threads SELECT * FROM current.log_threads")
+        old.execute("INSERT INTO log_messages SELECT * FROM current.log_messages")
+        old.execute("INSERT INTO log_checkpoints SELECT thread_id, thread_ts, parent_ts, msg_start, msg_count, encoding, "
+                    "checkpoint, metadata FROM current.log_checkpoints")
+        old.commit()
+        old.execute("DETACH DATABASE current")
+        old.close()
+
+        saver = AppendOnlySaver.from_conn_string(old_path, keep_last=None)
+        self.addCleanup(saver.conn.close)
+        newest = saver.get_tuple(thread_config())
+        self.assertEqual([m.id for m in newest.checkpoint["channel_values"]["messages"]], ["h0", "a0", "h1", "a1"])
+        self.assertEqual(newest.metadata, {"step": 1})
+
+        messages = newest.checkpoint["channel_values"]["messages"] + turn(2)
+        saver.put(newest.config, make_checkpoint("ts-002", messages), {"step": 2})
+        self.assertEqual(saver.stats()["messages_appended"], 2) # the whole-slice comparison found the prefix
+        self.assertEqual(saver.stats()["rebases"], 0)
+        self.assertEqual(saver.get_tuple(thread_config()).checkpoint["channel_values"]["messages"], messages)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,195 @@
+# tests/test_coalescing.py (CoalescingApiClient: singleflight, micro-batching and forget(), sync and async)
+
+import asyncio
+import threading
+import time
+import unittest
+
+from coalescing import CoalescingApiClient, _split
+from tool_cache import make_cache_key
+
+
+class CountingBackend:
+    """Counts every call; the calls whose number is in `hold` wait until `release` is set."""
+
+    def __init__(self, hold=()):
+        self.calls = []
+        self.lock = threading.Lock()
+        self.hold = set(hold)
+        self.release = threading.Event()
+        self.batch_response = None # overrides get_batch's answer when set
+
+    def _record(self, call):
+        with self.lock:
+            self.calls.append(call)
+            return len(self.calls)
+
+    def get(self, endpoint, params):
+        number = self._record(("get", endpoint, params.get("id")))
+        if number in self.hold:
+            self.release.wait(5)
+        return {"id": params.get("id"), "call": number}
+
+    def get_batch(self, endpoint, ids):
+        number = self._record(("get_batch", endpoint, tuple(ids)))
+        if self.batch_response is not None:
+            return self.batch_response
+        return {"results": {card_id: {"id": card_id, "call": number} for card_id in ids}}
+
+    async def aget(self, endpoint, params):
+        number = self._record(("get", endpoint, params.get("id")))
+        while number in self.hold and not self.release.is_set():
+            await asyncio.sleep(0.005)
+        return {"id": params.get("id"), "call": number}
+
+    async def aget_batch(self, endpoint, ids):
+        return self.get_batch(endpoint, ids)
+
+    def post(self, endpoint, json_data):
+        self._record(("post", endpoint, None))
+        return {"status": "submitted"}
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not reached")
+        time.sleep(0.005)
+
+
+def run_threads(target, args_list):
+    results = [None] * len(args_list)
+
+    def run(index, args):
+        results[index] = target(*args)
+
+    threads = [threading.Thread(target=run, args=(index, args)) for index, args in enumerate(args_list)]
+    for thread in threads:
+        thread.start()
+    return threads, results
+
+
+class SyncCoalescingTest(unittest.TestCase):
+    def test_identical_gets_share_one_backend_call(self):
+        backend = CountingBackend(hold={1})
+        client = CoalescingApiClient(backend)
+        threads, results = run_threads(client.get, [("/member-status", {"member_id": "12345"})] * 5)
+        wait_for(lambda: client.stats()["requests"] == 5)
+        backend.release.set()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(len(backend.calls), 1)
+        self.assertEqual(results, [{"id": None, "call": 1}] * 5)
+        self.assertEqual(client.stats()["coalesced"], 4)
+
+    def test_lookups_within_the_window_are_sent_as_one_batch(self):
+        backend = CountingBackend()
+        client = CoalescingApiClient(backend, batch_window=0.3)
+        threads, results = run_threads(client.get, [("/id-status", {"id": card_id}) for card_id in ("A", "B", "C")])
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual([call[0] for call in backend.calls], ["get_batch"])
+        self.assertEqual(sorted(backend.calls[0][2]), ["A", "B", "C"])
+        self.assertEqual([result["id"] for result in results], ["A", "B", "C"])
+        self.assertEqual(client.stats()["batches"], 1)
+        self.assertEqual(client.stats()["avg_batch_size"], 3)
+
+    def test_a_full_batch_is_sent_without_waiting_out_the_window(self):
+        backend = CountingBackend()
+        client = CoalescingApiClient(backend, batch_window=5.0, max_batch_size=2)
+        started_at = time.monotonic()
+        threads, _ = run_threads(client.get, [("/id-status", {"id": "A"}), ("/id-status", {"id": "B"})])
+        for thread in threads:
+            thread.join(5)
+        self.assertLess(time.monotonic() - started_at, 2.0)
+        self.assertEqual(backend.calls, [("get_batch", "/id-status", ("A", "B"))])
+
+    def test_a_window_with_one_id_sends_the_ordinary_request(self):
+        backend = CountingBackend()
+        client = CoalescingApiClient(backend, batch_window=0.01)
+        self.assertEqual(client.get("/id-status", {"id": "A"}), {"id": "A", "call": 1})
+        self.assertEqual(backend.calls, [("get", "/id-status", "A")])
+        self.assertEqual(client.stats()["batches"], 0)
+
+    def test_failed_or_partial_batch_responses(self):
+        self.assertEqual(_split({"error": "Service Unavailable"}, ["A", "B"]),
+                         {"A": {"error": "Service Unavailable"}, "B": {"error": "Service Unavailable"}})
+        split = _split({"results": {"A": {"id": "A"}}}, ["A", "B"])
+        self.assertEqual(split["A"], {"id": "A"})
+        self.assertEqual(split["B"]["error"], "Not Found")
+
+        backend = CountingBackend()
+        backend.batch_response = {"error": "Service Unavailable"}
+        client = CoalescingApiClient(backend, batch_window=0.3)
+        threads, results = run_threads(client.get, [("/id-status", {"id": "A"}), ("/id-status", {"id": "B"})])
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(results, [{"error": "Service Unavailable"}] * 2)
+
+    def test_forget_makes_later_gets_send_a_new_request(self):
+        backend = CountingBackend(hold={1})
+        client = CoalescingApiClient(backend)
+        params = {"member_id": "12345"}
+        threads, results = run_threads(client.get, [("/id-list", params)])
+        wait_for(lambda: len(backend.calls) == 1)
+        client.post("/new-id-card-request", {"member_id": "12345"})
+        client.forget([make_cache_key("/id-list", params)])
+        self.assertEqual(client.get("/id-list", params)["call"], 3) # its own request, after the write
+        backend.release.set()
+        threads[0].join(5)
+        self.assertEqual(results[0]["call"], 1)
+        self.assertEqual(client.stats()["coalesced"], 0)
+
+    def test_disabled_passes_every_call_through(self):
+        backend = CountingBackend()
+        client = CoalescingApiClient(backend, enabled=False)
+        client.get("/member-status", {"member_id": "12345"})
+        client.get("/member-status", {"member_id": "12345"})
+        self.assertEqual(len(backend.calls), 2)
+
+
+class AsyncCoalescingTest(unittest.TestCase):
+    def test_identical_agets_share_one_backend_call(self):
+        backend = CountingBackend()
+        client = CoalescingApiClient(backend)
+
+        async def run():
+            return await asyncio.gather(*(client.aget("/member-status", {"member_id": "12345"}) for _ in range(4)))
+
+        self.assertEqual(asyncio.run(run()), [{"id": None, "call": 1}] * 4)
+        self.assertEqual(len(backend.calls), 1)
+
+    def test_lookups_within_the_window_are_sent_as_one_batch(self):
+        backend = CountingBackend()
+        client = CoalescingApiClient(backend, batch_window=0.05)
+
+        async def run():
+            return await asyncio.gather(*(client.aget("/comets-data", {"id": card_id}) for card_id in ("A", "B", "C")))
+
+        results = asyncio.run(run())
+        self.assertEqual([result["id"] for result in results], ["A", "B", "C"])
+        self.assertEqual(backend.calls, [("get_batch", "/comets-data", ("A", "B", "C"))])
+
+    def test_cancelling_the_leader_leaves_the_shared_request_running(self):
+        backend = CountingBackend(hold={1})
+        client = CoalescingApiClient(backend)
+
+        async def run():
+            leader = asyncio.ensure_future(client.aget("/member-status", {"member_id": "12345"}))
+            await asyncio.sleep(0.01)
+            followers = [asyncio.ensure_future(client.aget("/member-status", {"member_id": "12345"})) for _ in range(2)]
+            await asyncio.sleep(0.01)
+            leader.cancel() # e.g. the leader's tool timed out
+            await asyncio.sleep(0.01)
+            backend.release.set()
+            with self.assertRaises(asyncio.CancelledError):
+                await leader
+            return await asyncio.gather(*followers)
+
+        self.assertEqual(asyncio.run(run()), [{"id": None, "call": 1}] * 2)
+        self.assertEqual(len(backend.calls), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,184 @@
+# tests/test_llm_scheduler.py (TokenBucket and LlmScheduler: refill, priorities, fairness, backpressure)
+
+import asyncio
+import threading
+import time
+import unittest
+
+from llm_scheduler import PRIORITY_CONTINUATION, PRIORITY_NEW, LlmScheduler, QueueFullError, TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TokenBucketTest(unittest.TestCase):
+    def test_refills_continuously_up_to_the_burst(self):
+        bucket = TokenBucket(60, clock=FakeClock()) # one per second, a minute's worth of burst
+        self.assertEqual(bucket.delay(60, now=0.0), 0.0)
+        bucket.take(60, now=0.0)
+        self.assertEqual(bucket.delay(1, now=0.0), 1.0)
+        self.assertEqual(bucket.delay(1, now=0.5), 0.5)
+        self.assertEqual(bucket.delay(1, now=1.0), 0.0)
+        self.assertEqual(bucket.delay(60, now=1000.0), 0.0) # never more than the capacity
+        self.assertEqual(bucket.level, 60)
+
+    def test_burst_seconds_caps_the_level(self):
+        bucket = TokenBucket(600, burst_seconds=1.0, clock=FakeClock())
+        self.assertEqual(bucket.capacity, 10)
+        self.assertEqual(bucket.delay(100, now=0.0), 0.0) # more than the capacity waits for a full bucket
+        bucket.take(100, now=0.0)
+        self.assertEqual(bucket.delay(10, now=0.0), 1.0)
+
+    def test_adjust_refunds_and_charges(self):
+        bucket = TokenBucket(60, clock=FakeClock())
+        bucket.take(60, now=0.0)
+        bucket.adjust(30) # the call used 30 fewer than reserved
+        self.assertEqual(bucket.level, 30)
+        bucket.adjust(-40) # or more than reserved: the next calls wait until it is paid off
+        self.assertEqual(bucket.delay(1, now=0.0), 11.0)
+
+    def test_zero_per_minute_is_unlimited(self):
+        bucket = TokenBucket(0, clock=FakeClock())
+        self.assertTrue(bucket.unlimited)
+        self.assertEqual(bucket.delay(10 ** 9, now=0.0), 0.0)
+
+
+class LlmSchedulerTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+
+    def grant_order(self, scheduler, calls):
+        """Holds the only slot, queues `calls` ((name, thread_id, tenant, priority)) in order, then releases it."""
+        order = []
+
+        async def run():
+            release = asyncio.Event()
+
+            async def holder():
+                async with scheduler.aslot("holder"):
+                    await release.wait()
+
+            async def call(name, thread_id, tenant, priority):
+                async with scheduler.aslot(thread_id, tenant, priority):
+                    order.append(name)
+
+            tasks = [asyncio.ensure_future(holder())]
+            await asyncio.sleep(0)
+            for args in calls:
+                tasks.append(asyncio.ensure_future(call(*args)))
+                await asyncio.sleep(0)
+            self.assertEqual(scheduler.stats()["queue_depth"], len(calls))
+            release.set()
+            await asyncio.gather(*tasks)
+
+        asyncio.run(run())
+        return order
+
+    def test_continuations_go_before_new_turns(self):
+        scheduler = LlmScheduler(max_in_flight=1, clock=self.clock)
+        order = self.grant_order(scheduler, [
+            ("new-1", "t1", "a", PRIORITY_NEW),
+            ("new-2", "t2", "b", PRIORITY_NEW),
+            ("continuation", "t3", "a", PRIORITY_CONTINUATION),
+        ])
+        self.assertEqual(order, ["continuation", "new-1", "new-2"])
+
+    def test_round_robin_across_tenants_then_threads(self):
+        scheduler = LlmScheduler(max_in_flight=1, clock=self.clock)
+        order = self.grant_order(scheduler, [
+            ("busy-t1-a", "t1", "busy", PRIORITY_NEW),
+            ("busy-t1-b", "t1", "busy", PRIORITY_NEW),
+            ("busy-t2", "t2", "busy", PRIORITY_NEW),
+            ("quiet", "q1", "quiet", PRIORITY_NEW),
+        ])
+        self.assertEqual(order, ["busy-t1-a", "quiet", "busy-t2", "busy-t1-b"])
+
+    def test_requests_per_minute_hold_calls_until_the_bucket_refills(self):
+        scheduler = LlmScheduler(requests_per_minute=60, burst_seconds=1.0, clock=self.clock)
+        granted = threading.Event()
+
+        def wait_for_slot():
+            with scheduler.slot("t2"):
+                granted.set()
+
+        with scheduler.slot("t1"):
+            waiter = threading.Thread(target=wait_for_slot)
+            waiter.start()
+            time.sleep(0.05)
+            self.assertFalse(granted.is_set())
+            self.assertEqual(scheduler.stats()["queue_depth"], 1)
+            self.clock.now = 1.0 # the bucket has refilled; the release below dispatches the waiter
+        waiter.join(5)
+        self.assertTrue(granted.is_set())
+        self.assertEqual(scheduler.stats()["granted"], 2)
+        self.assertEqual(scheduler.stats()["queued"], 1)
+
+    def test_full_queue_raises_queue_full_error(self):
+        scheduler = LlmScheduler(max_in_flight=1, max_queue=1, clock=self.clock)
+
+        async def run():
+            async with scheduler.aslot("t1"):
+                waiting = asyncio.ensure_future(scheduler.aslot("t2").__aenter__())
+                await asyncio.sleep(0)
+                self.assertFalse(scheduler.admits())
+                with self.assertRaises(QueueFullError) as raised:
+                    async with scheduler.aslot("t3"):
+                        pass
+                waiting.cancel()
+            return raised.exception
+
+        error = asyncio.run(run())
+        self.assertEqual(error.reason, "queue_full")
+        self.assertGreaterEqual(error.retry_after, 1)
+        self.assertEqual(scheduler.stats()["rejected"], 1)
+        self.assertEqual(scheduler.stats()["queue_depth"], 0)
+
+    def test_waiting_longer_than_max_wait_times_out(self):
+        scheduler = LlmScheduler(max_in_flight=1, max_wait=0.05, clock=self.clock)
+        errors = []
+
+        def wait_for_slot():
+            try:
+                with scheduler.slot("t2"):
+                    pass
+            except QueueFullError as e:
+                errors.append(e)
+
+        with scheduler.slot("t1"):
+            waiter = threading.Thread(target=wait_for_slot)
+            waiter.start()
+            time.sleep(0.02)
+            self.clock.now = 1.0 # past the waiter's deadline
+            waiter.join(5)
+        self.assertEqual([error.reason for error in errors], ["wait_timeout"])
+        self.assertEqual(scheduler.stats()["timed_out"], 1)
+        self.assertEqual(scheduler.stats()["queue_depth"], 0)
+
+    def test_async_slot_times_out_too(self):
+        scheduler = LlmScheduler(max_in_flight=1, max_wait=0.05, clock=self.clock)
+
+        async def run():
+            async with scheduler.aslot("t1"):
+                with self.assertRaises(QueueFullError) as raised:
+                    async with scheduler.aslot("t2"):
+                        pass
+            return raised.exception
+
+        self.assertEqual(asyncio.run(run()).reason, "wait_timeout")
+        self.assertEqual(scheduler.stats()["in_flight"], 0)
+
+    def test_unlimited_grants_immediately(self):
+        scheduler = LlmScheduler(clock=self.clock)
+        with scheduler.slot("t1"), scheduler.slot("t2"):
+            pass
+        self.assertEqual(scheduler.stats()["granted"], 2)
+        self.assertEqual(scheduler.stats()["queued"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
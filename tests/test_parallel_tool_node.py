@@ -0,0 +1,119 @@
+# tests/test_parallel_tool_node.py (ParallelToolNode: ordering, per-tool timeouts, queue timeouts, async path)
+
+import asyncio
+import json
+import threading
+import time
+import unittest
+
+from langchain_core.messages import AIMessage
+from langchain_core.tools import StructuredTool
+
+from parallel_tool_node import ParallelToolNode
+
+
+def sleeping_tool(name):
+    """A tool that sleeps args["seconds"] and returns its name, on both the sync and async paths."""
+    def run(seconds: float) -> str:
+        time.sleep(seconds)
+        return f"{name} done"
+
+    async def arun(seconds: float) -> str:
+        await asyncio.sleep(seconds)
+        return f"{name} done"
+
+    return StructuredTool.from_function(func=run, coroutine=arun, name=name, description=f"Sleeps, then answers ({name})")
+
+
+def calls_state(*calls):
+    tool_calls = [{"name": name, "args": {"seconds": seconds}, "id": f"call-{index}"} for index, (name, seconds) in enumerate(calls)]
+    return {"messages": [AIMessage(content="", tool_calls=tool_calls)]}
+
+
+def error_kind(message):
+    content = str(message.content)
+    return json.loads(content)["error"] if content.startswith('{"error":') else None
+
+
+class ParallelToolNodeTest(unittest.TestCase):
+    def node(self, **kwargs):
+        tools = [sleeping_tool(name) for name in ("get_id_status", "get_comets_data", "request_new_id_card")]
+        return ParallelToolNode(tools, **kwargs)
+
+    def test_results_keep_the_order_of_the_tool_calls(self):
+        node = self.node(max_workers=3)
+        started_at = time.monotonic()
+        messages = node.invoke(calls_state(("get_id_status", 0.3), ("get_comets_data", 0.1), ("get_id_status", 0.0)))["messages"]
+        self.assertLess(time.monotonic() - started_at, 0.6) # concurrent, not 0.4 s in a row plus overhead
+        self.assertEqual([message.tool_call_id for message in messages], ["call-0", "call-1", "call-2"])
+        self.assertEqual([message.content for message in messages], ["get_id_status done", "get_comets_data done", "get_id_status done"])
+
+    def test_per_tool_timeouts(self):
+        node = self.node(default_timeout=0.2, tool_timeouts={"request_new_id_card": 20.0})
+        self.assertEqual(node.timeout_for("request_new_id_card"), 20.0)
+        self.assertEqual(node.timeout_for("get_id_status"), 0.2)
+        messages = node.invoke(calls_state(("get_id_status", 0.5), ("request_new_id_card", 0.5)))["messages"]
+        self.assertEqual(error_kind(messages[0]), "timeout")
+        self.assertEqual(messages[1].content, "request_new_id_card done") # a write gets the longer budget
+        self.assertEqual(node.stats()["timeouts"], 1)
+
+    def test_calls_waiting_for_a_saturated_pool_get_a_queue_timeout(self):
+        node = self.node(max_workers=1, default_timeout=0.3, queue_timeout=0.2)
+        messages = node.invoke(calls_state(("get_id_status", 1.0), ("get_comets_data", 0.0)))["messages"]
+        self.assertEqual(error_kind(messages[0]), "timeout") # still holds the only worker
+        self.assertEqual(error_kind(messages[1]), "queue_timeout")
+        self.assertEqual(node.stats()["queue_timeouts"], 1)
+
+    def test_calls_picked_up_after_the_queue_timeout_are_not_run(self):
+        node = self.node(max_workers=1, default_timeout=2.0, queue_timeout=0.2)
+        messages = node.invoke(calls_state(("get_id_status", 0.5), ("get_comets_data", 0.0)))["messages"]
+        self.assertEqual(messages[0].content, "get_id_status done")
+        self.assertEqual(error_kind(messages[1]), "queue_timeout") # waited 0.5 s for the worker
+        self.assertEqual(node.stats()["queue_timeouts"], 1)
+        self.assertEqual(node.stats()["timeouts"], 0)
+
+    def test_unknown_tools_become_errors(self):
+        messages = self.node().invoke(calls_state(("no_such_tool", 0.0)))["messages"]
+        self.assertEqual(error_kind(messages[0]), "unknown_tool")
+
+    def test_metrics_are_counted_from_concurrent_runs(self):
+        node = self.node(max_workers=16, default_timeout=0.05)
+        runs = [threading.Thread(target=node.invoke, args=(calls_state(("get_id_status", 0.2)),)) for _ in range(8)]
+        for run in runs:
+            run.start()
+        for run in runs:
+            run.join(5)
+        self.assertEqual(node.stats()["timeouts"], 8)
+
+
+class AsyncParallelToolNodeTest(unittest.TestCase):
+    def test_async_calls_run_under_a_semaphore_of_max_workers(self):
+        running = {"now": 0, "max": 0}
+
+        async def arun(seconds: float) -> str:
+            running["now"] += 1
+            running["max"] = max(running["max"], running["now"])
+            await asyncio.sleep(seconds)
+            running["now"] -= 1
+            return "done"
+
+        tool_ = StructuredTool.from_function(func=lambda seconds: "done", coroutine=arun, name="get_id_status", description="Sleeps")
+        node = ParallelToolNode([tool_], max_workers=2, queue_timeout=5.0)
+        messages = asyncio.run(node.ainvoke(calls_state(*[("get_id_status", 0.05)] * 5)))["messages"]
+        self.assertEqual(running["max"], 2)
+        self.assertEqual([message.tool_call_id for message in messages], [f"call-{index}" for index in range(5)])
+
+    def test_async_timeouts_and_queue_timeouts(self):
+        node = ParallelToolNode([sleeping_tool("get_id_status"), sleeping_tool("request_new_id_card")],
+                                max_workers=1, default_timeout=0.1, tool_timeouts={"request_new_id_card": 20.0}, queue_timeout=0.3)
+        messages = asyncio.run(node.ainvoke(calls_state(("get_id_status", 1.0), ("request_new_id_card", 0.0))))["messages"]
+        self.assertEqual(error_kind(messages[0]), "timeout")
+        self.assertEqual(messages[1].content, "request_new_id_card done") # got the slot once the first call timed out
+        messages = asyncio.run(node.ainvoke(calls_state(("request_new_id_card", 0.5), ("get_id_status", 0.0))))["messages"]
+        self.assertEqual(messages[0].content, "request_new_id_card done")
+        self.assertEqual(error_kind(messages[1]), "queue_timeout")
+        self.assertEqual(node.stats(), {"timeouts": 1, "queue_timeouts": 1, "max_workers": 1, "queue_timeout": 0.3})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+# tests/test_prefetch.py (PrefetchingApiClient: per-thread results and invalidation after a card request)
+
+import threading
+import unittest
+
+from instrumentation import current_thread_id
+from prefetch import PrefetchingApiClient
+
+
+class CountingBackend:
+    """Answers like MockApiClient for member 12345 and counts every call per endpoint."""
+
+    def __init__(self):
+        self.calls = {}
+        self.lock = threading.Lock()
+
+    def _count(self, endpoint):
+        with self.lock:
+            self.calls[endpoint] = self.calls.get(endpoint, 0) + 1
+
+    def get(self, endpoint, params):
+        self._count(endpoint)
+        if endpoint == "/id-list":
+            return {"member_id": params["member_id"], "ids": ["CARD-A", "CARD-B"], "primary_id": "CARD-A"}
+        return {"id": params["id"], "endpoint": endpoint}
+
+    def post(self, endpoint, json_data):
+        self._count(endpoint)
+        return {"status": "submitted"}
+
+
+class PrefetchInvalidationTest(unittest.TestCase):
+    def setUp(self):
+        self.backend = CountingBackend()
+        self.client = PrefetchingApiClient(self.backend, enabled=True, all_ids=True)
+
+    def in_thread(self, thread_id, call, *args):
+        token = current_thread_id.set(thread_id)
+        try:
+            return call(*args)
+        finally:
+            current_thread_id.reset(token)
+
+    def prefetch(self, thread_id):
+        self.in_thread(thread_id, self.client.get, "/id-list", {"member_id": "12345"})
+        self.client._executor.shutdown(wait=True) # let the background lookups finish
+        self.client._executor = None
+
+    def test_new_card_request_drops_the_member_results_in_every_thread(self):
+        self.prefetch("thread-1")
+        self.prefetch("thread-2")
+        self.assertEqual(self.client.stats()["pending"], 8) # 2 threads x 2 cards x (/id-status, /comets-data)
+
+        self.in_thread("thread-2", self.client.post, "/new-id-card-request", {"member_id": "12345", "reason": "lost"})
+        stats = self.client.stats()
+        self.assertEqual(stats["pending"], 2) # thread-1 keeps its /comets-data results; thread-2 dropped everything
+        self.assertEqual(stats["by_endpoint"]["/id-status"]["wasted"], 4)
+
+        calls_before = dict(self.backend.calls)
+        self.in_thread("thread-1", self.client.get, "/id-status", {"id": "CARD-A"})
+        self.in_thread("thread-1", self.client.get, "/comets-data", {"id": "CARD-A"})
+        self.assertEqual(self.backend.calls["/id-status"], calls_before["/id-status"] + 1) # reached the backend
+        self.assertEqual(self.backend.calls["/comets-data"], calls_before["/comets-data"]) # served from the prefetch
+        self.assertEqual(self.client.stats()["hits"], 1)
+
+    def test_other_writes_only_drop_the_calling_thread(self):
+        self.prefetch("thread-1")
+        self.prefetch("thread-2")
+        self.in_thread("thread-2", self.client.post, "/feedback", {"member_id": "12345"})
+        self.assertEqual(self.client.stats()["pending"], 4)
+
+    def test_other_members_are_kept(self):
+        self.prefetch("thread-1")
+        self.in_thread("thread-2", self.client.post, "/new-id-card-request", {"member_id": "99999", "reason": "lost"})
+        self.assertEqual(self.client.stats()["pending"], 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,140 @@
+# tests/test_sharded_saver.py (ShardedSaver routing, cross-shard listing, pending writes and migration)
+
+import asyncio
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from append_only_saver import AppendOnlySaver
+from sharded_saver import ShardedSaver, migrate, shard_for, shard_paths
+
+
+def make_checkpoint(checkpoint_id, messages):
+    return {
+        "v": 1,
+        "id": checkpoint_id,
+        "ts": checkpoint_id,
+        "channel_values": {"messages": list(messages)},
+        "channel_versions": {},
+        "versions_seen": {},
+    }
+
+
+def thread_config(thread_id, thread_ts=None):
+    return {"configurable": {"thread_id": thread_id, "thread_ts": thread_ts}}
+
+
+def write_thread(saver, thread_id, turns=2):
+    """`turns` checkpoints, each adding a question and an answer; returns the last config."""
+    config = thread_config(thread_id)
+    messages = []
+    for turn in range(turns):
+        messages += [HumanMessage(content=f"{thread_id} q{turn}", id=f"{thread_id}-h{turn}"),
+                     AIMessage(content=f"{thread_id} a{turn}", id=f"{thread_id}-a{turn}")]
+        config = saver.put(config, make_checkpoint(f"2024-01-01T00:00:{turn:02d}-{thread_id}", messages), {"step": turn})
+    return config
+
+
+class ShardedSaverTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.base_path = os.path.join(self.tmp.name, "conversations.db")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_threads_are_routed_to_their_own_shard(self):
+        saver = ShardedSaver(self.base_path, shards=4, keep_last=None)
+        thread_ids = [f"member-{n}" for n in range(12)]
+        for thread_id in thread_ids:
+            write_thread(saver, thread_id)
+
+        for thread_id in thread_ids:
+            index = shard_for(thread_id, 4)
+            stored = AppendOnlySaver.from_conn_string(shard_paths(self.base_path, 4)[index]).get_tuple(thread_config(thread_id))
+            self.assertIsNotNone(stored)
+            self.assertEqual(len(stored.checkpoint["channel_values"]["messages"]), 4)
+            for other in set(range(4)) - {index}:
+                self.assertIsNone(saver.shard(other).get_tuple(thread_config(thread_id)))
+        self.assertEqual(sum(saver.stats()["puts_by_shard"]), 24)
+
+    def test_list_without_thread_merges_every_shard_newest_first(self):
+        saver = ShardedSaver(self.base_path, shards=3, keep_last=None)
+        for thread_id in ("a", "b", "c", "d"):
+            write_thread(saver, thread_id)
+        listed = [t.config["configurable"]["thread_ts"] for t in saver.list(None)]
+        self.assertEqual(len(listed), 8)
+        self.assertEqual(listed, sorted(listed, reverse=True))
+        self.assertEqual(len(list(saver.list(None, limit=3))), 3)
+        self.assertEqual(len(list(saver.list(thread_config("b")))), 2)
+
+    def test_put_writes_go_to_the_thread_shard(self):
+        saver = ShardedSaver(self.base_path, shards=4, keep_last=None)
+        config = write_thread(saver, "member-1", turns=1)
+        saver.put_writes(config, [("messages", "pending"), ("route", "agent")], "task-1")
+        asyncio.run(saver.aput_writes(config, [("messages", "async pending")], "task-2"))
+
+        shard = saver.shard(shard_for("member-1", 4))
+        self.assertEqual(shard.thread_writes("member-1"), {
+            config["configurable"]["thread_ts"]: [
+                ("task-1", "messages", "pending"), ("task-1", "route", "agent"), ("task-2", "messages", "async pending"),
+            ],
+        })
+
+    def test_migration_round_trip_keeps_checkpoints_and_writes(self):
+        source_path = os.path.join(self.tmp.name, "single.db")
+        source = AppendOnlySaver.from_conn_string(source_path, keep_last=None)
+        expected = {}
+        for thread_id in ("member-1", "member-2", "member-3"):
+            config = write_thread(source, thread_id, turns=3)
+            source.put_writes(config, [("messages", f"{thread_id} pending")], "task-1")
+            expected[thread_id] = list(source.list(thread_config(thread_id)))
+        source.conn.close()
+
+        sharded = ShardedSaver(self.base_path, shards=2, keep_last=None)
+        self.assertEqual(migrate([source_path], sharded), {"threads": 3, "checkpoints": 9, "skipped": 0})
+        for thread_id, checkpoints in expected.items():
+            copied = list(sharded.list(thread_config(thread_id)))
+            self.assertEqual([t.config for t in copied], [t.config for t in checkpoints])
+            self.assertEqual([t.parent_config for t in copied], [t.parent_config for t in checkpoints])
+            self.assertEqual([t.checkpoint["channel_values"]["messages"] for t in copied],
+                             [t.checkpoint["channel_values"]["messages"] for t in checkpoints])
+            newest_ts = checkpoints[0].config["configurable"]["thread_ts"]
+            self.assertEqual(sharded.shard_for_config(thread_config(thread_id)).thread_writes(thread_id),
+                             {newest_ts: [("task-1", "messages", f"{thread_id} pending")]})
+
+        # Rebalancing into another layout keeps them too, and a repeated run skips what is already there
+        rebalanced = ShardedSaver(self.base_path, shards=3, keep_last=None)
+        self.assertEqual(migrate(shard_paths(self.base_path, 2), rebalanced)["threads"], 3)
+        self.assertEqual(migrate(shard_paths(self.base_path, 2), rebalanced)["skipped"], 3)
+        self.assertEqual(rebalanced.shard_for_config(thread_config("member-2")).thread_writes("member-2"),
+                         {expected["member-2"][0].config["configurable"]["thread_ts"]: [("task-1", "messages", "member-2 pending")]})
+
+    def test_migration_from_a_sqlite_saver_table(self):
+        source_path = os.path.join(self.tmp.name, "sqlite.db")
+        serde = ShardedSaver(self.base_path).serde
+        conn = sqlite3.connect(source_path)
+        conn.execute("CREATE TABLE checkpoints (thread_id TEXT, thread_ts TEXT, parent_ts TEXT, checkpoint BLOB, metadata BLOB, "
+                     "PRIMARY KEY (thread_id, thread_ts))")
+        messages = [HumanMessage(content="hello", id="h0")]
+        conn.execute("INSERT INTO checkpoints VALUES (?, ?, ?, ?, ?)",
+                     ("t1", "ts-1", None, serde.dumps(make_checkpoint("ts-1", messages)), serde.dumps({"step": 0})))
+        conn.execute("INSERT INTO checkpoints VALUES (?, ?, ?, ?, ?)",
+                     ("t1", "ts-2", "ts-1", serde.dumps(make_checkpoint("ts-2", messages + [AIMessage(content="hi", id="a0")])),
+                      serde.dumps({"step": 1})))
+        conn.commit()
+        conn.close()
+
+        sharded = ShardedSaver(self.base_path, shards=2, keep_last=None)
+        self.assertEqual(migrate([source_path], sharded), {"threads": 1, "checkpoints": 2, "skipped": 0})
+        newest = sharded.get_tuple(thread_config("t1"))
+        self.assertEqual(newest.config["configurable"]["thread_ts"], "ts-2")
+        self.assertEqual(newest.parent_config["configurable"]["thread_ts"], "ts-1")
+        self.assertEqual([m.content for m in newest.checkpoint["channel_values"]["messages"]], ["hello", "hi"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,142 @@
+# tests/test_tool_cache.py (TTLCache and CachingApiClient: expiry, LRU, invalidation, generation guard)
+
+import threading
+import unittest
+
+from tool_cache import CachingApiClient, TTLCache, make_cache_key
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class CountingBackend:
+    """Answers like MockApiClient for member 12345 and counts calls; a GET of `block_endpoint` waits for `release`."""
+
+    def __init__(self):
+        self.calls = {}
+        self.lock = threading.Lock()
+        self.block_endpoint = None
+        self.blocked = threading.Event()
+        self.release = threading.Event()
+
+    def get(self, endpoint, params):
+        with self.lock:
+            self.calls[endpoint] = self.calls.get(endpoint, 0) + 1
+            calls = self.calls[endpoint]
+        if endpoint == self.block_endpoint:
+            self.blocked.set()
+            self.release.wait(5)
+        if endpoint == "/id-list":
+            return {"member_id": params["member_id"], "ids": ["CARD-A", "CARD-B"], "primary_id": "CARD-A"}
+        if endpoint == "/unknown":
+            return {"error": "Not Found"}
+        return {"id": params.get("id"), "endpoint": endpoint, "call": calls}
+
+    def post(self, endpoint, json_data):
+        with self.lock:
+            self.calls[endpoint] = self.calls.get(endpoint, 0) + 1
+        return {"status": "submitted"}
+
+
+class TTLCacheTest(unittest.TestCase):
+    def test_entries_expire_after_their_ttl(self):
+        clock = FakeClock()
+        cache = TTLCache(clock=clock)
+        cache.set("a", 1, ttl=10.0)
+        self.assertEqual(cache.get("a"), (True, 1))
+        clock.now = 10.0
+        self.assertEqual(cache.get("a"), (False, None))
+        self.assertEqual(cache.stats()["expirations"], 1)
+        self.assertEqual(cache.stats()["hits"], 1)
+        self.assertEqual(cache.stats()["misses"], 1)
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = TTLCache(max_entries=2, clock=FakeClock())
+        cache.set("a", 1, ttl=10.0)
+        cache.set("b", 2, ttl=10.0)
+        cache.get("a") # "b" is now the least recently used
+        cache.set("c", 3, ttl=10.0)
+        self.assertEqual(cache.get("b"), (False, None))
+        self.assertEqual(cache.get("a"), (True, 1))
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_peek_leaves_stats_and_order_alone(self):
+        cache = TTLCache(max_entries=2, clock=FakeClock())
+        cache.set("a", 1, ttl=10.0)
+        cache.set("b", 2, ttl=10.0)
+        self.assertEqual(cache.peek("a"), (True, 1))
+        cache.set("c", 3, ttl=10.0)
+        self.assertEqual(cache.peek("a"), (False, None)) # peek did not make "a" recently used
+        self.assertEqual(cache.stats()["hits"] + cache.stats()["misses"], 0)
+
+
+class CachingApiClientTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.backend = CountingBackend()
+        self.client = CachingApiClient(self.backend, cache=TTLCache(clock=self.clock))
+
+    def test_lookups_are_cached_per_endpoint_ttl(self):
+        self.client.get("/id-status", {"id": "CARD-A"})
+        self.client.get("/id-status", {"id": "CARD-A"})
+        self.assertEqual(self.backend.calls["/id-status"], 1)
+        self.clock.now = 60.0 # /id-status lives 60 s
+        self.client.get("/id-status", {"id": "CARD-A"})
+        self.assertEqual(self.backend.calls["/id-status"], 2)
+
+    def test_errors_and_unlisted_endpoints_are_not_cached(self):
+        self.client.get("/unknown", {"id": "x"})
+        self.client.get("/unknown", {"id": "x"})
+        self.assertEqual(self.backend.calls["/unknown"], 2)
+        self.assertEqual(self.client.stats()["entries"], 0)
+
+    def test_new_card_request_invalidates_the_member_lookups(self):
+        self.client.get("/id-list", {"member_id": "12345"})
+        self.client.get("/id-status", {"id": "CARD-A"})
+        self.client.get("/id-status", {"id": "CARD-B"})
+        self.client.get("/comets-data", {"id": "CARD-A"})
+        self.client.post("/new-id-card-request", {"member_id": "12345", "reason": "lost"})
+
+        self.client.get("/id-list", {"member_id": "12345"})
+        self.client.get("/id-status", {"id": "CARD-A"})
+        self.client.get("/id-status", {"id": "CARD-B"})
+        self.client.get("/comets-data", {"id": "CARD-A"})
+        self.assertEqual(self.backend.calls["/id-list"], 2)
+        self.assertEqual(self.backend.calls["/id-status"], 4)
+        self.assertEqual(self.backend.calls["/comets-data"], 1) # not affected by a card request
+
+    def test_member_cards_are_found_after_the_id_list_entry_was_evicted(self):
+        self.client = CachingApiClient(self.backend, cache=TTLCache(max_entries=2, clock=self.clock))
+        self.client.get("/id-list", {"member_id": "12345"})
+        self.client.get("/id-status", {"id": "CARD-A"})
+        self.client.get("/id-status", {"id": "CARD-B"}) # evicts /id-list
+        self.assertFalse(self.client.cache.peek(make_cache_key("/id-list", {"member_id": "12345"}))[0])
+
+        self.client.post("/new-id-card-request", {"member_id": "12345", "reason": "lost"})
+        self.assertEqual(self.client.stats()["invalidations"], 2)
+        self.client.get("/id-status", {"id": "CARD-B"})
+        self.assertEqual(self.backend.calls["/id-status"], 3)
+
+    def test_get_in_flight_during_an_invalidation_does_not_store_its_response(self):
+        self.client.get("/id-list", {"member_id": "12345"})
+        self.backend.block_endpoint = "/id-status"
+        reader = threading.Thread(target=self.client.get, args=("/id-status", {"id": "CARD-A"}))
+        reader.start()
+        self.assertTrue(self.backend.blocked.wait(5))
+        self.client.post("/new-id-card-request", {"member_id": "12345", "reason": "lost"})
+        self.backend.release.set()
+        reader.join(5)
+
+        self.assertEqual(self.client.stats()["stale_stores_skipped"], 1)
+        response = self.client.get("/id-status", {"id": "CARD-A"})
+        self.assertEqual(self.backend.calls["/id-status"], 2) # reached the backend instead of the pre-write response
+        self.assertEqual(response["call"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
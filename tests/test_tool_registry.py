@@ -0,0 +1,76 @@
+# tests/test_tool_registry.py (ToolRegistry: per-turn tool subsetting and the bound-model cache)
+
+import unittest
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langchain_core.tools import StructuredTool
+
+from tool_registry import DEFAULT_TOOL_GROUPS, ToolRegistry
+
+ID_CARD_TOOLS = DEFAULT_TOOL_GROUPS["id_card"]["tools"]
+MEMBER_TOOLS = DEFAULT_TOOL_GROUPS["member"]["tools"]
+
+
+def make_tool(name):
+    def run(member_id: str) -> str:
+        return name
+
+    return StructuredTool.from_function(func=run, name=name, description=f"Looks up {name} for a member")
+
+
+class FakeModel:
+    def __init__(self):
+        self.bound = []
+
+    def bind_tools(self, schemas):
+        self.bound.append([schema["function"]["name"] for schema in schemas])
+        return ("bound", len(self.bound))
+
+
+class ToolRegistryTest(unittest.TestCase):
+    def setUp(self):
+        self.registry = ToolRegistry([make_tool(name) for name in ID_CARD_TOOLS + MEMBER_TOOLS])
+
+    def select(self, text, *history):
+        return set(self.registry.select_tool_names([*history, HumanMessage(content=text)]))
+
+    def test_keywords_pick_their_group(self):
+        self.assertEqual(self.select("I lost my card"), set(ID_CARD_TOOLS))
+        self.assertEqual(self.select("Is dental covered by my plan?"), set(MEMBER_TOOLS))
+        self.assertEqual(self.select("When will my replacement card be delivered?"), set(ID_CARD_TOOLS))
+        self.assertEqual(self.select("My card was lost; what does my plan cover?"), set(ID_CARD_TOOLS + MEMBER_TOOLS))
+
+    def test_keywords_only_match_at_the_start_of_a_word(self):
+        # "plan" in "explain", "cover" in "discover", "mail" in "email", "ship" in "membership" are not keywords
+        self.assertEqual(self.select("Can you explain how to discover my email settings?"), set(self.registry.tool_names))
+        self.assertEqual(self.select("Please explain my card"), set(ID_CARD_TOOLS))
+        self.assertEqual(self.select("What is my membership status?"), set(MEMBER_TOOLS))
+
+    def test_no_match_offers_every_tool(self):
+        self.assertEqual(self.registry.select_tool_names([HumanMessage(content="hello there")]), self.registry.tool_names)
+        self.assertEqual(self.registry.select_tool_names([]), self.registry.tool_names)
+
+    def test_tools_called_this_turn_stay_available(self):
+        history = [HumanMessage(content="I lost my card"),
+                   AIMessage(content="", tool_calls=[{"name": "get_member_status", "args": {"member_id": "1"}, "id": "c1"}]),
+                   ToolMessage(content="active", tool_call_id="c1")]
+        names = self.registry.select_tool_names(history)
+        self.assertEqual(set(names), set(ID_CARD_TOOLS) | {"get_member_status"})
+        self.assertEqual(names, tuple(name for name in self.registry.tool_names if name in names)) # registry order
+
+    def test_bound_models_are_cached_per_subset(self):
+        model = FakeModel()
+        first, names = self.registry.bind(model, [HumanMessage(content="I lost my card")])
+        again, _ = self.registry.bind(model, [HumanMessage(content="Where is my card?")])
+        other, _ = self.registry.bind(model, [HumanMessage(content="What does my plan cover?")])
+        self.assertIs(first, again)
+        self.assertIsNot(first, other)
+        self.assertEqual(model.bound, [list(ID_CARD_TOOLS), list(MEMBER_TOOLS)])
+        stats = self.registry.stats()
+        self.assertEqual(stats["bind_cache_hits"], 1)
+        self.assertEqual(stats["turns"], 3)
+        self.assertGreater(stats["schema_tokens_saved"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
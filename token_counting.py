@@ -0,0 +1,42 @@
+# token_counting.py (Approximate prompt-token counting shared by the prompt-size optimizations)
+
+import json
+from functools import lru_cache
+from typing import Any, Iterable
+
+from langchain_core.messages import BaseMessage
+
+try: # tiktoken ships with langchain-openai; fall back to a length heuristic if it is missing
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding("o200k_base")
+except Exception:
+    _ENCODING = None
+
+# Per-message overhead of the chat format (role markers etc.), as documented for OpenAI chat models
+TOKENS_PER_MESSAGE = 3
+
+
+@lru_cache(maxsize=4096)
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text))
+    return max(1, len(text) // 4) # ~4 characters per token for English text
+
+
+def count_json_tokens(value: Any) -> int:
+    return count_tokens(json.dumps(value, separators=(",", ":"), sort_keys=True))
+
+
+def count_message_tokens(message: BaseMessage) -> int:
+    content = message.content if isinstance(message.content, str) else json.dumps(message.content)
+    tokens = TOKENS_PER_MESSAGE + count_tokens(content)
+    tool_calls = getattr(message, "tool_calls", None)
+    if tool_calls:
+        tokens += count_json_tokens([{"name": call["name"], "args": call["args"]} for call in tool_calls])
+    return tokens
+
+
+def count_messages_tokens(messages: Iterable[BaseMessage]) -> int:
+    return sum(count_message_tokens(message) for message in messages)
@@ -0,0 +1,234 @@
+# tool_cache.py (TTL + LRU response cache for the read-only backend lookups)
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from instrumentation import tracer
+
+# Seconds a successful response stays valid, per endpoint. Endpoints not listed here are never cached.
+# Card shipping status changes fastest, plan benefits slowest.
+DEFAULT_ENDPOINT_TTLS: Dict[str, float] = {
+    "/id-list": 300.0,
+    "/id-status": 60.0,
+    "/comets-data": 60.0,
+    "/member-benefits": 3600.0,
+    "/dental-coverage": 900.0,
+    "/member-status": 900.0,
+}
+
+CacheKey = Tuple[str, Tuple[Tuple[str, Any], ...]]
+
+
+def make_cache_key(endpoint: str, params: Dict[str, Any]) -> CacheKey:
+    # Param order must not matter: {"a": 1, "b": 2} and {"b": 2, "a": 1} are the same lookup
+    return (endpoint, tuple(sorted(params.items())))
+
+
+class TTLCache:
+    """
+    A bounded, thread-safe LRU cache whose entries also expire after a per-entry TTL.
+    Expired entries are dropped lazily on lookup; when full, the least recently used entry is evicted.
+    """
+
+    def __init__(self, max_entries: int = 1024, clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self._clock = clock
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict() # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        """Returns (True, value) on a fresh hit, (False, None) otherwise. Counts towards hit/miss stats."""
+        with self._lock:
+            found, value = self._lookup(key)
+            if found:
+                self.hits += 1
+            else:
+                self.misses += 1
+            return found, value
+
+    def peek(self, key: Hashable) -> Tuple[bool, Any]:
+        """Like get(), but does not touch the stats or the LRU order (used for bookkeeping lookups)."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= self._clock():
+                return False, None
+            return True, entry[1]
+
+    def set(self, key: Hashable, value: Any, ttl: float) -> None:
+        with self._lock:
+            self._entries[key] = (self._clock() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key: Hashable) -> bool:
+        with self._lock:
+            if self._entries.pop(key, None) is None:
+                return False
+            self.invalidations += 1
+            return True
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+    def _lookup(self, key: Hashable) -> Tuple[bool, Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        expires_at, value = entry
+        if expires_at <= self._clock():
+            del self._entries[key]
+            self.expirations += 1
+            return False, None
+        self._entries.move_to_end(key)
+        return True, value
+
+
+class CachingApiClient:
+    """
+    Wraps an API client (MockApiClient or the real ApiClient) with a TTLCache for read-only GETs.
+    Exposes the same get/post/aget/apost interface, so tools do not need to know the cache exists.
+    Error responses are never cached, and writes invalidate the lookups they make stale. A GET that was in
+    flight when its key was invalidated does not store its (pre-write) response.
+    Every call is a "backend" span (see instrumentation.py) recording the endpoint and, for GETs, cache_hit.
+    """
+
+    def __init__(self, client: Any, cache: Optional[TTLCache] = None, endpoint_ttls: Optional[Dict[str, float]] = None):
+        self.client = client
+        self.cache = cache if cache is not None else TTLCache()
+        self.endpoint_ttls = dict(DEFAULT_ENDPOINT_TTLS if endpoint_ttls is None else endpoint_ttls)
+        # member_id -> card IDs from the last /id-list response, so a write for a member can find
+        # the per-card /id-status entries to evict even after the /id-list entry itself is gone.
+        self._member_cards: "OrderedDict[str, Tuple[str, ...]]" = OrderedDict()
+        # Cache key -> generation, bumped whenever the key is invalidated; keys never invalidated are at 0.
+        self._generations: "OrderedDict[CacheKey, int]" = OrderedDict()
+        self._generation_counter = 0
+        self.stale_stores_skipped = 0
+        self._index_lock = threading.Lock()
+
+    # --- Reads ---
+    def get(self, endpoint: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        with tracer.span("backend", kind="backend", endpoint=endpoint, method="GET") as span:
+            ttl = self.endpoint_ttls.get(endpoint)
+            if ttl is None:
+                return _traced_response(span, self.client.get(endpoint, params))
+            key = make_cache_key(endpoint, params)
+            found, cached = self.cache.get(key)
+            span.set(cache_hit=found)
+            if found:
+                return dict(cached)
+            generation = self._generation(key)
+            response = _traced_response(span, self.client.get(endpoint, params))
+            self._store(endpoint, params, key, response, ttl, generation)
+            return response
+
+    async def aget(self, endpoint: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        with tracer.span("backend", kind="backend", endpoint=endpoint, method="GET") as span:
+            ttl = self.endpoint_ttls.get(endpoint)
+            if ttl is None:
+                return _traced_response(span, await self.client.aget(endpoint, params))
+            key = make_cache_key(endpoint, params)
+            found, cached = self.cache.get(key)
+            span.set(cache_hit=found)
+            if found:
+                return dict(cached)
+            generation = self._generation(key)
+            response = _traced_response(span, await self.client.aget(endpoint, params))
+            self._store(endpoint, params, key, response, ttl, generation)
+            return response
+
+    # --- Writes ---
+    def post(self, endpoint: str, json_data: Dict[str, Any]) -> Dict[str, Any]:
+        with tracer.span("backend", kind="backend", endpoint=endpoint, method="POST") as span:
+            response = _traced_response(span, self.client.post(endpoint, json_data))
+        self._invalidate_after_write(endpoint, json_data)
+        return response
+
+    async def apost(self, endpoint: str, json_data: Dict[str, Any]) -> Dict[str, Any]:
+        with tracer.span("backend", kind="backend", endpoint=endpoint, method="POST") as span:
+            response = _traced_response(span, await self.client.apost(endpoint, json_data))
+        self._invalidate_after_write(endpoint, json_data)
+        return response
+
+    def invalidate_member(self, member_id: str) -> None:
+        """Drops the member's /id-list entry and the /id-status entry of every card on it."""
+        found, id_list = self.cache.peek(make_cache_key("/id-list", {"member_id": member_id}))
+        with self._index_lock:
+            card_ids = set(self._member_cards.pop(member_id, ()))
+        if found:
+            card_ids.update(id_list.get("ids", []))
+        keys = [make_cache_key("/id-list", {"member_id": member_id})]
+        keys.extend(make_cache_key("/id-status", {"id": card_id}) for card_id in card_ids)
+        with self._index_lock:
+            for key in keys:
+                self._bump_generation(key)
+                self.cache.invalidate(key)
+        if hasattr(self.client, "forget"):
+            self.client.forget(keys) # e.g. CoalescingApiClient: later GETs must not share a pre-write request
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.cache.stats(), "stale_stores_skipped": self.stale_stores_skipped}
+
+    # --- Internals ---
+    def _store(self, endpoint: str, params: Dict[str, Any], key: CacheKey, response: Dict[str, Any], ttl: float, generation: int) -> None:
+        if "error" in response:
+            return
+        # Checked and stored under the index lock, so an invalidation cannot land between the two
+        with self._index_lock:
+            if self._generations.get(key, 0) != generation:
+                self.stale_stores_skipped += 1 # invalidated while the GET was in flight: the response predates the write
+                return
+            self.cache.set(key, dict(response), ttl)
+            if endpoint == "/id-list" and "member_id" in params:
+                self._member_cards[params["member_id"]] = tuple(response.get("ids", []))
+                self._member_cards.move_to_end(params["member_id"])
+                while len(self._member_cards) > self.cache.max_entries:
+                    self._member_cards.popitem(last=False)
+
+    def _generation(self, key: CacheKey) -> int:
+        with self._index_lock:
+            return self._generations.get(key, 0)
+
+    def _bump_generation(self, key: CacheKey) -> None:
+        # Caller holds _index_lock. Generations come from one counter, so a bumped key never returns to a
+        # value a GET could have captured earlier unless max_entries invalidations happen during that GET.
+        self._generation_counter += 1
+        self._generations[key] = self._generation_counter
+        self._generations.move_to_end(key)
+        while len(self._generations) > self.cache.max_entries:
+            self._generations.popitem(last=False)
+
+    def _invalidate_after_write(self, endpoint: str, json_data: Dict[str, Any]) -> None:
+        # A new card request changes the member's card list and the shipping status of their cards
+        if endpoint == "/new-id-card-request" and json_data.get("member_id"):
+            self.invalidate_member(json_data["member_id"])
+
+
+def _traced_response(span: Any, response: Dict[str, Any]) -> Dict[str, Any]:
+    # Backend failures come back as {"error": ...} dicts rather than exceptions
+    if "error" in response:
+        span.fail(str(response["error"]))
+    return response
@@ -0,0 +1,145 @@
+# tool_registry.py (Precompiled tool schemas, cached tool-bound models and per-turn tool subsetting)
+
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+from langchain_core.tools import BaseTool
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+from token_counting import count_json_tokens
+
+# Tools are offered to the model in groups. A group is offered when a word of the latest user message starts
+# with one of its keywords ("cover" matches "covered" and "coverage", not "discover"; "plan" does not match
+# "explain"); when no group matches, every tool is offered so the model is never left without the tool it needs.
+DEFAULT_TOOL_GROUPS: Dict[str, Dict[str, Tuple[str, ...]]] = {
+    "id_card": {
+        "tools": ("get_id_list", "get_id_card_status", "get_comets_data", "request_new_id_card"),
+        "keywords": ("card", "id list", "my ids", "medicare id", "replacement", "replace", "lost", "stolen",
+                     "damaged", "ship", "deliver", "tracking", "mail", "activat", "comets", "new id"),
+    },
+    "member": {
+        "tools": ("get_member_benefits", "get_dental_coverage_status", "get_member_status"),
+        "keywords": ("benefit", "coverage", "covered", "cover", "dental", "plan", "hmo", "ppo", "advantage",
+                     "membership", "member status", "enroll", "active member", "am i active", "included", "include"),
+    },
+}
+
+
+class ToolRegistry:
+    """
+    Holds one tool set with its OpenAI tool schemas built once, and caches `llm.bind_tools(...)` per
+    (model, tool subset), so an agent step no longer rebuilds schemas from the tools' docstrings.
+    `bind(llm, messages)` picks the subset of tools relevant to the current turn and records how many
+    schema tokens that saves compared to sending every tool.
+    """
+
+    def __init__(self, tools: Sequence[BaseTool], groups: Optional[Dict[str, Dict[str, Tuple[str, ...]]]] = None,
+                 max_bound_models: int = 64):
+        self.tools_by_name: Dict[str, BaseTool] = {tool_.name: tool_ for tool_ in tools}
+        self.tool_names: Tuple[str, ...] = tuple(self.tools_by_name)
+        self.groups = groups if groups is not None else DEFAULT_TOOL_GROUPS
+        self._group_patterns = [(_keyword_pattern(group["keywords"]), group["tools"]) for group in self.groups.values()]
+        self.schemas: Dict[str, Dict[str, Any]] = {name: convert_to_openai_tool(tool_) for name, tool_ in self.tools_by_name.items()}
+        self.schema_tokens: Dict[str, int] = {name: count_json_tokens(schema) for name, schema in self.schemas.items()}
+        self.max_bound_models = max_bound_models
+        self._bound: "OrderedDict[Tuple[int, Tuple[str, ...]], Tuple[Any, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Stats
+        self.steps = 0
+        self.turns = 0
+        self.schema_tokens_full = 0
+        self.schema_tokens_sent = 0
+        self.bind_cache_hits = 0
+
+    def select_tool_names(self, messages: Sequence[BaseMessage]) -> Tuple[str, ...]:
+        """The tools to offer for the current turn, in registry order."""
+        latest_human = next((m for m in reversed(messages) if isinstance(m, HumanMessage)), None)
+        if latest_human is None:
+            return self.tool_names
+        text = latest_human.content.lower() if isinstance(latest_human.content, str) else ""
+
+        selected = set()
+        for pattern, tools in self._group_patterns:
+            if pattern.search(text):
+                selected.update(tools)
+        if not selected:
+            return self.tool_names
+
+        # Keep every tool the model already called in this turn available, so a chain it started
+        # (e.g. get_id_list -> get_member_status) can always be continued.
+        for message in _current_turn(messages):
+            if isinstance(message, AIMessage):
+                selected.update(call["name"] for call in message.tool_calls)
+        return tuple(name for name in self.tool_names if name in selected)
+
+    def bind(self, llm: Any, messages: Sequence[BaseMessage]) -> Tuple[Any, Tuple[str, ...]]:
+        """Returns (llm bound to the selected tools, selected tool names)."""
+        names = self.select_tool_names(messages)
+        key = (id(llm), names)
+        with self._lock:
+            entry = self._bound.get(key)
+            if entry is not None and entry[0] is llm: # id() can be reused once a model is garbage collected
+                self._bound.move_to_end(key)
+                self.bind_cache_hits += 1
+                bound = entry[1]
+            else:
+                bound = None
+        if bound is None:
+            bound = llm.bind_tools([self.schemas[name] for name in names])
+            with self._lock:
+                self._bound[key] = (llm, bound)
+                while len(self._bound) > self.max_bound_models:
+                    self._bound.popitem(last=False)
+        self._record(messages, names)
+        return bound, names
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            saved = self.schema_tokens_full - self.schema_tokens_sent
+            return {
+                "steps": self.steps,
+                "turns": self.turns,
+                "schema_tokens_full": self.schema_tokens_full,
+                "schema_tokens_sent": self.schema_tokens_sent,
+                "schema_tokens_saved": saved,
+                "tokens_saved_per_turn": saved / self.turns if self.turns else 0.0,
+                "bind_cache_hits": self.bind_cache_hits,
+            }
+
+    def _record(self, messages: Sequence[BaseMessage], names: Tuple[str, ...]) -> None:
+        full = sum(self.schema_tokens.values())
+        sent = sum(self.schema_tokens[name] for name in names)
+        with self._lock:
+            self.steps += 1
+            if messages and isinstance(messages[-1], HumanMessage): # first agent step of a turn
+                self.turns += 1
+            self.schema_tokens_full += full
+            self.schema_tokens_sent += sent
+
+
+def _keyword_pattern(keywords: Sequence[str]) -> "re.Pattern[str]":
+    # A keyword matches at the start of a word and may be followed by the rest of the word
+    return re.compile(r"\b(?:" + "|".join(re.escape(keyword) for keyword in keywords) + r")\w*")
+
+
+def _current_turn(messages: Sequence[BaseMessage]) -> List[BaseMessage]:
+    for index in range(len(messages) - 1, -1, -1):
+        if isinstance(messages[index], HumanMessage):
+            return list(messages[index:])
+    return list(messages)
+
+
+_registries: Dict[Tuple[int, ...], ToolRegistry] = {}
+_registries_lock = threading.Lock()
+
+
+def registry_for(tools: Sequence[BaseTool]) -> ToolRegistry:
+    """One ToolRegistry per distinct tool set, built on first use and reused by every later agent step."""
+    key = tuple(id(tool_) for tool_ in tools)
+    with _registries_lock:
+        if key not in _registries:
+            _registries[key] = ToolRegistry(tools)
+        return _registries[key]
@@ -0,0 +1,94 @@
+# tool_results.py (Typed tool results with a compact JSON rendering for the model)
+#
+# Each endpoint has a result model whose fields are the allow-list of what reaches the model: anything
+# else the backend returns is dropped. Results render as compact JSON (no whitespace, no null fields),
+# which is what lands in ToolMessage content, is re-sent on every later agent step and is checkpointed.
+
+import re
+from typing import Any, Dict, List, Optional, Type, Union
+
+from pydantic import BaseModel, ValidationError
+
+
+class ToolError(BaseModel):
+    """Replaces free-text failures such as "Not Found" with a machine-readable code plus a short message."""
+    error: str # snake_case code, e.g. "not_found", "backend_unavailable", "timeout"
+    message: str
+    retryable: bool = False
+
+
+class IdListResult(BaseModel):
+    ids: List[str]
+    primary_id: Optional[str] = None
+
+
+class IdStatusResult(BaseModel):
+    status: str
+    tracking_number: Optional[str] = None
+    estimated_delivery: Optional[str] = None
+
+
+class CometsDataResult(BaseModel):
+    comets_status: str
+    last_update: Optional[str] = None
+    details: Optional[str] = None
+
+
+class NewCardRequestResult(BaseModel):
+    request_id: str
+    status: str
+
+
+class MemberBenefitsResult(BaseModel):
+    plan_type: str
+    benefits: List[str]
+
+
+class DentalCoverageResult(BaseModel):
+    dental_status: str
+    preventative_coinsurance: Optional[str] = None
+
+
+class MemberStatusResult(BaseModel):
+    enrollment_status: str
+
+
+ENDPOINT_RESULTS: Dict[str, Type[BaseModel]] = {
+    "/id-list": IdListResult,
+    "/id-status": IdStatusResult,
+    "/comets-data": CometsDataResult,
+    "/new-id-card-request": NewCardRequestResult,
+    "/member-benefits": MemberBenefitsResult,
+    "/dental-coverage": DentalCoverageResult,
+    "/member-status": MemberStatusResult,
+}
+
+# Backend failures that may succeed if asked again later
+RETRYABLE_ERRORS = frozenset({"backend_unavailable", "circuit_open", "connection_error", "queue_timeout", "service_unavailable", "timeout"})
+
+
+def error_code(text: str) -> str:
+    return re.sub(r"\W+", "_", text.strip().lower()).strip("_") or "error"
+
+
+def make_error(code: str, message: str) -> ToolError:
+    code = error_code(code)
+    return ToolError(error=code, message=message, retryable=code in RETRYABLE_ERRORS)
+
+
+def parse_response(endpoint: str, response: Dict[str, Any]) -> Union[BaseModel, ToolError]:
+    """Backend dict -> the endpoint's result model (extra fields dropped) or a ToolError."""
+    if "error" in response:
+        return make_error(str(response["error"]), str(response.get("message", "")))
+    try:
+        return ENDPOINT_RESULTS[endpoint].model_validate(response)
+    except ValidationError as e:
+        return make_error("invalid_response", f"{endpoint} returned an unexpected payload ({e.error_count()} field errors)")
+
+
+def render(result: BaseModel) -> str:
+    return result.model_dump_json(exclude_none=True) # pydantic v2 emits compact JSON
+
+
+def render_tool_result(endpoint: str, response: Dict[str, Any]) -> str:
+    return render(parse_response(endpoint, response))